@@ -0,0 +1,229 @@
+"""
+デバイスの故障・回復をOPC-UAのイベント（Alarms & Conditions）として通知するモジュール
+
+デバイスごとに故障アラーム（OffNormalAlarmType）を持ち、故障の発生・回復と確認（Acknowledge）のたびにイベントを発行する。
+イベントはFactoryオブジェクトから発行されるため、クライアントはFactoryへの1つのイベント購読で全デバイスの故障を監視できる
+（SourceNode・SourceNameが故障したデバイス、ConditionIdがデバイスのノード）。
+
+確認は標準のAcknowledgeメソッド（AcknowledgeableConditionType.Acknowledge）を、
+ObjectIdにConditionId、引数にイベントのEventIdとコメントを指定して呼び出す。
+
+config.yamlの `alarms` セクションで設定する。
+
+    alarms:
+      enabled: true
+      severity: 800             # 重要度（1〜1000、デバイスごとに alarm_severity で上書きできる）
+      require_acknowledge: true # 故障の確認を必要とする場合true（確認されるまで回復後も保持される）
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from asyncua import Server, ua
+from asyncua.common.node import Node
+from asyncua.server.event_generator import EventGenerator
+
+
+# アラームの条件名
+CONDITION_NAME = "DeviceFailure"
+
+logger = logging.getLogger(__name__)
+
+
+def _utc(timestamp: float) -> datetime:
+    """UNIX時刻をタイムゾーンなしのUTCに変換"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class DeviceAlarm:
+    """1つのデバイスの故障アラーム"""
+
+    def __init__(self, generator: EventGenerator, device_name: str, severity: int, require_acknowledge: bool):
+        """
+        初期化
+
+        Args:
+            generator: イベントの発行に使うEventGenerator（SourceNodeはデバイス）
+            device_name: デバイス名
+            severity: 重要度（1〜1000）
+            require_acknowledge: 確認を必要とする場合True
+        """
+        self.generator = generator
+        self.device_name = device_name
+        self.require_acknowledge = require_acknowledge
+        self.active = False
+        self.acked = True
+        # 最後に発行したイベントのEventId（確認の照合に使う）
+        self.event_id: Optional[bytes] = None
+
+        event = generator.event
+        event.ConditionName = CONDITION_NAME
+        event.Severity = severity
+        event.LastSeverity = severity
+        event.EnabledState = ua.LocalizedText("Enabled")
+        setattr(event, "EnabledState/Id", True)
+        self._set_states(datetime.now(timezone.utc).replace(tzinfo=None))
+
+    def _set_states(self, timestamp: datetime):
+        """有効・確認の状態をイベントのフィールドに反映"""
+        event = self.generator.event
+        event.ActiveState = ua.LocalizedText("Active" if self.active else "Inactive")
+        setattr(event, "ActiveState/Id", self.active)
+        event.AckedState = ua.LocalizedText("Acknowledged" if self.acked else "Unacknowledged")
+        setattr(event, "AckedState/Id", self.acked)
+        # 故障中か、確認されていない間は条件を保持する
+        event.Retain = self.active or not self.acked
+        event.Time = timestamp
+
+    def _set_transition_time(self, name: str, timestamp: datetime):
+        """状態の遷移時刻を設定（asyncuaはこの型をDataTypeのNodeIdで持つため、変数型を合わせる）"""
+        event = self.generator.event
+        setattr(event, f"{name}/TransitionTime", timestamp)
+        event.data_types[f"{name}/TransitionTime"] = ua.VariantType.DateTime
+
+    async def _trigger(self, timestamp: datetime, message: str):
+        """イベントを発行"""
+        await self.generator.trigger(time_attr=timestamp, message=message)
+        self.event_id = self.generator.event.EventId.Value
+
+    async def set_active(self, active: bool, timestamp: datetime):
+        """
+        故障の発生・回復を通知
+
+        Args:
+            active: 故障中の場合True
+            timestamp: 発生・回復の時刻（UTC）
+        """
+        self.active = active
+        if active:
+            self.acked = not self.require_acknowledge
+        self._set_transition_time("ActiveState", timestamp)
+        self._set_states(timestamp)
+        state = "故障しました" if active else "故障から回復しました"
+        await self._trigger(timestamp, f"デバイス '{self.device_name}' が{state}")
+
+    async def acknowledge(self, event_id: bytes, comment: str) -> ua.StatusCode:
+        """
+        故障を確認
+
+        Args:
+            event_id: 確認するイベントのEventId
+            comment: コメント
+
+        Returns:
+            ua.StatusCode: 結果
+        """
+        if event_id != self.event_id:
+            return ua.StatusCode(ua.StatusCodes.BadEventIdUnknown)
+        if self.acked:
+            return ua.StatusCode(ua.StatusCodes.BadConditionBranchAlreadyAcked)
+        self.acked = True
+        timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+        event = self.generator.event
+        event.Comment = ua.LocalizedText(comment)
+        self._set_transition_time("AckedState", timestamp)
+        self._set_states(timestamp)
+        await self._trigger(timestamp, f"デバイス '{self.device_name}' の故障が確認されました")
+        return ua.StatusCode(ua.StatusCodes.Good)
+
+
+class AlarmManager:
+    """全デバイスの故障アラームを管理するクラス"""
+
+    def __init__(self, alarm_config: Optional[Dict[str, Any]] = None):
+        """
+        初期化
+
+        Args:
+            alarm_config: alarmsセクションの設定
+        """
+        self.alarm_config = alarm_config or {}
+        self.severity = self._severity(self.alarm_config.get("severity", 800))
+        self.require_acknowledge = bool(self.alarm_config.get("require_acknowledge", True))
+        # デバイスID -> アラーム
+        self.alarms: Dict[str, DeviceAlarm] = {}
+        # ConditionId（デバイスのNodeId） -> アラーム
+        self._by_condition: Dict[ua.NodeId, DeviceAlarm] = {}
+        # 統計
+        self.events = 0
+
+    @staticmethod
+    def _severity(value: Any) -> int:
+        severity = int(value)
+        if not 1 <= severity <= 1000:
+            raise ValueError(f"アラームの重要度は1から1000である必要があります: {severity}")
+        return severity
+
+    async def init(self, server: Server, source: Node, devices: Dict[str, Dict[str, Any]], device_nodes: Dict[str, Node]):
+        """
+        デバイスごとのアラームを作成（ノードの作成後、サーバーの起動前に呼び出す）
+
+        Args:
+            server: asyncuaサーバー
+            source: イベントを発行するノード（Factory）
+            devices: デバイスの設定
+            device_nodes: デバイスID -> デバイスのノード
+        """
+        for device_id, device_config in devices.items():
+            generator = await server.get_event_generator(ua.ObjectIds.OffNormalAlarmType, source)
+            device_node = device_nodes[device_id]
+            event = generator.event
+            event.SourceNode = device_node.nodeid
+            event.SourceName = device_config["name"]
+            # ConditionId（ConditionTypeのNodeId属性）
+            event.add_property("NodeId", device_node.nodeid, ua.VariantType.NodeId)
+            alarm = DeviceAlarm(
+                generator,
+                device_config["name"],
+                self._severity(device_config.get("alarm_severity", self.severity)),
+                self.require_acknowledge
+            )
+            self.alarms[device_id] = alarm
+            self._by_condition[device_node.nodeid] = alarm
+
+        # 標準のAcknowledgeメソッドの処理を登録
+        server.link_method(server.get_node(ua.ObjectIds.AcknowledgeableConditionType_Acknowledge), self._acknowledge)
+
+    async def sync(self, device_states: Dict[str, Dict[str, Any]]):
+        """
+        現在の故障状態をアラームに反映（状態の復元後などに呼び出す）
+
+        Args:
+            device_states: DataGeneratorのデバイスの状態
+        """
+        now = datetime.now(timezone.utc).timestamp()
+        await self.process([
+            (device_id, True, now)
+            for device_id, state in device_states.items()
+            if state["is_failing"] and device_id in self.alarms
+        ])
+
+    async def process(self, transitions: List[Tuple[str, bool, float]]):
+        """
+        故障の発生・回復をイベントとして発行
+
+        Args:
+            transitions: （デバイスID, 故障中か, 時刻）のリスト
+        """
+        for device_id, active, timestamp in transitions:
+            alarm = self.alarms.get(device_id)
+            if alarm is None or alarm.active == active:
+                continue
+            try:
+                await alarm.set_active(active, _utc(timestamp))
+                self.events += 1
+            except Exception as e:
+                logger.error(f"デバイス '{device_id}' のアラームの発行中にエラーが発生しました: {e}")
+
+    async def _acknowledge(self, parent: ua.NodeId, event_id: ua.Variant, comment: ua.Variant):
+        """Acknowledgeメソッド（ObjectIdはConditionId）"""
+        alarm = self._by_condition.get(parent)
+        if alarm is None:
+            return ua.StatusCode(ua.StatusCodes.BadNodeIdUnknown)
+        text = comment.Value.Text if isinstance(comment.Value, ua.LocalizedText) else str(comment.Value or "")
+        status = await alarm.acknowledge(event_id.Value, text or "")
+        if status.is_good():
+            self.events += 1
+            logger.info(f"デバイス '{alarm.device_name}' の故障が確認されました")
+            return []
+        return status
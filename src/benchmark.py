@@ -0,0 +1,379 @@
+"""
+通信のチューニングプロファイルとセキュリティモードごとの性能を計測するベンチマーク
+
+組み合わせごとにOPC-UAサーバーを別プロセスで起動し（イベントループの種類はプロセス単位で決まるため）、
+複数の購読クライアントから全変数を購読して、通知のスループットと遅延（SourceTimestampから受信までの時間）の
+パーセンタイルを計測する。遅延には購読の公開間隔による待ち時間も含まれる。
+`--tag-counts` を指定した場合は、設定ファイルのデバイスの代わりに指定した数の数値センサーを持つデバイスで計測する。
+
+使用例:
+    python src/benchmark.py --profiles default,low_latency,throughput --clients 10 --duration 30
+    python src/benchmark.py --security None,Sign,SignAndEncrypt --tag-counts 100,500,1000 --clients 10
+"""
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from asyncua import Client, ua
+from asyncua.common.node import Node
+
+from config_loader import load_config
+from data_generator import DataGenerator
+from main import setup_logging
+from opcua_server import OpcUaServer
+from performance import event_loop_factory
+from security import generate_certificate
+
+
+# 組み込みのプロファイル（performanceセクションの内容）
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # asyncioの標準ループとasyncuaのデフォルト設定
+    "default": {"event_loop": "asyncio"},
+    # uvloop（インストールされている場合）とNagleアルゴリズムの無効化
+    "low_latency": {
+        "event_loop": "auto",
+        "transport": {"tcp_nodelay": True}
+    },
+    # 大きなソケットバッファとチャンクで、少ない送信回数にまとめる
+    "throughput": {
+        "event_loop": "auto",
+        "transport": {
+            "tcp_nodelay": False,
+            "send_buffer_size": 4 * 1024 * 1024,
+            "receive_buffer_size": 4 * 1024 * 1024,
+            "max_chunk_size": 1024 * 1024
+        }
+    },
+}
+
+
+# セキュリティモード（名前 -> Basic256Sha256のメッセージセキュリティモード、Noneは暗号化なし）
+SECURITY_MODES = {
+    "None": None,
+    "Sign": "Sign",
+    "SignAndEncrypt": "SignAndEncrypt",
+}
+
+# ベンチマーク用クライアントのアプリケーションURI
+CLIENT_URI = "urn:factory:simulator:benchmark"
+
+
+def synthetic_devices(tag_count: int, sensors_per_device: int = 50) -> Dict[str, Any]:
+    """
+    指定した数の数値センサーを持つデバイス設定を作成
+
+    Args:
+        tag_count: センサーの総数
+        sensors_per_device: 1デバイスあたりのセンサー数
+
+    Returns:
+        Dict[str, Any]: デバイス設定
+    """
+    if tag_count < 1:
+        raise ValueError(f"タグ数は1以上である必要があります: {tag_count}")
+    devices = {}
+    for start in range(0, tag_count, sensors_per_device):
+        device_id = f"bench_device_{start // sensors_per_device:04d}"
+        devices[device_id] = {
+            "name": f"BenchDevice{start // sensors_per_device:04d}",
+            "sensors": {
+                f"value_{i:04d}": {
+                    "name": f"Value{i:04d}",
+                    "min": 0.0,
+                    "max": 100.0,
+                    "normal_min": 20.0,
+                    "normal_max": 80.0,
+                    "failure_min": 90.0,
+                    "failure_max": 100.0
+                }
+                for i in range(start, min(start + sensors_per_device, tag_count))
+            }
+        }
+    return devices
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    パーセンタイルを計算（最近傍順位法）
+
+    Args:
+        values: 値のリスト
+        q: パーセンタイル（0〜100）
+
+    Returns:
+        float: パーセンタイル値。値がない場合は0.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[min(int(rank), len(ordered)) - 1]
+
+
+def resolve_profiles(names: Sequence[str], config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    プロファイル名から設定を取得
+
+    Args:
+        names: プロファイル名のリスト（"config"は設定ファイルのperformanceセクション）
+        config: 設定データ
+
+    Returns:
+        Dict[str, Dict[str, Any]]: プロファイル名とperformanceセクションの設定
+    """
+    profiles = {}
+    for name in names:
+        if name == "config":
+            profiles[name] = config.get("performance", {})
+        elif name in PROFILES:
+            profiles[name] = PROFILES[name]
+        else:
+            raise ValueError(f"不明なプロファイルです: {name}（{', '.join(list(PROFILES) + ['config'])}）")
+    return profiles
+
+
+def _serve(config: Dict[str, Any]):
+    """ベンチマーク対象のサーバーを起動（子プロセスで実行）"""
+    logging.basicConfig(level=logging.WARNING)
+    loop_factory = event_loop_factory(config.get("performance", {}))
+
+    async def serve():
+        server = OpcUaServer(config, DataGenerator(config))
+        await server.init()
+        async with server.server:
+            await server.update_data()
+
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(serve())
+
+
+class TransportBenchmark:
+    """1つの組み合わせ（プロファイルとセキュリティモード）の計測を行うクラス"""
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        profile: Dict[str, Any],
+        clients: int = 10,
+        duration: float = 30.0,
+        warmup: float = 2.0,
+        startup_timeout: float = 60.0,
+        security: str = "None",
+        certificate_dir: Optional[str] = None
+    ):
+        """
+        初期化
+
+        Args:
+            config: 設定データ
+            profile: performanceセクションの設定
+            clients: 購読クライアント数
+            duration: 計測時間（秒）
+            warmup: 計測から除外する購読開始直後の時間（秒）
+            startup_timeout: サーバーの起動を待つ時間（秒）
+            security: セキュリティモード（None, Sign, SignAndEncrypt）
+            certificate_dir: 証明書を作成するディレクトリ（Sign, SignAndEncryptの場合は必須）
+        """
+        if security not in SECURITY_MODES:
+            raise ValueError(f"不明なセキュリティモードです: {security}（{', '.join(SECURITY_MODES)}）")
+        self.config = copy.deepcopy(config)
+        self.config["performance"] = profile
+        self.security = security
+        self.security_string = None
+        self.config["security"] = {"policies": ["None"]}
+        if SECURITY_MODES[security] is not None:
+            if certificate_dir is None:
+                raise ValueError("署名・暗号化を計測する場合はcertificate_dirが必要です")
+            self.config["security"] = {
+                "policies": [f"Basic256Sha256_{SECURITY_MODES[security]}"],
+                "certificate": os.path.join(certificate_dir, "server_cert.der"),
+                "private_key": os.path.join(certificate_dir, "server_key.pem"),
+            }
+            self.client_certificate = os.path.join(certificate_dir, "client_cert.der")
+            self.client_private_key = os.path.join(certificate_dir, "client_key.pem")
+            self.security_string = (
+                f"Basic256Sha256,{SECURITY_MODES[security]},{self.client_certificate},{self.client_private_key}"
+            )
+        # ユーザーの状態ファイルを書き換えず（合成したタグではレイアウトが変わり破棄される）、
+        # 計測の途中でガバナーが段階を適用して処理時間やスループットが変わらないようにする
+        self.config["state"] = {"enabled": False}
+        self.config["governor"] = {"enabled": False}
+        self.endpoint = self.config["server"]["endpoint"].replace("0.0.0.0", "127.0.0.1")
+        self.client_count = clients
+        self.duration = duration
+        self.warmup = warmup
+        self.startup_timeout = startup_timeout
+
+        self.latencies: List[float] = []
+        self.notifications = 0
+        self._recording = False
+        self.logger = logging.getLogger(__name__)
+
+    def datachange_notification(self, node, val, data):
+        """購読クライアントのデータ変更通知（遅延を記録する）"""
+        if not self._recording:
+            return
+        self.notifications += 1
+        timestamp = data.monitored_item.Value.SourceTimestamp
+        if timestamp is not None:
+            self.latencies.append(time.time() - timestamp.replace(tzinfo=timezone.utc).timestamp())
+
+    async def _collect_variables(self, node: Node) -> List[Node]:
+        """オブジェクト配下の変数を再帰的に取得（プロパティと制御用オブジェクトは除く）"""
+        variables = await node.get_variables()
+        for child in await node.get_children(refs=ua.ObjectIds.HasComponent, nodeclassmask=ua.NodeClass.Object):
+            if (await child.read_browse_name()).Name == "Control":
+                continue
+            variables += await self._collect_variables(child)
+        return variables
+
+    async def _connect(self) -> Client:
+        """サーバーが起動するまで接続を試行"""
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            client = Client(url=self.endpoint)
+            try:
+                # サーバー証明書はエンドポイントから取得するため、接続の試行に含める
+                if self.security_string is not None:
+                    client.application_uri = CLIENT_URI
+                    await client.set_security_string(self.security_string)
+                await client.connect()
+                return client
+            except (OSError, asyncio.TimeoutError):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.5)
+
+    async def _subscribe(self, client: Client) -> int:
+        """全変数を購読し、購読した変数の数を返す"""
+        idx = await client.get_namespace_index(self.config["server"]["uri"])
+        factory = await client.nodes.objects.get_child(f"{idx}:Factory")
+        variables = await self._collect_variables(factory)
+        subscription = await client.create_subscription(self.config["server"]["update_interval"] * 1000, self)
+        await subscription.subscribe_data_change(variables)
+        return len(variables)
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        計測を実行
+
+        Returns:
+            Dict[str, Any]: 計測結果
+        """
+        if self.security_string is not None and not os.path.exists(self.client_certificate):
+            generate_certificate(self.client_certificate, self.client_private_key, CLIENT_URI, "SimulatorBenchmarkClient")
+
+        process = multiprocessing.get_context("spawn").Process(target=_serve, args=(self.config,), daemon=True)
+        process.start()
+        clients: List[Client] = []
+        try:
+            for _ in range(self.client_count):
+                clients.append(await self._connect())
+            tags = 0
+            for client in clients:
+                tags = await self._subscribe(client)
+
+            await asyncio.sleep(self.warmup)
+            self._recording = True
+            await asyncio.sleep(self.duration)
+            self._recording = False
+
+            for client in clients:
+                await client.disconnect()
+            clients = []
+        finally:
+            for client in clients:
+                try:
+                    await client.disconnect()
+                except Exception:
+                    pass
+            process.terminate()
+            process.join()
+
+        loop_factory = event_loop_factory(self.config["performance"])
+        return {
+            "event_loop": "uvloop" if loop_factory is not None else "asyncio",
+            "security": self.security,
+            "clients": self.client_count,
+            "tags": tags,
+            "notifications": self.notifications,
+            "throughput": self.notifications / self.duration,
+            "latency_p50_ms": percentile(self.latencies, 50) * 1000,
+            "latency_p99_ms": percentile(self.latencies, 99) * 1000,
+            "latency_max_ms": max(self.latencies, default=0.0) * 1000,
+        }
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="OPC-UAサーバーシミュレーターの通信ベンチマーク")
+    parser.add_argument("--config", help="設定ファイルのパス")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="計測するプロファイル（カンマ区切り、configは設定ファイルの値）")
+    parser.add_argument("--security", default="None", help="計測するセキュリティモード（カンマ区切り、None, Sign, SignAndEncrypt）")
+    parser.add_argument("--tag-counts", help="計測するタグ数（カンマ区切り、省略時は設定ファイルのデバイス）")
+    parser.add_argument("--clients", type=int, default=10, help="購読クライアント数")
+    parser.add_argument("--duration", type=float, default=30.0, help="組み合わせごとの計測時間（秒）")
+    parser.add_argument("--update-interval", type=float, help="データ更新間隔（秒、省略時は設定ファイルの値）")
+    parser.add_argument("--report", help="結果を書き出すJSONファイルのパス")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    メイン関数
+
+    Returns:
+        int: 終了コード
+    """
+    setup_logging()
+    # クライアントの接続ごとのログは出力しない
+    logging.getLogger("asyncua").setLevel(logging.WARNING)
+    logger = logging.getLogger(__name__)
+    args = parse_args(argv)
+
+    config = load_config(args.config)
+    if args.update_interval is not None:
+        config["server"]["update_interval"] = args.update_interval
+    profiles = resolve_profiles([name.strip() for name in args.profiles.split(",") if name.strip()], config)
+    security_modes = [name.strip() for name in args.security.split(",") if name.strip()]
+    tag_counts = [int(count) for count in args.tag_counts.split(",")] if args.tag_counts else [None]
+
+    results = []
+    with tempfile.TemporaryDirectory() as certificate_dir:
+        for tag_count in tag_counts:
+            bench_config = config
+            if tag_count is not None:
+                bench_config = dict(config, devices=synthetic_devices(tag_count))
+            for security in security_modes:
+                for name, profile in profiles.items():
+                    logger.info(f"計測しています: プロファイル '{name}', セキュリティ {security}, タグ数 {tag_count or '設定ファイル'}")
+                    result = await TransportBenchmark(
+                        bench_config, profile, clients=args.clients, duration=args.duration,
+                        security=security, certificate_dir=certificate_dir
+                    ).run()
+                    results.append(dict(result, profile=name))
+
+    print(f"{'profile':<14}{'loop':<9}{'security':<16}{'tags':>6}{'notif/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for result in results:
+        print(
+            f"{result['profile']:<14}{result['event_loop']:<9}{result['security']:<16}{result['tags']:>6}{result['throughput']:>12.1f}"
+            f"{result['latency_p50_ms']:>10.2f}{result['latency_p99_ms']:>10.2f}{result['latency_max_ms']:>10.2f}"
+        )
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,251 @@
+"""
+シミュレーターの名前空間のBrowse・TranslateBrowsePathsToNodeIdsの結果をキャッシュするモジュール
+
+SiteWise Edgeなどのゲートウェイは接続のたびにFactory配下のツリー全体をブラウズする。
+asyncuaはBrowseのたびに参照を1つずつ調べ、参照型のサブタイプを再帰的にたどるため、ノード数が多いと
+再接続が集中したときにCPU負荷が跳ね上がる。シミュレーターの階層は初期化後に変わらないため、
+
+- 名前空間内のノードのBrowse結果（ブラウズの条件ごと）と、そのエンコード済みのバイト列
+- 名前空間内のノードを対象とするブラウズパスの変換結果
+
+をキャッシュし、ノード・参照の追加・削除や、値以外の属性（表示名など）の書き込みがあった場合にだけ破棄する。
+キーはクライアントが指定する条件のため、存在するノードの成功した結果だけをキャッシュし、
+件数が上限を超えた場合は最も長く使われていない結果から捨てる。
+"""
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from asyncua import Server, ua
+from asyncua.ua.ua_binary import Primitives, nodeid_to_binary, struct_to_binary
+
+from performance import add_connection_hook
+
+
+# 初期化時に事前計算するBrowseの条件（クライアントがツリーをたどるときの一般的な条件: 階層参照を順方向に、サブタイプを含む）
+DEFAULT_BROWSE = (ua.BrowseDirection.Forward, ua.NodeId(ua.ObjectIds.HierarchicalReferences), True, 0)
+# キャッシュごとの結果の数の上限（事前計算するノード数の2倍より小さい場合はそちらを使う）
+DEFAULT_MAX_ENTRIES = 100_000
+
+logger = logging.getLogger(__name__)
+
+
+def encode_response(response: Any, encoded_results: List[bytes]) -> bytes:
+    """
+    エンコード済みの結果を使ってレスポンスをエンコード（struct_to_binaryと同じバイト列になる）
+
+    Args:
+        response: BrowseResponseまたはTranslateBrowsePathsToNodeIdsResponse
+        encoded_results: Resultsの各要素のエンコード済みのバイト列
+
+    Returns:
+        bytes: エンコードしたレスポンス
+    """
+    if response.DiagnosticInfos:
+        return struct_to_binary(response)
+    return b"".join((
+        nodeid_to_binary(response.TypeId),
+        struct_to_binary(response.ResponseHeader),
+        Primitives.Int32.pack(len(encoded_results)),
+        *encoded_results,
+        Primitives.Int32.pack(0),
+    ))
+
+
+class BrowseCache:
+    """名前空間のBrowse・ブラウズパスの変換結果のキャッシュ"""
+
+    def __init__(self, server: Server, namespace_index: int, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        初期化
+
+        Args:
+            server: asyncuaサーバー
+            namespace_index: キャッシュの対象とする名前空間インデックス
+            max_entries: キャッシュごとの結果の数の上限
+        """
+        if max_entries <= 0:
+            raise ValueError(f"max_entriesは1以上である必要があります: {max_entries}")
+        self.server = server
+        self.idx = namespace_index
+        self.max_entries = max_entries
+        iserver = server.iserver
+        self._browse = iserver.view_service.browse
+        self._translate = iserver.view_service.translate_browsepaths_to_nodeids
+        # (NodeId, 方向, 参照型, サブタイプを含むか, ノードクラスのマスク) -> Browse結果
+        self.browse_results: "OrderedDict[Tuple, ua.BrowseResult]" = OrderedDict()
+        # (開始ノード, パスの要素) -> 変換結果
+        self.path_results: "OrderedDict[Tuple, ua.BrowsePathResult]" = OrderedDict()
+        # キャッシュした結果のid -> エンコード済みのバイト列
+        self._encoded: Dict[int, bytes] = {}
+        # 統計
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def install(self):
+        """asyncuaのサービスを置き換える（ノードの作成後、サーバーの起動前に呼び出す）"""
+        iserver = self.server.iserver
+        iserver.view_service.browse = self.browse
+        iserver.view_service.translate_browsepaths_to_nodeids = self.translate_browsepaths_to_nodeids
+
+        # ノード・参照を変更するサービスの呼び出しでキャッシュを破棄
+        node_mgt_service = iserver.node_mgt_service
+        for name in ("add_nodes", "delete_nodes", "add_references", "delete_references"):
+            setattr(node_mgt_service, name, self._invalidating(getattr(node_mgt_service, name)))
+
+        write = iserver.attribute_service.write
+
+        async def write_attributes(params: ua.WriteParameters, *args, **kwargs):
+            # 値の書き込みではツリーは変わらない（表示名などの書き込みの場合だけ破棄する）
+            if any(node.AttributeId != ua.AttributeIds.Value for node in params.NodesToWrite):
+                self.invalidate()
+            return await write(params, *args, **kwargs)
+
+        iserver.attribute_service.write = write_attributes
+        add_connection_hook(self.server, self.attach)
+
+    def _invalidating(self, method):
+        """呼び出し時にキャッシュを破棄するメソッドを作成"""
+        def wrapper(*args, **kwargs):
+            self.invalidate()
+            return method(*args, **kwargs)
+        return wrapper
+
+    def invalidate(self):
+        """キャッシュを破棄"""
+        if self.browse_results or self.path_results:
+            self.invalidations += 1
+            logger.debug("アドレス空間が変更されたため、Browseのキャッシュを破棄しました")
+        self.browse_results.clear()
+        self.path_results.clear()
+        self._encoded.clear()
+
+    def precompute(self) -> int:
+        """
+        名前空間内の全てのノードについて、一般的な条件のBrowse結果を事前に計算
+
+        Returns:
+            int: キャッシュしたノード数
+        """
+        direction, reference_type, include_subtypes, node_class_mask = DEFAULT_BROWSE
+        descriptions = [
+            ua.BrowseDescription(
+                NodeId_=nodeid,
+                BrowseDirection_=direction,
+                ReferenceTypeId=reference_type,
+                IncludeSubtypes=include_subtypes,
+                NodeClassMask=node_class_mask,
+                ResultMask=ua.BrowseResultMask.All
+            )
+            for nodeid in list(self.server.iserver.aspace.keys())
+            if nodeid.NamespaceIndex == self.idx
+        ]
+        # 事前計算した結果がクライアントの条件の結果で押し出されないようにする
+        self.max_entries = max(self.max_entries, 2 * len(descriptions))
+        self.browse(ua.BrowseParameters(NodesToBrowse=descriptions))
+        return len(descriptions)
+
+    def _store(self, cache: "OrderedDict[Tuple, Any]", key: Tuple, result: Any):
+        """成功した結果をキャッシュし、エンコード済みのバイト列を保持（上限を超えた場合は最も古い結果を捨てる）"""
+        if not result.StatusCode.is_good():
+            return
+        cache[key] = result
+        self._encoded[id(result)] = struct_to_binary(result)
+        while len(cache) > self.max_entries:
+            _, evicted = cache.popitem(last=False)
+            self._encoded.pop(id(evicted), None)
+            self.evictions += 1
+
+    @staticmethod
+    def _lookup(cache: "OrderedDict[Tuple, Any]", key: Tuple) -> Any:
+        """キャッシュした結果を取得し、最近使われた結果にする"""
+        result = cache.get(key)
+        if result is not None:
+            cache.move_to_end(key)
+        return result
+
+    def browse(self, params: ua.BrowseParameters) -> List[ua.BrowseResult]:
+        """Browse（ViewService.browseの置き換え）"""
+        results = []
+        for desc in params.NodesToBrowse:
+            if desc.NodeId.NamespaceIndex != self.idx:
+                results.extend(self._browse(ua.BrowseParameters(NodesToBrowse=[desc])))
+                continue
+            # asyncuaはResultMaskによらず全ての項目を返すため、キーに含めない
+            key = (desc.NodeId, desc.BrowseDirection, desc.ReferenceTypeId, desc.IncludeSubtypes, desc.NodeClassMask)
+            result = self._lookup(self.browse_results, key)
+            if result is None:
+                self.misses += 1
+                result = self._browse(ua.BrowseParameters(NodesToBrowse=[desc]))[0]
+                # 存在しないノードの結果はキャッシュしない
+                if desc.NodeId in self.server.iserver.aspace:
+                    self._store(self.browse_results, key, result)
+            else:
+                self.hits += 1
+            results.append(result)
+        return results
+
+    def translate_browsepaths_to_nodeids(self, browse_paths: List[ua.BrowsePath]) -> List[ua.BrowsePathResult]:
+        """ブラウズパスの変換（ViewService.translate_browsepaths_to_nodeidsの置き換え）"""
+        results = []
+        for path in browse_paths:
+            elements = path.RelativePath.Elements
+            # 開始ノードか最後の要素が名前空間内の場合だけキャッシュする（Objectsから始まるパスを含む）
+            if not elements or (path.StartingNode.NamespaceIndex != self.idx and elements[-1].TargetName.NamespaceIndex != self.idx):
+                results.extend(self._translate([path]))
+                continue
+            key = (path.StartingNode, tuple(
+                (element.ReferenceTypeId, element.IsInverse, element.IncludeSubtypes, element.TargetName)
+                for element in elements
+            ))
+            result = self._lookup(self.path_results, key)
+            if result is None:
+                self.misses += 1
+                result = self._translate([path])[0]
+                self._store(self.path_results, key, result)
+            else:
+                self.hits += 1
+            results.append(result)
+        return results
+
+    def attach(self, transport: Any):
+        """
+        接続のレスポンスの送信を置き換え、キャッシュした結果はエンコード済みのバイト列を使う
+
+        Args:
+            transport: 接続のトランスポート
+        """
+        processor = transport.get_protocol().processor
+        send_response = processor.send_response
+
+        def send(requesthandle, seqhdr, response, msgtype=ua.MessageType.SecureMessage):
+            if not isinstance(response, (ua.BrowseResponse, ua.TranslateBrowsePathsToNodeIdsResponse)):
+                return send_response(requesthandle, seqhdr, response, msgtype)
+            response.ResponseHeader.RequestHandle = requesthandle
+            encoded = self._encoded
+            body = encode_response(response, [
+                encoded.get(id(result)) or struct_to_binary(result) for result in response.Results
+            ])
+            processor._transport.write(
+                processor._connection.message_to_binary(body, message_type=msgtype, request_id=seqhdr.RequestId)
+            )
+
+        processor.send_response = send
+
+    def stats(self) -> Dict[str, int]:
+        """
+        キャッシュの統計を取得
+
+        Returns:
+            Dict[str, int]: キャッシュしている結果の数、ヒット・ミス・破棄の回数、上限を超えて捨てた結果の数
+        """
+        return {
+            "browse_results": len(self.browse_results),
+            "path_results": len(self.path_results),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
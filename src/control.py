@@ -0,0 +1,257 @@
+"""
+実行中のシミュレーターを操作するOPC-UAメソッドを提供するモジュール
+
+ステップ負荷試験などのために、再起動せずにデバイスの有効・無効、生成対象のセンサー数、更新間隔、故障の頻度を変更できる。
+メソッド呼び出しは検証後にキューへ積まれ、次のティックの開始時にまとめて適用される（ティックの途中で状態が変わることはない）。
+
+匿名のセッションからのメソッド呼び出しは、`control.allow_anonymous: true` を指定しない限り拒否する。
+ロールがviewerのセッション（security.pyのユーザー設定）からの呼び出しは常に拒否する。
+
+    control:
+      enabled: true
+      allow_anonymous: false
+"""
+import logging
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+from asyncua import Server, ua
+from asyncua.common.node import Node
+from asyncua.common.utils import Buffer
+from asyncua.server.users import UserRole
+from asyncua.ua.ua_binary import struct_from_binary
+
+from performance import add_connection_hook
+from security import is_read_only
+from tag_index import NodeIdAllocator
+
+
+CALL_REQUEST = ua.NodeId(ua.ObjectIds.CallRequest_Encoding_DefaultBinary)
+
+
+def _argument(name: str, variant_type: ua.VariantType, description: str) -> ua.Argument:
+    """メソッドの引数定義を作成"""
+    return ua.Argument(
+        Name=name,
+        DataType=ua.NodeId(variant_type.value),
+        ValueRank=-1,
+        Description=ua.LocalizedText(description)
+    )
+
+
+class ControlPlane:
+    """シミュレーターの制御用メソッド（Factory/Control配下に作成する）"""
+
+    def __init__(self, simulator: Any):
+        """
+        初期化
+
+        Args:
+            simulator: 操作対象のOPC-UAサーバー（OpcUaServer）
+        """
+        self.simulator = simulator
+        self.data_generator = simulator.data_generator
+        # 匿名のセッションからのメソッド呼び出しを許可する場合True
+        self.allow_anonymous = bool(simulator.config.get("control", {}).get("allow_anonymous", False))
+        # 制御用メソッドのNodeId
+        self.method_ids: Set[ua.NodeId] = set()
+        # 次のティックの開始時に適用するコマンド（説明, 処理）
+        self._pending: List[Tuple[str, Callable[[], None]]] = []
+        # 状態表示用の変数
+        self.status_nodes = {}
+        self.logger = logging.getLogger(__name__)
+
+    async def init(self, parent: Node, idx: int, node_ids: Optional[NodeIdAllocator] = None):
+        """
+        制御用のオブジェクトとメソッドを作成
+
+        Args:
+            parent: 親ノード（Factory）
+            idx: 名前空間インデックス
+            node_ids: NodeIdの割り当て（省略時はasyncuaが割り当てる）
+        """
+        def allocate(path: str, name: str):
+            # NodeIdとブラウズ名（NodeIdの割り当てがない場合は名前空間インデックスとブラウズ名）
+            return node_ids.allocate(path, name) if node_ids is not None else (idx, name)
+
+        control = await parent.add_object(*allocate("/Factory/Control", "Control"))
+        methods = []
+
+        methods.append(await control.add_method(
+            *allocate("/Factory/Control/SetDeviceEnabled", "SetDeviceEnabled"), self._set_device_enabled,
+            [
+                _argument("DeviceId", ua.VariantType.String, "デバイスID（config.yamlのキー）"),
+                _argument("Enabled", ua.VariantType.Boolean, "有効にする場合True"),
+            ],
+            []
+        ))
+        methods.append(await control.add_method(
+            *allocate("/Factory/Control/SetSensorLimit", "SetSensorLimit"), self._set_sensor_limit,
+            [_argument("Limit", ua.VariantType.Int32, "生成対象のセンサー数の上限（負の値は全センサー）")],
+            []
+        ))
+        methods.append(await control.add_method(
+            *allocate("/Factory/Control/SetUpdateInterval", "SetUpdateInterval"), self._set_update_interval,
+            [_argument("Interval", ua.VariantType.Double, "データ更新間隔（秒）")],
+            []
+        ))
+        methods.append(await control.add_method(
+            *allocate("/Factory/Control/SetMeanTimeBetweenFailures", "SetMeanTimeBetweenFailures"), self._set_mean_time_between_failures,
+            [_argument("Seconds", ua.VariantType.Double, "平均故障間隔（秒）")],
+            []
+        ))
+        methods.append(await control.add_method(
+            *allocate("/Factory/Control/ForceFailure", "ForceFailure"), self._force_failure,
+            [
+                _argument("DeviceId", ua.VariantType.String, "デバイスID（config.yamlのキー）"),
+                _argument("Duration", ua.VariantType.Double, "故障の継続時間（秒）。0以下の場合は設定の範囲からランダムに決定"),
+            ],
+            []
+        ))
+
+        self.method_ids = {method.nodeid for method in methods}
+
+        # 現在の状態を読み取るための変数
+        self.status_nodes["active_sensor_count"] = await control.add_variable(
+            *allocate("/Factory/Control/ActiveSensorCount", "ActiveSensorCount"), ua.Variant(self.data_generator.active_sensor_count, ua.VariantType.UInt32)
+        )
+        self.status_nodes["update_interval"] = await control.add_variable(
+            *allocate("/Factory/Control/UpdateInterval", "UpdateInterval"), ua.Variant(float(self.simulator.update_interval), ua.VariantType.Double)
+        )
+
+    def install(self, server: Server):
+        """
+        許可されていないセッションからのメソッド呼び出しを拒否する処理を登録（サーバーの起動前に呼び出す）
+
+        Args:
+            server: asyncuaサーバー
+        """
+        add_connection_hook(server, self.attach)
+
+    def allows(self, user: Any) -> bool:
+        """
+        セッションのユーザーが制御用メソッドを呼び出せるか
+
+        Args:
+            user: セッションのユーザー
+
+        Returns:
+            bool: 呼び出せる場合True
+        """
+        if user is None or is_read_only(user):
+            return False
+        return self.allow_anonymous or user.role != UserRole.Anonymous
+
+    def attach(self, transport: Any):
+        """
+        接続のCall要求の処理を置き換え、許可されていないセッションから制御用メソッドを呼び出す要求を拒否する
+
+        Args:
+            transport: 接続のトランスポート
+        """
+        processor = transport.get_protocol().processor
+        process_message = processor._process_message
+
+        async def process(typeid, requesthdr, seqhdr, body):
+            session = processor.session
+            if typeid == CALL_REQUEST and session is not None and not self.allows(session.user):
+                # 要求の解釈は通常の処理でも行うため、コピーから読み取る
+                params = struct_from_binary(ua.CallParameters, Buffer(bytes(body)))
+                if any(method.MethodId in self.method_ids for method in params.MethodsToCall):
+                    self.logger.warning(f"制御用メソッドの呼び出しを拒否しました（ユーザー: {session.user}）")
+                    response = ua.ServiceFault()
+                    response.ResponseHeader.ServiceResult = ua.StatusCode(ua.StatusCodes.BadUserAccessDenied)
+                    processor.send_response(requesthdr.RequestHandle, seqhdr, response)
+                    return True
+            return await process_message(typeid, requesthdr, seqhdr, body)
+
+        processor._process_message = process
+
+    def submit(self, description: str, command: Callable[[], None]):
+        """
+        コマンドをキューに積む
+
+        Args:
+            description: ログ出力用の説明
+            command: 次のティックの開始時に実行する処理
+        """
+        self._pending.append((description, command))
+
+    @property
+    def pending_count(self) -> int:
+        """未適用のコマンド数"""
+        return len(self._pending)
+
+    async def apply_pending(self):
+        """キューに積まれたコマンドを順に適用（ティックの開始時に呼び出す）"""
+        if not self._pending:
+            return
+
+        commands, self._pending = self._pending, []
+        for description, command in commands:
+            try:
+                command()
+                self.logger.info(f"制御コマンドを適用しました: {description}")
+            except Exception as e:
+                self.logger.error(f"制御コマンドの適用中にエラーが発生しました: {description}: {e}")
+
+        if self.status_nodes:
+            await self.status_nodes["active_sensor_count"].write_value(
+                ua.Variant(self.data_generator.active_sensor_count, ua.VariantType.UInt32)
+            )
+            await self.status_nodes["update_interval"].write_value(
+                ua.Variant(float(self.simulator.update_interval), ua.VariantType.Double)
+            )
+
+    def _has_device(self, device_id: str) -> bool:
+        return device_id in self.data_generator.devices
+
+    async def _set_device_enabled(self, parent: ua.NodeId, device_id: ua.Variant, enabled: ua.Variant):
+        """デバイスの有効・無効を切り替えるメソッド"""
+        if not self._has_device(device_id.Value):
+            return ua.StatusCode(ua.StatusCodes.BadInvalidArgument)
+        self.submit(
+            f"デバイス '{device_id.Value}' を{'有効' if enabled.Value else '無効'}にする",
+            lambda: self.data_generator.set_device_enabled(device_id.Value, bool(enabled.Value))
+        )
+        return []
+
+    async def _set_sensor_limit(self, parent: ua.NodeId, limit: ua.Variant):
+        """生成対象のセンサー数の上限を設定するメソッド"""
+        value = None if limit.Value < 0 else int(limit.Value)
+        self.submit(
+            f"センサー数の上限を {value if value is not None else '無制限'} にする",
+            lambda: self.data_generator.set_sensor_limit(value)
+        )
+        return []
+
+    async def _set_update_interval(self, parent: ua.NodeId, interval: ua.Variant):
+        """データ更新間隔を変更するメソッド"""
+        if interval.Value <= 0:
+            return ua.StatusCode(ua.StatusCodes.BadInvalidArgument)
+
+        def apply():
+            self.simulator.update_interval = float(interval.Value)
+
+        self.submit(f"更新間隔を {interval.Value} 秒にする", apply)
+        return []
+
+    async def _set_mean_time_between_failures(self, parent: ua.NodeId, seconds: ua.Variant):
+        """平均故障間隔を変更するメソッド"""
+        if seconds.Value <= 0:
+            return ua.StatusCode(ua.StatusCodes.BadInvalidArgument)
+        self.submit(
+            f"平均故障間隔を {seconds.Value} 秒にする",
+            lambda: self.data_generator.set_mean_time_between_failures(float(seconds.Value))
+        )
+        return []
+
+    async def _force_failure(self, parent: ua.NodeId, device_id: ua.Variant, duration: ua.Variant):
+        """デバイスを強制的に故障させるメソッド"""
+        if not self._has_device(device_id.Value):
+            return ua.StatusCode(ua.StatusCodes.BadInvalidArgument)
+        value = float(duration.Value) if duration.Value > 0 else None
+        self.submit(
+            f"デバイス '{device_id.Value}' を故障させる",
+            lambda: self.data_generator.force_failure(device_id.Value, value)
+        )
+        return []
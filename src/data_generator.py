@@ -1,10 +1,39 @@
 """
 センサーデータを生成するモジュール
 """
+import math
 import random
 import time
-import math
-from typing import Dict, Any, Optional, Union, Tuple
+from collections import deque
+from typing import Deque, Dict, Any, List, Optional, Set, Union, Tuple
+
+from expression_graph import ExpressionGraph, TagKey, is_derived
+from waveforms import create_failure_pattern, create_waveform
+
+
+# 前回の値から目標値へ近づける割合（0.1 = 10%の変化）
+CHANGE_RATE = 0.1
+# 遅延生成のセンサーを現在まで進めるとき、このティック数までは1ティックずつ進め、超える場合は閉じた式でまとめて進める
+FAST_FORWARD_STEPS = 32
+
+
+def wrap_counter(sensor_config: Dict[str, Any], value: int) -> int:
+    """
+    カウンターの値が最大値を超えた場合に最小値から数え直す（超えた分は最小値に加える）
+
+    ティックごとの生成と、遅延生成でまとめて進める場合の両方で使い、どちらでも同じ値になるようにする。
+
+    Args:
+        sensor_config: センサー設定
+        value: 増分を加えた値
+
+    Returns:
+        int: 最小値から最大値までの範囲に収めた値
+    """
+    if "max" in sensor_config and value > sensor_config["max"]:
+        low = sensor_config.get("min", 0)
+        value = low + (value - low) % (sensor_config["max"] - low + 1)
+    return value
 
 
 class DataGenerator:
@@ -25,12 +54,42 @@ class DataGenerator:
         # 故障シミュレーション用の状態管理
         self.device_states = {}
         self.last_values = {}
+        # センサーごとの波形と故障パターン（未設定のセンサーは登録しない）
+        self.waveforms = {}
+        self.failure_patterns = {}
+        # ティックの時刻と前回ティックからの経過時間
+        self.current_time = time.time()
+        self.tick_interval = 0.0
+        # 派生センサーの依存グラフ（式は起動時に1度だけコンパイルする）
+        self.expression_graph = ExpressionGraph(self.devices)
+        # 生成対象のセンサー数の上限（Noneは全センサー）と、デバイスごとの生成対象センサー
+        self.sensor_limit: Optional[int] = None
+        self.active_sensors: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        # 生成対象が変わったことを示すフラグ（次のティックで出力先の辞書を作り直す）
+        self._active_sensors_changed = False
+        # 故障の発生・回復の履歴（デバイスID, 故障中か, 時刻）。アラームの通知で取り出す（取り出されない場合は古いものから捨てる）
+        self.failure_transitions: Deque[Tuple[str, bool, float]] = deque(maxlen=1000)
+        # ティック番号（遅延生成で、生成を止めていたセンサーを何ティック進めるかの計算に使う）
+        self.tick_count = 0
+        # 遅延生成（購読されていないセンサーはティックごとに生成せず、読み取り時に現在まで進める）
+        self.lazy = False
+        self.monitored: Set[TagKey] = set()
+        # センサー -> 生成が必要な理由の数（購読中、または購読中の派生センサーからの参照）
+        self._demand: Dict[TagKey, int] = {}
+        # 生成を止めているセンサー -> 最後に進めたティック番号と時刻
+        self._stale_since: Dict[TagKey, Tuple[int, float]] = {}
+        # デバイスごとのティックごとに生成するセンサー（遅延生成が無効の場合はactive_sensorsと同じ）
+        self.tick_sensors: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        # デバイスID -> 何ティックに1回生成するか（負荷が高いときに優先度の低いデバイスの更新頻度を下げる）
+        self.update_divisors: Dict[str, int] = {}
         self.initialize_device_states()
+        self._update_active_sensors()
         
     def initialize_device_states(self):
         """デバイスの初期状態を設定"""
         for device_id, device_config in self.devices.items():
             self.device_states[device_id] = {
+                "enabled": True,
                 "is_failing": False,
                 "failure_end_time": 0,
                 "next_failure_time": self._calculate_next_failure_time()
@@ -38,15 +97,29 @@ class DataGenerator:
             
             # 初期値を設定
             self.last_values[device_id] = {}
+            self.waveforms[device_id] = {}
+            self.failure_patterns[device_id] = {}
             for sensor_id, sensor_config in device_config["sensors"].items():
                 if sensor_config.get("type") == "boolean":
                     self.last_values[device_id][sensor_id] = sensor_config["normal_value"]
+                elif is_derived(sensor_config):
+                    self.last_values[device_id][sensor_id] = 0.0
                 elif "increment_min" in sensor_config:
                     self.last_values[device_id][sensor_id] = 0
                 else:
                     normal_min = sensor_config["normal_min"]
                     normal_max = sensor_config["normal_max"]
                     self.last_values[device_id][sensor_id] = random.uniform(normal_min, normal_max)
+
+                    waveform = create_waveform(sensor_id, sensor_config)
+                    if waveform is not None:
+                        self.waveforms[device_id][sensor_id] = waveform
+                    pattern = create_failure_pattern(sensor_config)
+                    if pattern is not None:
+                        self.failure_patterns[device_id][sensor_id] = pattern
+
+        # 派生センサーの初期値を他のセンサーの初期値から計算
+        self.expression_graph.evaluate(self.last_values)
     
     def _calculate_next_failure_time(self) -> float:
         """
@@ -85,6 +158,7 @@ class DataGenerator:
                 # 故障から回復
                 state["is_failing"] = False
                 state["next_failure_time"] = self._calculate_next_failure_time()
+                self.failure_transitions.append((device_id, False, current_time))
                 print(f"デバイス '{self.devices[device_id]['name']}' が故障から回復しました")
             
             # 故障していないデバイスで次の故障時間に達したかチェック
@@ -93,14 +167,266 @@ class DataGenerator:
                 state["is_failing"] = True
                 failure_duration = self._calculate_failure_duration()
                 state["failure_end_time"] = current_time + failure_duration
+                self.failure_transitions.append((device_id, True, current_time))
                 print(f"デバイス '{self.devices[device_id]['name']}' が故障しました。予想復旧時間: {failure_duration:.1f}秒後")
     
+    def _update_active_sensors(self):
+        """有効なデバイスと上限数から生成対象のセンサーを決定（設定ファイルの記述順に上限数まで）"""
+        remaining = self.sensor_limit
+        self.active_sensors = {}
+        for device_id, device_config in self.devices.items():
+            if not self.device_states[device_id]["enabled"]:
+                continue
+            sensors = list(device_config["sensors"].items())
+            if remaining is not None:
+                sensors = sensors[:remaining]
+                remaining -= len(sensors)
+            if sensors:
+                self.active_sensors[device_id] = sensors
+        self._update_tick_sensors()
+    
+    def _update_tick_sensors(self, device_ids: Optional[Set[str]] = None):
+        """
+        ティックごとに生成するセンサーを決定（遅延生成では生成が必要なセンサーだけ）
+
+        Args:
+            device_ids: 対象のデバイスID（Noneの場合は全デバイス）
+        """
+        if not self.lazy:
+            self.tick_sensors = self.active_sensors
+        else:
+            # 出力先が生成対象の変化を検出できるよう、辞書は作り直す（変わったデバイスのリストだけを作り直す）
+            tick_sensors = dict(self.tick_sensors) if device_ids is not None else {}
+            for device_id in self.active_sensors if device_ids is None else device_ids:
+                sensors = [
+                    (sensor_id, sensor_config)
+                    for sensor_id, sensor_config in self.active_sensors.get(device_id, ())
+                    if (device_id, sensor_id) in self._demand
+                ]
+                if sensors:
+                    tick_sensors[device_id] = sensors
+                else:
+                    tick_sensors.pop(device_id, None)
+            self.tick_sensors = tick_sensors
+        self._active_sensors_changed = True
+    
+    def set_update_divisors(self, divisors: Dict[str, int]):
+        """
+        デバイスの更新頻度を下げる（生成しないティックでは、そのデバイスを生成結果に含めない）
+
+        Args:
+            divisors: デバイスID -> 何ティックに1回生成するか（空の場合は全てのデバイスを毎ティック生成する）
+        """
+        for device_id, divisor in divisors.items():
+            if device_id not in self.devices:
+                raise KeyError(f"デバイスが見つかりません: {device_id}")
+            if divisor < 1:
+                raise ValueError(f"更新頻度の除数は1以上である必要があります: {divisor}")
+        self.update_divisors = {device_id: divisor for device_id, divisor in divisors.items() if divisor > 1}
+    
+    def enable_lazy_generation(self):
+        """遅延生成を有効にする（以降は set_monitored で購読中としたセンサーだけをティックごとに生成する）"""
+        if self.lazy:
+            return
+        self.lazy = True
+        for device_id, device_config in self.devices.items():
+            for sensor_id in device_config["sensors"]:
+                if (device_id, sensor_id) not in self._demand:
+                    self._stale_since[(device_id, sensor_id)] = (self.tick_count, self.current_time)
+        self._update_tick_sensors()
+    
+    def set_monitored(self, device_id: str, sensor_id: str, monitored: bool):
+        """
+        センサーの購読状態を設定（遅延生成で、購読中のセンサーと、購読中の派生センサーが参照するセンサーをティックごとに生成する）
+
+        Args:
+            device_id: デバイスID
+            sensor_id: センサーID
+            monitored: 購読中の場合True
+        """
+        key = (device_id, sensor_id)
+        if monitored == (key in self.monitored):
+            return
+        if monitored:
+            self.monitored.add(key)
+        else:
+            self.monitored.discard(key)
+        changed: Set[str] = set()
+        self._add_demand(key, 1 if monitored else -1, changed)
+        if self.lazy and changed:
+            self._update_tick_sensors(changed)
+    
+    def _add_demand(self, key: TagKey, delta: int, changed: Set[str]):
+        """生成が必要な理由の数を増減し、生成の開始・停止が変わったデバイスをchangedに加える"""
+        before = self._demand.get(key, 0)
+        count = before + delta
+        if count > 0:
+            self._demand[key] = count
+        else:
+            self._demand.pop(key, None)
+        # 派生センサーが参照するセンサーも生成する（先に参照先を現在まで進める）
+        for reference in self.expression_graph.references.get(key, ()):
+            self._add_demand(reference, delta, changed)
+        if not self.lazy or (before > 0) == (count > 0):
+            return
+        changed.add(key[0])
+        if count > 0:
+            # 生成を再開する前に現在まで進める
+            self.refresh(*key)
+            del self._stale_since[key]
+        else:
+            self._stale_since[key] = (self.tick_count, self.current_time)
+    
+    def refresh(self, device_id: str, sensor_id: str) -> Union[float, bool, int]:
+        """
+        センサーの値を現在のティックまで進めて取得（ティックごとに生成しているセンサーはそのまま最後の値を返す）
+
+        生成を止めていた間のティックは、FAST_FORWARD_STEPS以下なら1ティックずつ、超える場合は閉じた式でまとめて進める。
+        止めていた間の故障状態は現在の状態で代用する。
+
+        Args:
+            device_id: デバイスID
+            sensor_id: センサーID
+
+        Returns:
+            Union[float, bool, int]: センサー値
+        """
+        key = (device_id, sensor_id)
+        since = self._stale_since.get(key)
+        if since is not None and since[0] < self.tick_count:
+            self._stale_since[key] = (self.tick_count, self.current_time)
+            sensor_config = self.devices[device_id]["sensors"][sensor_id]
+            if is_derived(sensor_config):
+                for reference in self.expression_graph.references[key]:
+                    self.refresh(*reference)
+                self.expression_graph.evaluate(self.last_values)
+            elif self.device_states[device_id]["enabled"]:
+                self._fast_forward(device_id, sensor_id, sensor_config, self.tick_count - since[0], self.current_time - since[1])
+        return self.last_values[device_id][sensor_id]
+    
+    def _fast_forward(self, device_id: str, sensor_id: str, sensor_config: Dict[str, Any], steps: int, elapsed: float):
+        """
+        センサーの値をstepsティック分進める
+
+        Args:
+            device_id: デバイスID
+            sensor_id: センサーID
+            sensor_config: センサー設定
+            steps: 進めるティック数
+            elapsed: 進める時間（秒）
+        """
+        is_failing = self.device_states[device_id]["is_failing"]
+        last_values = self.last_values[device_id]
+        if steps > FAST_FORWARD_STEPS and sensor_config.get("type") != "boolean":
+            if "increment_min" in sensor_config:
+                # カウンター: steps回の増分の合計を正規分布で近似し、最大値を超えた分は最小値から数え直す
+                increment_min = sensor_config["increment_min"]
+                increment_max = sensor_config.get("increment_max", increment_min)
+                if is_failing and sensor_config.get("failure_increment") == 0:
+                    total = 0
+                else:
+                    mean = steps * (increment_min + increment_max) / 2
+                    deviation = math.sqrt(steps * ((increment_max - increment_min + 1) ** 2 - 1) / 12)
+                    total = max(0, round(random.gauss(mean, deviation)))
+                last_values[sensor_id] = wrap_counter(sensor_config, last_values[sensor_id] + total)
+                return
+            # 数値: 目標値への指数的な接近をsteps-1回分まとめて計算し（目標値の乱数の和は正規分布で近似）、最後の1回は通常どおり生成する
+            if is_failing and sensor_id not in self.failure_patterns[device_id]:
+                target_min, target_max = sensor_config["failure_min"], sensor_config["failure_max"]
+            else:
+                target_min, target_max = sensor_config["normal_min"], sensor_config["normal_max"]
+            decay = (1.0 - CHANGE_RATE) ** (steps - 1)
+            variance = (1.0 - decay ** 2) / (1.0 - (1.0 - CHANGE_RATE) ** 2) / 12
+            value = last_values[sensor_id] * decay + (target_min + target_max) / 2 * (1.0 - decay)
+            value += random.gauss(0.0, (target_max - target_min) * CHANGE_RATE * math.sqrt(variance))
+            last_values[sensor_id] = max(sensor_config["min"], min(value, sensor_config["max"]))
+            steps = 1
+        interval = elapsed / steps
+        for _ in range(steps):
+            last_values[sensor_id] = self._generate_sensor_value(device_id, sensor_id, sensor_config, is_failing, interval)
+    
+    def set_device_enabled(self, device_id: str, enabled: bool):
+        """
+        デバイスの有効・無効を切り替える（無効なデバイスは値を生成しない）
+
+        Args:
+            device_id: デバイスID
+            enabled: 有効にする場合True
+        """
+        if device_id not in self.devices:
+            raise KeyError(f"デバイスが見つかりません: {device_id}")
+        self.device_states[device_id]["enabled"] = enabled
+        self._update_active_sensors()
+    
+    def set_sensor_limit(self, limit: Optional[int]):
+        """
+        生成対象のセンサー数の上限を設定
+
+        Args:
+            limit: 上限数。Noneの場合は全センサー
+        """
+        if limit is not None and limit < 0:
+            raise ValueError(f"センサー数の上限は0以上である必要があります: {limit}")
+        self.sensor_limit = limit
+        self._update_active_sensors()
+    
+    @property
+    def active_sensor_count(self) -> int:
+        """生成対象のセンサー数"""
+        return sum(len(sensors) for sensors in self.active_sensors.values())
+    
+    def set_mean_time_between_failures(self, mean_time: float):
+        """
+        平均故障間隔を変更し、故障していないデバイスの次の故障時間を再計算
+
+        Args:
+            mean_time: 平均故障間隔（秒）
+        """
+        if mean_time <= 0:
+            raise ValueError(f"平均故障間隔は正の値である必要があります: {mean_time}")
+        self.failure_config["mean_time_between_failures"] = mean_time
+        for state in self.device_states.values():
+            if not state["is_failing"]:
+                state["next_failure_time"] = self._calculate_next_failure_time()
+    
+    def force_failure(self, device_id: str, duration: Optional[float] = None):
+        """
+        デバイスを強制的に故障させる
+
+        Args:
+            device_id: デバイスID
+            duration: 故障の継続時間（秒）。指定がない場合は設定の範囲からランダムに決定
+        """
+        if device_id not in self.devices:
+            raise KeyError(f"デバイスが見つかりません: {device_id}")
+        if duration is None:
+            duration = self._calculate_failure_duration()
+        state = self.device_states[device_id]
+        current_time = time.time()
+        if not state["is_failing"]:
+            self.failure_transitions.append((device_id, True, current_time))
+        state["is_failing"] = True
+        state["failure_end_time"] = current_time + duration
+        print(f"デバイス '{self.devices[device_id]['name']}' を強制的に故障させました。予想復旧時間: {duration:.1f}秒後")
+    
+    def pop_failure_transitions(self) -> List[Tuple[str, bool, float]]:
+        """
+        前回の呼び出し以降の故障の発生・回復を取り出す
+
+        Returns:
+            List[Tuple[str, bool, float]]: （デバイスID, 故障中か, 時刻）のリスト（発生順）
+        """
+        transitions = list(self.failure_transitions)
+        self.failure_transitions.clear()
+        return transitions
+    
     def _generate_sensor_value(
         self, 
         device_id: str, 
         sensor_id: str, 
         sensor_config: Dict[str, Any],
-        is_failing: bool
+        is_failing: bool,
+        dt: Optional[float] = None
     ) -> Union[float, bool, int]:
         """
         センサー値を生成
@@ -110,6 +436,7 @@ class DataGenerator:
             sensor_id: センサーID
             sensor_config: センサー設定
             is_failing: 故障中かどうか
+            dt: 前回の生成からの経過時間（Noneの場合は前回ティックからの経過時間）
 
         Returns:
             Union[float, bool, int]: 生成されたセンサー値
@@ -130,14 +457,19 @@ class DataGenerator:
                 sensor_config["increment_min"], 
                 sensor_config.get("increment_max", sensor_config["increment_min"])
             )
-            new_value = last_value + increment
-            # 最大値を超えないようにする
-            if "max" in sensor_config and new_value > sensor_config["max"]:
-                new_value = sensor_config["min"]
-            return new_value
-        
-        # 通常の数値センサー
-        if is_failing:
+            # 最大値を超えた場合は最小値から数え直す
+            return wrap_counter(sensor_config, last_value + increment)
+        
+        # 故障パターンの開始・終了
+        pattern = self.failure_patterns[device_id].get(sensor_id)
+        if pattern is not None:
+            if is_failing and not pattern.active:
+                pattern.begin(last_value, self.current_time)
+            elif not is_failing and pattern.active:
+                pattern.reset()
+        
+        # 通常の数値センサー（故障パターンがある場合は正常時の値を元に故障中の値を作る）
+        if is_failing and pattern is None:
             target_min = sensor_config["failure_min"]
             target_max = sensor_config["failure_max"]
         else:
@@ -147,45 +479,83 @@ class DataGenerator:
         # 現在値から目標範囲内の値へ徐々に変化させる
         target = random.uniform(target_min, target_max)
         # 前回の値と目標値の間を補間（急激な変化を避けるため）
-        change_rate = 0.1  # 変化率（0.1 = 10%の変化）
-        new_value = last_value + (target - last_value) * change_rate
+        new_value = last_value + (target - last_value) * CHANGE_RATE
         
-        # 一部のセンサーに周期的な変動を追加
-        if sensor_id in ["speed", "pressure", "rotation_speed", "temperature"]:
-            # sin波による周期的な変動を追加
-            period = 60.0  # 周期（秒）
-            amplitude = (target_max - target_min) * 0.05  # 振幅（範囲の5%）
-            new_value += amplitude * math.sin(time.time() * 2 * math.pi / period)
+        # 波形による変動を追加（振幅は目標範囲に対する割合）
+        waveform = self.waveforms[device_id].get(sensor_id)
+        if waveform is not None:
+            new_value += (target_max - target_min) * waveform.step(self.tick_interval if dt is None else dt)
+        
+        if is_failing and pattern is not None:
+            new_value = pattern.apply(new_value, self.current_time)
         
         # 値の範囲を制限
         new_value = max(sensor_config["min"], min(new_value, sensor_config["max"]))
         
         return new_value
     
-    def generate_data(self) -> Dict[str, Dict[str, Union[float, bool, int]]]:
+    def generate_data(
+        self,
+        out: Optional[Dict[str, Dict[str, Union[float, bool, int]]]] = None
+    ) -> Dict[str, Dict[str, Union[float, bool, int]]]:
         """
-        全デバイスのセンサーデータを生成
+        全デバイスのセンサーデータを生成（遅延生成が有効な場合は tick_sensors のセンサーだけ）
+
+        Args:
+            out: 結果を書き込む辞書。指定した場合は毎ティック同じ辞書を再利用し、新しい辞書を割り当てない
 
         Returns:
             Dict: デバイスとセンサーの階層構造でデータを返す
         """
+        # ティックの時刻を更新（波形の位相は前回ティックからの経過時間だけ進める）
+        current_time = time.time()
+        self.tick_interval = current_time - self.current_time
+        self.current_time = current_time
+        self.tick_count += 1
+        
         # 故障状態を更新
         self._update_failure_states()
         
-        result = {}
+        result = {} if out is None else out
+        # 生成対象が変わった場合は、対象外になったデバイス・センサーの値を出力先から取り除く
+        if self._active_sensors_changed:
+            result.clear()
+            self._active_sensors_changed = False
         
-        for device_id, device_config in self.devices.items():
-            device_data = {}
+        divisors = self.update_divisors
+        for device_id, sensors in self.tick_sensors.items():
+            dt = None
+            if divisors:
+                divisor = divisors.get(device_id, 1)
+                if self.tick_count % divisor:
+                    # 更新頻度を下げたデバイスは、生成しないティックでは出力先に含めない
+                    result.pop(device_id, None)
+                    continue
+                if divisor > 1:
+                    dt = self.tick_interval * divisor
+            device_data = result.get(device_id)
+            if device_data is None:
+                device_data = result[device_id] = {}
             is_failing = self.device_states[device_id]["is_failing"]
             
-            for sensor_id, sensor_config in device_config["sensors"].items():
+            for sensor_id, sensor_config in sensors:
+                # 派生センサーは全センサーの生成後にまとめて評価する
+                if is_derived(sensor_config):
+                    device_data[sensor_id] = self.last_values[device_id][sensor_id]
+                    continue
                 # センサー値を生成
-                value = self._generate_sensor_value(device_id, sensor_id, sensor_config, is_failing)
+                value = self._generate_sensor_value(device_id, sensor_id, sensor_config, is_failing, dt)
                 # 結果を保存
                 device_data[sensor_id] = value
                 # 最後の値を更新
                 self.last_values[device_id][sensor_id] = value
-            
-            result[device_id] = device_data
+        
+        # 派生センサーを依存関係順に一括評価（生成対象外のセンサーも参照できるよう最後の値の上で評価する）
+        if len(self.expression_graph):
+            self.expression_graph.evaluate(self.last_values)
+            for device_id, sensor_id in self.expression_graph.order:
+                device_data = result.get(device_id)
+                if device_data is not None and sensor_id in device_data:
+                    device_data[sensor_id] = self.last_values[device_id][sensor_id]
         
         return result
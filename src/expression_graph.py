@@ -0,0 +1,209 @@
+"""
+派生センサーの式をコンパイルして評価するモジュール
+
+派生センサーは他のタグを参照する式で定義する。例:
+
+    line_power:
+      name: "LinePower"
+      type: "derived"
+      expression: "sum(conveyor_belt.current, welding_robot.welding_current) * voltage / 1000"
+
+式の参照は ``デバイスID.センサーID`` 形式、または同じデバイス内のセンサーIDのみで記述する。
+全ての派生センサーは依存関係順に並べた1つの関数にコンパイルされ、1ティックにつき1回の呼び出しで評価される。
+"""
+import ast
+from graphlib import CycleError, TopologicalSorter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+TagKey = Tuple[str, str]
+
+
+def _f_sum(*values):
+    """引数の合計"""
+    return sum(values)
+
+
+def _f_avg(*values):
+    """引数の平均"""
+    return sum(values) / len(values) if values else 0.0
+
+
+def _f_clamp(value, lower, upper):
+    """値を範囲内に制限"""
+    return max(lower, min(value, upper))
+
+
+def _div(numerator, denominator):
+    """ゼロ除算時に0.0を返す除算（故障で停止した機器の値を分母にしても評価を止めない）"""
+    return numerator / denominator if denominator else 0.0
+
+
+# 式中で使用できる関数
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "sum": _f_sum,
+    "avg": _f_avg,
+    "min": min,
+    "max": max,
+    "abs": abs,
+    "clamp": _f_clamp,
+}
+
+# 式中で使用できる構文要素
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+    ast.Call, ast.Name, ast.Attribute, ast.Constant, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow,
+    ast.USub, ast.UAdd, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+
+def is_derived(sensor_config: Dict[str, Any]) -> bool:
+    """
+    派生センサーかどうかを判定
+
+    Args:
+        sensor_config: センサー設定
+
+    Returns:
+        bool: 派生センサーの場合True
+    """
+    return sensor_config.get("type") == "derived"
+
+
+class _ReferenceRewriter(ast.NodeTransformer):
+    """式中のタグ参照をデバイス辞書への添字アクセスに書き換える"""
+
+    def __init__(self, devices: Dict[str, Any], device_id: str, device_vars: Dict[str, str]):
+        self.devices = devices
+        self.device_id = device_id
+        self.device_vars = device_vars
+        self.references: List[TagKey] = []
+
+    def _reference(self, node: ast.AST, device_id: str, sensor_id: str) -> ast.AST:
+        device_config = self.devices.get(device_id)
+        if device_config is None or sensor_id not in device_config["sensors"]:
+            raise ValueError(f"派生センサー '{self.device_id}' の式が未定義のタグを参照しています: {device_id}.{sensor_id}")
+        self.references.append((device_id, sensor_id))
+        var = self.device_vars.setdefault(device_id, f"_d{len(self.device_vars)}")
+        return ast.copy_location(
+            ast.Subscript(value=ast.Name(id=var, ctx=ast.Load()), slice=ast.Constant(sensor_id), ctx=ast.Load()),
+            node,
+        )
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        if not isinstance(node.value, ast.Name):
+            raise ValueError(f"サポートされていない参照です: {ast.unparse(node)}")
+        return self._reference(node, node.value.id, node.attr)
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        return self._reference(node, self.device_id, node.id)
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise ValueError(f"サポートされていない関数呼び出しです: {ast.unparse(node)}")
+        node.args = [self.visit(arg) for arg in node.args]
+        node.func = ast.copy_location(ast.Name(id=f"_f_{node.func.id}", ctx=ast.Load()), node.func)
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Div):
+            return ast.copy_location(
+                ast.Call(func=ast.Name(id="_div", ctx=ast.Load()), args=[node.left, node.right], keywords=[]),
+                node,
+            )
+        return node
+
+
+class ExpressionGraph:
+    """派生センサーの依存グラフ"""
+
+    def __init__(self, devices: Dict[str, Any]):
+        """
+        初期化（派生センサーの式を解析してコンパイルする）
+
+        Args:
+            devices: デバイス設定
+        """
+        self.devices = devices
+        # 評価順（依存関係順）に並んだ派生センサー
+        self.order: List[TagKey] = []
+        # 派生センサー -> 式が参照するタグ
+        self.references: Dict[TagKey, List[TagKey]] = {}
+        self.source = ""
+        self._evaluate: Optional[Callable[[Dict[str, Dict[str, Any]]], None]] = None
+        self._compile()
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _compile(self):
+        """全ての派生センサーを1つの評価関数にコンパイル"""
+        device_vars: Dict[str, str] = {}
+        expressions: Dict[TagKey, str] = {}
+        graph: Dict[TagKey, List[TagKey]] = {}
+
+        for device_id, device_config in self.devices.items():
+            for sensor_id, sensor_config in device_config["sensors"].items():
+                if not is_derived(sensor_config):
+                    continue
+                if "expression" not in sensor_config:
+                    raise ValueError(f"派生センサーに式がありません: {device_id}.{sensor_id}")
+
+                try:
+                    tree = ast.parse(str(sensor_config["expression"]), mode="eval")
+                except SyntaxError as e:
+                    raise ValueError(f"派生センサーの式の解析エラー: {device_id}.{sensor_id}: {e}")
+                for node in ast.walk(tree):
+                    if not isinstance(node, _ALLOWED_NODES):
+                        raise ValueError(
+                            f"派生センサーの式にサポートされていない構文があります: {device_id}.{sensor_id}: {type(node).__name__}"
+                        )
+
+                # 書き込み先のデバイスも評価関数の先頭で束縛する
+                device_vars.setdefault(device_id, f"_d{len(device_vars)}")
+                rewriter = _ReferenceRewriter(self.devices, device_id, device_vars)
+                body = rewriter.visit(tree.body)
+                code = f"float({ast.unparse(body)})"
+                if "min" in sensor_config and "max" in sensor_config:
+                    code = f"_f_clamp({code}, {float(sensor_config['min'])!r}, {float(sensor_config['max'])!r})"
+
+                key = (device_id, sensor_id)
+                expressions[key] = code
+                self.references[key] = list(dict.fromkeys(rewriter.references))
+                # 派生センサー同士の依存のみがグラフの辺になる
+                graph[key] = [ref for ref in rewriter.references if is_derived(self.devices[ref[0]]["sensors"][ref[1]])]
+
+        try:
+            self.order = list(TopologicalSorter(graph).static_order())
+        except CycleError as e:
+            raise ValueError(f"派生センサーの式に循環参照があります: {e.args[1]}")
+
+        self.source = self._build_source(device_vars, expressions)
+
+        namespace: Dict[str, Any] = {f"_f_{name}": func for name, func in FUNCTIONS.items()}
+        namespace["_div"] = _div
+        exec(compile(self.source, "<derived-sensors>", "exec"), namespace)
+        self._evaluate = namespace["_evaluate"]
+
+    def _build_source(self, device_vars: Dict[str, str], expressions: Dict[TagKey, str]) -> str:
+        """評価関数のソースを生成"""
+        lines = ["def _evaluate(data):"]
+        for device_id, var in device_vars.items():
+            lines.append(f"    {var} = data[{device_id!r}]")
+        for device_id, sensor_id in self.order:
+            lines.append(f"    {device_vars[device_id]}[{sensor_id!r}] = {expressions[(device_id, sensor_id)]}")
+        lines.append("    return None")
+        return "\n".join(lines)
+
+    def evaluate(self, data: Dict[str, Dict[str, Any]]):
+        """
+        全ての派生センサーを評価し、結果をdataに書き込む
+
+        Args:
+            data: デバイスとセンサーの階層構造の値（派生センサーの値はここに上書きされる）
+        """
+        if self.order:
+            self._evaluate(data)
@@ -0,0 +1,194 @@
+"""
+過負荷のときにシミュレーションを段階的に軽くするモジュール
+
+ホストの負荷が高くティック処理が更新間隔に収まらなくなると、update_dataは遅れ続け、全てのクライアントに古く不規則な値が届く。
+LoadGovernorはティックの処理時間を更新間隔と比べ、過負荷が続いた場合は設定した段階（steps）を1つずつ適用し、
+余裕が戻った場合は逆の順に1つずつ元に戻す。段階が変わるたびにログを出力する。
+
+- reduce_rate: 優先度がlowのデバイスを divisor ティックに1回だけ生成・配信する
+- widen_deadband: 優先度がcritical以外の数値タグで、前回書き込んだ値からの変化が範囲（max - min）の deadband 未満の値を書き込まない
+- pause_sinks: OPC-UA以外のシンク（MQTT・Modbus/TCP・共有メモリ）への配信を止める
+
+優先度がcriticalのデバイスのタグは、どの段階でも毎ティック生成して書き込む。
+
+config.yamlの `governor` セクションで設定し、デバイスの優先度はデバイスの `priority` で指定する（low / normal / critical、省略時はnormal）。
+
+    governor:
+      enabled: true   # デフォルトは無効
+      high_load: 0.8  # 処理時間 / 更新間隔 がこれを超えるティックが sustain 回続いたら1段階進める
+      low_load: 0.5   # これを下回るティックが sustain 回続いたら1段階戻す
+      sustain: 5
+      steps:
+        - action: reduce_rate
+          divisor: 4
+        - action: widen_deadband
+          deadband: 0.01
+        - action: pause_sinks
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+
+# 設定ファイルで指定できる段階の種類
+ACTIONS = ("reduce_rate", "widen_deadband", "pause_sinks")
+# デバイスの優先度
+PRIORITIES = ("low", "normal", "critical")
+# stepsを省略した場合の段階
+DEFAULT_STEPS = [
+    {"action": "reduce_rate", "divisor": 4},
+    {"action": "widen_deadband", "deadband": 0.01},
+    {"action": "pause_sinks"},
+]
+
+logger = logging.getLogger(__name__)
+
+
+def device_priority(device_config: Dict[str, Any]) -> str:
+    """
+    デバイスの優先度を取得
+
+    Args:
+        device_config: デバイス設定
+
+    Returns:
+        str: low, normalまたはcritical
+    """
+    priority = device_config.get("priority", "normal")
+    if priority not in PRIORITIES:
+        raise ValueError(f"サポートされていない優先度です: {priority}（{', '.join(PRIORITIES)}）")
+    return priority
+
+
+def _validate_step(step: Dict[str, Any]) -> Dict[str, Any]:
+    """段階の設定を検証"""
+    action = step.get("action")
+    if action not in ACTIONS:
+        raise ValueError(f"サポートされていない段階です: {action}（{', '.join(ACTIONS)}）")
+    if action == "reduce_rate" and int(step.get("divisor", 4)) < 2:
+        raise ValueError(f"reduce_rateのdivisorは2以上である必要があります: {step['divisor']}")
+    if action == "widen_deadband" and not 0 < float(step.get("deadband", 0.01)) < 1:
+        raise ValueError(f"widen_deadbandのdeadbandは0より大きく1未満である必要があります: {step['deadband']}")
+    return step
+
+
+class LoadGovernor:
+    """ティックの処理時間を監視し、過負荷が続いた場合に段階的にシミュレーションを軽くするクラス"""
+
+    def __init__(self, simulator: Any, governor_config: Optional[Dict[str, Any]] = None, dry_run: bool = False):
+        """
+        初期化
+
+        Args:
+            simulator: 対象のOPC-UAサーバー（OpcUaServer）
+            governor_config: governorセクションの設定
+            dry_run: Trueの場合は段階の移り変わりを記録するだけで、シミュレーションには適用しない（ソークテストで使用）
+        """
+        self.simulator = simulator
+        self.dry_run = dry_run
+        self._note = "（記録のみ。シミュレーションには適用していません）" if dry_run else ""
+        self.governor_config = governor_config or {}
+        self.high_load = float(self.governor_config.get("high_load", 0.8))
+        self.low_load = float(self.governor_config.get("low_load", 0.5))
+        if not 0 < self.low_load < self.high_load:
+            raise ValueError(f"governorのlow_loadは0より大きくhigh_load未満である必要があります: {self.low_load}, {self.high_load}")
+        self.sustain = int(self.governor_config.get("sustain", 5))
+        if self.sustain < 1:
+            raise ValueError(f"governorのsustainは1以上である必要があります: {self.sustain}")
+        self.steps: List[Dict[str, Any]] = [_validate_step(step) for step in self.governor_config.get("steps", DEFAULT_STEPS)]
+
+        devices = simulator.config["devices"]
+        priorities = {device_id: device_priority(device_config) for device_id, device_config in devices.items()}
+        self.low_priority = [device_id for device_id, priority in priorities.items() if priority == "low"]
+        self.critical = [device_id for device_id, priority in priorities.items() if priority == "critical"]
+
+        # 適用中の段階の数
+        self.level = 0
+        # 直前のティックの負荷（処理時間 / 更新間隔）
+        self.load = 0.0
+        self._high_ticks = 0
+        self._low_ticks = 0
+        # 適用中のデッドバンド
+        self.deadband = 0.0
+        # 統計
+        self.transitions = 0
+
+    def observe(self, work_time: float):
+        """
+        ティックの処理時間から負荷を判定し、必要なら段階を進める・戻す（ティックの終了ごとに呼び出す）
+
+        Args:
+            work_time: ティックの処理時間（秒）
+        """
+        interval = self.simulator.update_interval
+        if interval <= 0:
+            return
+        self.load = work_time / interval
+        if self.load > self.high_load:
+            self._high_ticks += 1
+            self._low_ticks = 0
+        elif self.load < self.low_load:
+            self._low_ticks += 1
+            self._high_ticks = 0
+        else:
+            self._high_ticks = self._low_ticks = 0
+
+        if self._high_ticks >= self.sustain and self.level < len(self.steps):
+            step = self.steps[self.level]
+            self.level += 1
+            self._apply()
+            logger.warning(
+                f"負荷が高い状態が続いているため段階 {self.level}/{len(self.steps)}（{step['action']}）を適用しました{self._note}"
+                f"（処理時間 {work_time * 1000:.1f}ms / 更新間隔 {interval * 1000:.0f}ms）"
+            )
+        elif self._low_ticks >= self.sustain and self.level > 0:
+            self.level -= 1
+            step = self.steps[self.level]
+            self._apply()
+            logger.info(
+                f"負荷が下がったため段階 {self.level + 1}（{step['action']}）を元に戻しました{self._note}"
+                f"（処理時間 {work_time * 1000:.1f}ms / 更新間隔 {interval * 1000:.0f}ms）"
+            )
+
+    def _apply(self):
+        """
+        適用中の段階から状態を決めて反映する（同じ種類の段階が複数ある場合は後の段階の値を使う）
+
+        段階が変わった後は、新しい状態で改めて負荷の継続を数える。
+        """
+        divisor = 1
+        deadband = 0.0
+        paused = False
+        for step in self.steps[:self.level]:
+            if step["action"] == "reduce_rate":
+                divisor = int(step.get("divisor", 4))
+            elif step["action"] == "widen_deadband":
+                deadband = float(step.get("deadband", 0.01))
+            elif step["action"] == "pause_sinks":
+                paused = True
+
+        self.transitions += 1
+        self._high_ticks = self._low_ticks = 0
+        if self.dry_run:
+            return
+
+        simulator = self.simulator
+        simulator.data_generator.set_update_divisors({device_id: divisor for device_id in self.low_priority})
+        if deadband != self.deadband:
+            simulator.opcua_sink.set_deadband(deadband, self.critical)
+            self.deadband = deadband
+        simulator.fan_out.paused = paused
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        ガバナーの状態を取得
+
+        Returns:
+            Dict[str, Any]: 適用中の段階の数と種類、直前の負荷、段階が変わった回数
+        """
+        return {
+            "level": self.level,
+            "active_steps": [step["action"] for step in self.steps[:self.level]],
+            "load": self.load,
+            "transitions": self.transitions,
+            "dry_run": self.dry_run,
+        }
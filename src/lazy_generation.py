@@ -0,0 +1,159 @@
+"""
+購読されていないタグの値をティックごとに生成せず、読み取り時に生成するモジュール
+
+大規模な工場をシミュレートすると、ある時点で購読されているタグはごく一部になる。
+このモジュールはMonitoredItem（値の購読）の作成・削除を監視し、購読中のタグだけをDataGeneratorにティックごとに生成させる。
+購読されていないタグは、Readや購読の開始時（初期値の通知）に、生成を止めていた間の分を現在まで進めて値を返す
+（進め方は DataGenerator.refresh を参照）。ティックごとの負荷は設定したタグ数ではなく購読中のタグ数に比例する。
+
+config.yamlの `performance.lazy_generation` で有効にする。全てのセンサーの値を配信する公開モード（devices・both）や
+OPC-UA以外のシンク（MQTT・Modbus/TCP・共有メモリ）とは同時に使えない（その場合は全てのタグをティックごとに生成する）。
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, Set, Tuple
+
+from asyncua import Server, ua
+
+from data_generator import DataGenerator
+from tag_index import Tag, TagIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+class LazyGeneration:
+    """購読中のタグを追跡し、購読されていないタグを読み取り時に生成するクラス"""
+
+    def __init__(self, server: Server, data_generator: DataGenerator, tag_index: TagIndex):
+        """
+        初期化
+
+        Args:
+            server: asyncuaサーバー
+            data_generator: データ生成器
+            tag_index: タグのインデックス（センサーごとの変数を持つタグが対象）
+        """
+        self.server = server
+        self.data_generator = data_generator
+        self._tags: Dict[ua.NodeId, Tag] = {tag.nodeid: tag for tag in tag_index if tag.nodeid is not None}
+        # タグ -> 値の購読（MonitoredItem）の数
+        self.monitors: Dict[ua.NodeId, int] = {}
+        # 購読のハンドル -> タグ
+        self._handles: Dict[int, ua.NodeId] = {}
+        # アドレス空間に現在の値がないタグ（購読されていないタグと、購読を開始してまだティックで書き込まれていないタグ）
+        self.stale: Set[ua.NodeId] = set(self._tags)
+        self._resumed: Set[ua.NodeId] = set()
+        # 実行中のティックで書き込まれるタグ（ティックの開始前に購読を開始したタグ）
+        self._writing: Set[ua.NodeId] = set()
+        # 読み取り時に生成した値（同じティックの間は同じ値を返す）: タグ -> (ティック番号, 値)
+        self._values: Dict[ua.NodeId, Tuple[int, ua.DataValue]] = {}
+        self._status = ua.StatusCode()
+        self._add_datachange_callback: Callable = None
+        self._delete_datachange_callback: Callable = None
+        self._read_attribute_value: Callable = None
+        # 統計
+        self.reads = 0
+
+    def install(self):
+        """アドレス空間の購読の登録・削除と属性の読み取りを置き換え、遅延生成を有効にする（サーバーの起動前に呼び出す）"""
+        aspace = self.server.iserver.aspace
+        self._add_datachange_callback = aspace.add_datachange_callback
+        self._delete_datachange_callback = aspace.delete_datachange_callback
+        self._read_attribute_value = aspace.read_attribute_value
+        aspace.add_datachange_callback = self.add_datachange_callback
+        aspace.delete_datachange_callback = self.delete_datachange_callback
+        aspace.read_attribute_value = self.read_attribute_value
+        self.data_generator.enable_lazy_generation()
+        logger.info(f"遅延生成を有効にしました（対象のタグ: {len(self._tags)}）")
+
+    def add_datachange_callback(self, nodeid: ua.NodeId, attr: ua.AttributeIds, callback: Callable) -> Tuple[ua.StatusCode, int]:
+        """値の購読の登録（AddressSpace.add_datachange_callbackの置き換え）"""
+        status, handle = self._add_datachange_callback(nodeid, attr, callback)
+        if attr != ua.AttributeIds.Value or nodeid not in self._tags or not status.is_good():
+            return status, handle
+        self._handles[handle] = nodeid
+        count = self.monitors.get(nodeid, 0) + 1
+        self.monitors[nodeid] = count
+        if count == 1:
+            tag = self._tags[nodeid]
+            self.data_generator.set_monitored(tag.device_id, tag.sensor_id, True)
+            # 次のティックで書き込まれるまでは、読み取り時に生成した値を返す（初期値の通知を含む）
+            self._resumed.add(nodeid)
+        return status, handle
+
+    def delete_datachange_callback(self, handle: int):
+        """値の購読の削除（AddressSpace.delete_datachange_callbackの置き換え）"""
+        self._delete_datachange_callback(handle)
+        nodeid = self._handles.pop(handle, None)
+        if nodeid is None:
+            return
+        count = self.monitors[nodeid] - 1
+        if count:
+            self.monitors[nodeid] = count
+            return
+        del self.monitors[nodeid]
+        tag = self._tags[nodeid]
+        self.data_generator.set_monitored(tag.device_id, tag.sensor_id, False)
+        self._resumed.discard(nodeid)
+        self._writing.discard(nodeid)
+        self.stale.add(nodeid)
+
+    def read_attribute_value(self, nodeid: ua.NodeId, attr: ua.AttributeIds) -> ua.DataValue:
+        """属性の読み取り（AddressSpace.read_attribute_valueの置き換え）"""
+        if attr == ua.AttributeIds.Value and nodeid in self.stale:
+            return self.read(self._tags[nodeid])
+        return self._read_attribute_value(nodeid, attr)
+
+    def read(self, tag: Tag) -> ua.DataValue:
+        """
+        タグの値を現在のティックまで進めて取得
+
+        Args:
+            tag: タグ
+
+        Returns:
+            ua.DataValue: 値
+        """
+        tick = self.data_generator.tick_count
+        cached = self._values.get(tag.nodeid)
+        if cached is not None and cached[0] == tick:
+            return cached[1]
+        value = self.data_generator.refresh(tag.device_id, tag.sensor_id)
+        timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+        data_value = ua.DataValue(
+            Value=ua.Variant(value, tag.variant_type),
+            StatusCode_=self._status,
+            SourceTimestamp=timestamp,
+            ServerTimestamp=timestamp
+        )
+        self._values[tag.nodeid] = (tick, data_value)
+        self.reads += 1
+        return data_value
+
+    def begin(self):
+        """ティックの生成前に呼び出す（それまでに購読を開始したタグは、このティックで書き込まれる）"""
+        if self._resumed:
+            self._writing.update(self._resumed)
+            self._resumed.clear()
+
+    def commit(self):
+        """ティックの書き込み後に呼び出す（書き込まれたタグはアドレス空間の値を返すようにする）"""
+        if self._writing:
+            self.stale.difference_update(self._writing)
+            for nodeid in self._writing:
+                self._values.pop(nodeid, None)
+            self._writing.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        遅延生成の統計を取得
+
+        Returns:
+            Dict[str, int]: 対象・購読中のタグの数と、読み取り時に生成した回数
+        """
+        return {
+            "tags": len(self._tags),
+            "monitored_tags": len(self.monitors),
+            "lazy_reads": self.reads,
+        }
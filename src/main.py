@@ -1,15 +1,17 @@
 """
 OPC-UAサーバーシミュレーターのメインモジュール
 """
+import argparse
 import asyncio
 import logging
 import signal
 import sys
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from config_loader import load_config
 from data_generator import DataGenerator
 from opcua_server import OpcUaServer
+from performance import event_loop_factory
 
 
 def setup_logging():
@@ -23,12 +25,13 @@ def setup_logging():
     )
 
 
-async def main(config_path: Optional[str] = None):
+async def main(config_path: Optional[str] = None, config: Optional[Dict[str, Any]] = None):
     """
     メイン関数
 
     Args:
         config_path: 設定ファイルのパス（オプション）
+        config: 読み込み済みの設定データ（指定した場合はconfig_pathを読み込まない）
     """
     # ロギングの設定
     setup_logging()
@@ -36,8 +39,9 @@ async def main(config_path: Optional[str] = None):
     
     try:
         # 設定の読み込み
-        logger.info("設定を読み込んでいます...")
-        config = load_config(config_path)
+        if config is None:
+            logger.info("設定を読み込んでいます...")
+            config = load_config(config_path)
         
         # データ生成器の作成
         logger.info("データ生成器を初期化しています...")
@@ -46,6 +50,7 @@ async def main(config_path: Optional[str] = None):
         # OPC-UAサーバーの作成
         logger.info("OPC-UAサーバーを初期化しています...")
         server = OpcUaServer(config, data_generator)
+        logger.info(f"イベントループ: {type(asyncio.get_running_loop()).__module__}")
         
         # シグナルハンドラの設定
         loop = asyncio.get_event_loop()
@@ -87,4 +92,11 @@ async def shutdown(server: OpcUaServer, loop: asyncio.AbstractEventLoop):
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="OPC-UAサーバーシミュレーター")
+    parser.add_argument("--config", help="設定ファイルのパス")
+    args = parser.parse_args()
+    # イベントループはサーバーの起動前に決める必要があるため、先に設定を読み込み、同じ設定でサーバーを起動する
+    config = load_config(args.config)
+    loop_factory = event_loop_factory(config.get("performance", {}))
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(main(args.config, config))
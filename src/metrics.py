@@ -0,0 +1,82 @@
+"""
+ティック処理の計測を行うモジュール
+"""
+import gc
+import time
+import tracemalloc
+
+
+class TickMetrics:
+    """
+    ティックごとの処理時間とGC負荷を計測するクラス
+
+    GC負荷は、ティック中に割り当てられたGC追跡オブジェクトの正味の数（割り当て数 - 解放数）で表す。
+    第0世代のカウンターはGCのたびにリセットされるため、ティック中に発生したGCの回数×第0世代のしきい値を加算して補正する。
+    参照カウントですぐに解放される一時オブジェクトは正味の数に現れないため、tracemallocでトレース中の場合は
+    ティック中のメモリ使用量のピークと開始時の差（一時的に割り当てられたバイト数）も記録する。
+    """
+
+    def __init__(self):
+        """初期化"""
+        # 計測したティック数
+        self.ticks = 0
+        # 直前のティックの処理時間（秒）とGC追跡オブジェクトの割り当て数
+        self.last_work_time = 0.0
+        self.last_allocations = 0
+        # 直前のティックで一時的に割り当てられたバイト数（tracemallocでトレース中のみ）
+        self.last_allocated_bytes = 0
+        # 累計
+        self.total_work_time = 0.0
+        self.total_allocations = 0
+        self.total_allocated_bytes = 0
+        self.gc_collections = 0
+
+        self._start_time = 0.0
+        self._start_count = 0
+        self._start_collections = 0
+        self._start_traced = 0
+
+    @staticmethod
+    def _collections() -> int:
+        # どの世代のGCでも第0世代のカウンターはリセットされる
+        return sum(stats["collections"] for stats in gc.get_stats())
+
+    def begin(self):
+        """ティック処理の開始"""
+        self._start_collections = self._collections()
+        self._start_count = gc.get_count()[0]
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._start_traced = tracemalloc.get_traced_memory()[0]
+        self._start_time = time.perf_counter()
+
+    def end(self):
+        """ティック処理の終了"""
+        work_time = time.perf_counter() - self._start_time
+        count = gc.get_count()[0]
+        collections = self._collections() - self._start_collections
+
+        self.last_work_time = work_time
+        self.last_allocations = max(0, count - self._start_count + collections * gc.get_threshold()[0])
+        self.ticks += 1
+        self.total_work_time += work_time
+        self.total_allocations += self.last_allocations
+        self.gc_collections += collections
+        if tracemalloc.is_tracing():
+            self.last_allocated_bytes = tracemalloc.get_traced_memory()[1] - self._start_traced
+            self.total_allocated_bytes += self.last_allocated_bytes
+
+    @property
+    def allocations_per_tick(self) -> float:
+        """1ティックあたりの平均割り当て数"""
+        return self.total_allocations / self.ticks if self.ticks else 0.0
+
+    @property
+    def allocated_bytes_per_tick(self) -> float:
+        """1ティックあたりの平均の一時割り当てバイト数（tracemallocでトレース中のみ）"""
+        return self.total_allocated_bytes / self.ticks if self.ticks else 0.0
+
+    @property
+    def average_work_time(self) -> float:
+        """1ティックあたりの平均処理時間（秒）"""
+        return self.total_work_time / self.ticks if self.ticks else 0.0
@@ -0,0 +1,178 @@
+"""
+Modbus/TCPのレジスターとしてデータを公開するシンク
+
+全センサーを設定ファイルの記述順に2レジスター（32ビット、ビッグエンディアン、上位ワードが先）ずつ割り当てる。
+
+    数値センサー   : IEEE 754の単精度浮動小数点数
+    カウンター     : 符号なし32ビット整数
+    ブール型       : 0または1（符号なし32ビット整数）
+
+読み取り専用で、Read Holding Registers（0x03）とRead Input Registers（0x04）に同じレジスターで応答する。
+レジスターは1つのバイト列で保持し、ティックごとにその場で上書きする。ティックの更新はイベントループの1回の処理で完了するため、
+クライアントが途中まで更新されたティックを読み取ることはない。
+"""
+import asyncio
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+from sinks import Sink, Tick
+
+
+# MBAPヘッダー（トランザクションID, プロトコルID, 長さ, ユニットID）
+_MBAP = struct.Struct(">HHHB")
+_READ_REQUEST = struct.Struct(">BHH")
+# 応答のヘッダー（MBAPヘッダー, ファンクションコード, バイト数または例外コード）
+_RESPONSE_HEADER = struct.Struct(">HHHBBB")
+
+READ_HOLDING_REGISTERS = 0x03
+READ_INPUT_REGISTERS = 0x04
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+# 1回の要求で読み取れる最大レジスター数（Modbusの仕様）
+MAX_READ_COUNT = 125
+
+_FLOAT32 = struct.Struct(">f")
+_UINT32 = struct.Struct(">I")
+
+
+def register_type(sensor_config: Dict[str, Any]) -> str:
+    """
+    センサーの種類からレジスターの型を決定
+
+    Args:
+        sensor_config: センサー設定
+
+    Returns:
+        str: float32またはuint32
+    """
+    if sensor_config.get("type") == "boolean" or "increment_min" in sensor_config:
+        return "uint32"
+    return "float32"
+
+
+class ModbusSink(Sink):
+    """Modbus/TCPシンク"""
+
+    name = "modbus"
+
+    def __init__(self, sink_config: Dict[str, Any], devices: Dict[str, Any]):
+        """
+        初期化
+
+        Args:
+            sink_config: sinks.modbusセクションの設定
+            devices: デバイス設定
+        """
+        super().__init__(sink_config)
+        self.host = sink_config.get("host", "0.0.0.0")
+        self.port = int(sink_config.get("port", 5020))
+        # 先頭のレジスターのアドレス（0始まりのプロトコル上のアドレス）
+        self.base_address = int(sink_config.get("base_address", 0))
+
+        # デバイスごとの書き込み先（センサーID -> (バイト位置, 変換)）
+        self.layout: Dict[str, Dict[str, Tuple[int, struct.Struct]]] = {}
+        self.register_map: List[Dict[str, Any]] = []
+        offset = 0
+        for device_id, device_config in devices.items():
+            self.layout[device_id] = {}
+            for sensor_id, sensor_config in device_config["sensors"].items():
+                kind = register_type(sensor_config)
+                self.layout[device_id][sensor_id] = (offset, _FLOAT32 if kind == "float32" else _UINT32)
+                self.register_map.append({
+                    "address": self.base_address + offset // 2,
+                    "device_id": device_id,
+                    "sensor_id": sensor_id,
+                    "type": kind,
+                })
+                offset += 4
+        self.register_count = offset // 2
+        if self.base_address < 0 or self.base_address + self.register_count > 0x10000:
+            raise ValueError(f"modbus: レジスターがアドレス範囲（0〜65535）に収まりません: {self.base_address}")
+        self.registers = bytearray(offset)
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """Modbus/TCPサーバーを起動"""
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.logger.info(
+            f"Modbus/TCPサーバーを起動しました: {self.host}:{self.port}"
+            f"（レジスター {self.base_address}〜{self.base_address + self.register_count - 1}）"
+        )
+
+    async def stop(self):
+        """Modbus/TCPサーバーを停止"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def publish(self, tick: Tick):
+        """レジスターを更新"""
+        registers = self.registers
+        for device_id, values in tick.data.items():
+            layout = self.layout[device_id]
+            for sensor_id, value in values.items():
+                offset, converter = layout[sensor_id]
+                converter.pack_into(registers, offset, value)
+
+    def read_registers(self, address: int, count: int) -> bytes:
+        """
+        レジスターを読み取る
+
+        Args:
+            address: 先頭のアドレス
+            count: レジスター数
+
+        Returns:
+            bytes: レジスターの値（1レジスター2バイト）
+        """
+        start = (address - self.base_address) * 2
+        return bytes(self.registers[start:start + count * 2])
+
+    def handle_request(self, request: bytes) -> bytes:
+        """
+        1つの要求（MBAPヘッダーを含む）に対する応答を作成
+
+        Args:
+            request: 要求
+
+        Returns:
+            bytes: 応答
+        """
+        transaction_id, _, _, unit_id = _MBAP.unpack_from(request, 0)
+        function_code = request[_MBAP.size]
+
+        def exception(code: int) -> bytes:
+            return _RESPONSE_HEADER.pack(transaction_id, 0, 3, unit_id, function_code | 0x80, code)
+
+        if function_code not in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            return exception(ILLEGAL_FUNCTION)
+        if len(request) < _MBAP.size + _READ_REQUEST.size:
+            return exception(ILLEGAL_DATA_VALUE)
+
+        _, address, count = _READ_REQUEST.unpack_from(request, _MBAP.size)
+        if not 1 <= count <= MAX_READ_COUNT:
+            return exception(ILLEGAL_DATA_VALUE)
+        if address < self.base_address or address + count > self.base_address + self.register_count:
+            return exception(ILLEGAL_DATA_ADDRESS)
+
+        return _RESPONSE_HEADER.pack(
+            transaction_id, 0, 3 + count * 2, unit_id, function_code, count * 2
+        ) + self.read_registers(address, count)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """クライアントとの接続を処理"""
+        try:
+            while True:
+                header = await reader.readexactly(_MBAP.size)
+                _, protocol_id, length, _ = _MBAP.unpack(header)
+                if protocol_id != 0 or length < 2:
+                    break
+                request = header + await reader.readexactly(length - 1)
+                writer.write(self.handle_request(request))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,98 @@
+"""
+MQTTブローカーへデータを配信するシンク
+
+デバイスごとに1つのJSONメッセージを `{topic_prefix}/{デバイスID}` へ配信する。
+
+    {"timestamp": "2024-01-01T00:00:00.000000Z", "values": {"speed": 1.2, "motor_temperature": 45.3}}
+
+paho-mqttが必要（`pip install paho-mqtt`）。ネットワーク処理はpaho-mqttのバックグラウンドスレッドで行い、
+ブローカーに接続できない間のメッセージは `max_queued_messages` 件まで保持する。
+"""
+import json
+from typing import Any, Dict
+
+from sinks import Sink, Tick
+
+
+class MqttSink(Sink):
+    """MQTTシンク"""
+
+    name = "mqtt"
+
+    def __init__(self, sink_config: Dict[str, Any]):
+        """
+        初期化
+
+        Args:
+            sink_config: sinks.mqttセクションの設定
+        """
+        super().__init__(sink_config)
+        self.host = sink_config.get("host", "localhost")
+        self.port = int(sink_config.get("port", 1883))
+        self.topic_prefix = sink_config.get("topic_prefix", "factory").rstrip("/")
+        self.qos = int(sink_config.get("qos", 0))
+        if self.qos not in (0, 1, 2):
+            raise ValueError(f"mqtt: qosは0, 1, 2のいずれかである必要があります: {self.qos}")
+        self.retain = bool(sink_config.get("retain", False))
+        self.client_id = sink_config.get("client_id", "")
+        self.max_queued_messages = int(sink_config.get("max_queued_messages", 1000))
+        self.client = None
+        # デバイスごとのトピック（毎ティック文字列を組み立てない）
+        self._topics: Dict[str, str] = {}
+
+    async def start(self):
+        """ブローカーへの接続を開始（接続の完了は待たない）"""
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise ImportError("MQTTシンクを使用するにはpaho-mqttをインストールしてください（pip install paho-mqtt）")
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
+        self.client.max_queued_messages_set(self.max_queued_messages)
+        if self.sink_config.get("username"):
+            self.client.username_pw_set(self.sink_config["username"], self.sink_config.get("password"))
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.connect_async(self.host, self.port)
+        self.client.loop_start()
+
+    async def stop(self):
+        """ブローカーから切断"""
+        if self.client is not None:
+            self.client.disconnect()
+            self.client.loop_stop()
+            self.client = None
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            self.logger.error(f"MQTTブローカーへの接続に失敗しました: {reason_code}")
+        else:
+            self.logger.info(f"MQTTブローカーに接続しました: {self.host}:{self.port}")
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            self.logger.warning(f"MQTTブローカーから切断されました: {reason_code}")
+
+    def topic(self, device_id: str) -> str:
+        """
+        デバイスのトピックを取得
+
+        Args:
+            device_id: デバイスID
+
+        Returns:
+            str: トピック
+        """
+        topic = self._topics.get(device_id)
+        if topic is None:
+            topic = self._topics[device_id] = f"{self.topic_prefix}/{device_id}"
+        return topic
+
+    async def publish(self, tick: Tick):
+        """デバイスごとのメッセージを配信"""
+        if self.client is None:
+            return
+        timestamp = tick.timestamp.isoformat(timespec="microseconds") + "Z"
+        for device_id, values in tick.data.items():
+            payload = json.dumps({"timestamp": timestamp, "values": values}, separators=(",", ":"))
+            self.client.publish(self.topic(device_id), payload, qos=self.qos, retain=self.retain)
@@ -3,12 +3,192 @@ OPC-UAサーバーの実装
 """
 import asyncio
 import logging
-from typing import Dict, Any, Optional, Union
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional, Union
 
 from asyncua import Server, ua
 from asyncua.common.node import Node
 
+from alarms import AlarmManager
+from browse_cache import BrowseCache
+from control import ControlPlane
 from data_generator import DataGenerator
+from governor import LoadGovernor
+from lazy_generation import LazyGeneration
+from metrics import TickMetrics
+from performance import apply_transport_settings
+from security import apply_security
+from sessions import SessionGuard
+from sinks import FanOut, Sink, Tick, create_sinks
+from state_store import StateStore
+from tag_index import NodeIdAllocator, TagIndex, tag_path
+
+
+# 公開モード（sensors: センサーごとの変数 / devices: デバイスごとの配列変数 / both: 両方）
+PUBLISH_MODES = ("sensors", "devices", "both")
+
+
+def sensor_variant_type(sensor_config: Dict[str, Any]) -> ua.VariantType:
+    """
+    センサーの種類からOPC-UAの変数型を決定
+
+    Args:
+        sensor_config: センサー設定
+
+    Returns:
+        ua.VariantType: 変数型
+    """
+    if sensor_config.get("type") == "boolean":
+        return ua.VariantType.Boolean
+    if "increment_min" in sensor_config:  # カウンター型
+        return ua.VariantType.UInt32
+    return ua.VariantType.Double
+
+
+class OpcUaSink(Sink):
+    """
+    OPC-UAのアドレス空間へ書き込むシンク
+
+    書き込み先はサーバー内のメモリでクライアントの速度に左右されないため、キューを使わずティック処理の中で直接書き込む
+    （生成結果の辞書をコピーせずにそのまま使える）。
+    """
+
+    name = "opcua"
+    inline = True
+    # シミュレーターの主な出力先のため、負荷が高いときも止めない
+    pausable = False
+
+    def __init__(self, simulator: "OpcUaServer"):
+        """
+        初期化
+
+        Args:
+            simulator: 書き込み先のOPC-UAサーバー（OpcUaServer）
+        """
+        super().__init__()
+        self.simulator = simulator
+        # 状態コードは全ての書き込みで共有する
+        self.status = ua.StatusCode()
+        self._write = None
+        # デバイスごとのティックで生成するセンサーのタグ（生成対象が変わったときだけ作り直す）
+        self._tick_sensors = None
+        self._device_tags = {}
+        # サーバー側のデッドバンド（タグのスロット -> 書き込みを省く変化の幅。Noneの場合は全ての値を書き込む）
+        self.deadbands: Optional[List[float]] = None
+        # デッドバンドの有効中に最後に書き込んだ値（タグのスロット順）
+        self._written: List[float] = []
+        self.skipped = 0
+        # Readの高速化のスナップショット（有効な場合は書き込んだ値を記録する）
+        self._snapshot = None
+
+    async def start(self):
+        # アドレス空間へ直接書き込む（WriteParametersなどの要求オブジェクトを値ごとに作らない）
+        self._write = self.simulator.server.iserver.aspace.write_attribute_value
+        self._snapshot = self.simulator.read_snapshot
+
+    def _update_device_tags(self):
+        """ティックで生成するセンサーの順にタグを並べる"""
+        simulator = self.simulator
+        tick_sensors = simulator.data_generator.tick_sensors
+        if tick_sensors is self._tick_sensors:
+            return
+        self._tick_sensors = tick_sensors
+        self._device_tags = {
+            device_id: [simulator.tag_index.find(device_id, sensor_id) for sensor_id, _ in sensors]
+            for device_id, sensors in tick_sensors.items()
+        }
+
+    def set_deadband(self, fraction: float, exempt_devices: Iterable[str] = ()):
+        """
+        変化が小さい値の書き込みを省く（負荷が高いときに書き込みと通知の数を減らす）
+
+        Args:
+            fraction: 値の範囲（max - min）に対する割合（0の場合は全ての値を書き込む）
+            exempt_devices: 対象外のデバイスID
+        """
+        if fraction <= 0:
+            self.deadbands = None
+            return
+        exempt = set(exempt_devices)
+        devices = self.simulator.config["devices"]
+        deadbands = []
+        for tag in self.simulator.tag_index:
+            sensor_config = devices[tag.device_id]["sensors"][tag.sensor_id]
+            if (
+                tag.variant_type == ua.VariantType.Double and tag.device_id not in exempt
+                and "min" in sensor_config and "max" in sensor_config
+            ):
+                deadbands.append(fraction * (sensor_config["max"] - sensor_config["min"]))
+            else:
+                deadbands.append(0.0)
+        # 有効にした直後は全ての値を1度書き込む（無効の間に書き込んだ値と比べない）
+        self._written = [float("nan")] * len(deadbands)
+        self.deadbands = deadbands
+
+    async def publish(self, tick: Tick):
+        """OPC-UAノードの更新"""
+        simulator = self.simulator
+        write = self._write
+        status = self.status
+        timestamp = tick.timestamp
+        value_attr = ua.AttributeIds.Value
+        self._update_device_tags()
+        device_tags = self._device_tags
+        deadbands = self.deadbands
+        written = self._written
+        snapshot = self._snapshot
+        if snapshot is not None:
+            # スナップショットへはリストのまま記録し、配列はReadのときに作り直す
+            snapshot_values = snapshot.values
+            snapshot_status = snapshot.status
+            snapshot_timestamps = snapshot.timestamps
+            irregular = snapshot.irregular
+            status_value = status.value
+            win_timestamp = ua.datetime_to_win_epoch(timestamp)
+            snapshot.dirty = True
+        
+        for device_id, device_data in tick.data.items():
+            device_nodes = simulator.nodes[device_id]
+            
+            # 生成結果はデバイスごとに生成対象のセンサーの順に並んでいるため、タグと順番に対応付ける
+            # （値ごとにセンサーIDで引かず、NodeIdと変数型は初期化時に決定済み）
+            if simulator.publish_sensors:
+                for tag, value in zip(device_tags[device_id], device_data.values()):
+                    if deadbands is not None:
+                        deadband = deadbands[tag.slot]
+                        if deadband:
+                            if abs(value - written[tag.slot]) < deadband:
+                                self.skipped += 1
+                                continue
+                            written[tag.slot] = value
+                    result = await write(tag.nodeid, value_attr, ua.DataValue(
+                        Value=ua.Variant(value, tag.variant_type),
+                        StatusCode_=status,
+                        SourceTimestamp=timestamp,
+                        ServerTimestamp=timestamp
+                    ))
+                    result.check()
+                    if snapshot is not None:
+                        slot = tag.slot
+                        snapshot_values[slot] = value
+                        snapshot_status[slot] = status_value
+                        snapshot_timestamps[slot] = win_timestamp
+                        if irregular:
+                            irregular.discard(slot)
+            
+            # デバイスの配列変数は1回の書き込みでまとめて更新する（生成対象外のセンサーは最後の値）
+            if simulator.publish_devices:
+                last_values = simulator.data_generator.last_values[device_id]
+                result = await write(device_nodes["values"].nodeid, value_attr, ua.DataValue(
+                    Value=ua.Variant(
+                        [float(last_values[sensor_id]) for sensor_id in device_nodes["layout"]],
+                        ua.VariantType.Double
+                    ),
+                    StatusCode_=status,
+                    SourceTimestamp=timestamp,
+                    ServerTimestamp=timestamp
+                ))
+                result.check()
 
 
 class OpcUaServer:
@@ -35,13 +215,77 @@ class OpcUaServer:
         
         # ノードの参照を保持
         self.nodes = {}
+        # タグID（センサーのNodeIdの数値）からタグを引くインデックス
+        self.tag_index = TagIndex()
+        self.node_ids: Optional[NodeIdAllocator] = None
+        # Browse・ブラウズパスの変換結果のキャッシュ（初期化時に作成）
+        self.browse_cache: Optional[BrowseCache] = None
+        # 購読されていないタグの遅延生成（初期化時に作成）
+        self.lazy_generation: Optional[LazyGeneration] = None
+        # Readの高速化（ReadSnapshot。numpyが必要なため有効な場合だけ読み込む）
+        self.read_snapshot: Optional[Any] = None
         
         # 更新間隔
         self.update_interval = self.server_config["update_interval"]
         
+        # 公開モード
+        self.publish_mode = self.server_config.get("publish_mode", "sensors")
+        if self.publish_mode not in PUBLISH_MODES:
+            raise ValueError(f"サポートされていない公開モードです: {self.publish_mode}（{', '.join(PUBLISH_MODES)}）")
+        self.publish_sensors = self.publish_mode in ("sensors", "both")
+        self.publish_devices = self.publish_mode in ("devices", "both")
+        
+        # ティック処理の計測（処理時間とGC負荷）
+        self.metrics = TickMetrics()
+        
+        # 実行中の制御用メソッド
+        self.control = ControlPlane(self) if config.get("control", {}).get("enabled", False) else None
+        
+        # 故障の発生・回復を通知するアラーム（Alarms & Conditions）
+        alarm_config = config.get("alarms", {})
+        self.alarms = AlarmManager(alarm_config) if alarm_config.get("enabled", False) else None
+        
+        # 生成器の状態のスナップショット（再起動時に値・カウンター・故障タイマーを引き継ぐ）
+        state_config = config.get("state", {})
+        self.state_store = None
+        if state_config.get("enabled", False):
+            self.state_store = StateStore(state_config.get("path", "simulator_state.bin"), data_generator)
+        self.snapshot_interval = float(state_config.get("snapshot_interval", 10.0))
+        
+        # セッションごとの上限付き通知キュー（遅いクライアントの影響を他のクライアントやティック処理に広げない）
+        self.session_guard = SessionGuard(config.get("sessions", {}))
+        
+        # 出力先（OPC-UAと、設定で有効にしたMQTT・Modbus/TCPなど）
+        self.opcua_sink = OpcUaSink(self)
+        self.fan_out = FanOut([self.opcua_sink] + create_sinks(config))
+        
+        # 過負荷が続いた場合に優先度の低いデバイスから段階的に軽くする
+        governor_config = config.get("governor", {})
+        self.governor = LoadGovernor(self, governor_config) if governor_config.get("enabled", False) else None
+        
         # ロガーの設定
         self.logger = logging.getLogger(__name__)
         
+    def _node_paths(self) -> Dict[str, Optional[Any]]:
+        """
+        デバイスとセンサーのノードのパスを取得（NodeIdの事前の割り当てに使用）
+
+        Returns:
+            Dict[str, Optional[Any]]: ノードのパス -> 設定で指定されたNodeId
+        """
+        paths = {}
+        for device_id, device_config in self.config["devices"].items():
+            paths[device_id] = device_config.get("node_id")
+            if self.publish_devices:
+                paths[f"{device_id}/Values"] = None
+                paths[f"{device_id}/Values/SensorNames"] = None
+            for sensor_id, sensor_config in device_config["sensors"].items():
+                path = tag_path(device_id, sensor_id)
+                paths[path] = sensor_config.get("node_id")
+                if self.publish_sensors and "unit" in sensor_config:
+                    paths[f"{path}/EngineeringUnits"] = None
+        return paths
+    
     async def init(self):
         """サーバーの初期化"""
         # サーバーの初期化
@@ -49,19 +293,37 @@ class OpcUaServer:
         self.server.set_endpoint(self.server_config["endpoint"])
         self.server.set_server_name(self.server_config["name"])
         
+        # セキュリティポリシー、証明書、ユーザー認証
+        await apply_security(self.server, self.config.get("security", {}))
+        
+        # 通信のチューニング（チャンクサイズ、ソケットオプション）
+        apply_transport_settings(self.server, self.config.get("performance", {}).get("transport", {}))
+        self.session_guard.install(self.server)
+        
         # 名前空間の登録
         self.idx = await self.server.register_namespace(self.uri)
         
+        # NodeIdはパスのハッシュ（または設定のnode_id）から決め、再起動や設定の変更で変わらないようにする
+        self.node_ids = NodeIdAllocator(self.idx, self.server.iserver.aspace)
+        # ハッシュが重なった場合も設定の記述順によらず同じNodeIdになるよう、デバイスとセンサーのNodeIdを先に割り当てる
+        self.node_ids.reserve(self._node_paths())
+        allocate = self.node_ids.allocate
+        
         # オブジェクトの作成
         objects = self.server.nodes.objects
         
         # 工場オブジェクトの作成
-        factory = await objects.add_object(self.idx, "Factory")
+        factory = await objects.add_object(*allocate("/Factory", "Factory"))
         
         # 生産ラインの作成
-        production_line1 = await factory.add_object(self.idx, "ProductionLine1")
-        production_line2 = await factory.add_object(self.idx, "ProductionLine2")
-        environment = await factory.add_object(self.idx, "Environment")
+        production_line1 = await factory.add_object(*allocate("/Factory/ProductionLine1", "ProductionLine1"))
+        production_line2 = await factory.add_object(*allocate("/Factory/ProductionLine2", "ProductionLine2"))
+        environment = await factory.add_object(*allocate("/Factory/Environment", "Environment"))
+        
+        # 制御用メソッドの作成
+        if self.control is not None:
+            await self.control.init(factory, self.idx, self.node_ids)
+            self.control.install(self.server)
         
         # デバイスとセンサーの作成
         for device_id, device_config in self.config["devices"].items():
@@ -74,74 +336,155 @@ class OpcUaServer:
                 parent = environment
             
             # デバイスオブジェクトの作成
-            device_node = await parent.add_object(self.idx, device_config["name"])
+            device_node = await parent.add_object(*allocate(device_id, device_config["name"], device_config.get("node_id")))
             self.nodes[device_id] = {"node": device_node, "sensors": {}}
             
-            # センサーの作成
+            # デバイス全体を1つの配列変数として作成（センサー設定順の値をDouble配列で公開）
+            if self.publish_devices:
+                layout = list(device_config["sensors"].keys())
+                values_var = await device_node.add_variable(
+                    *allocate(f"{device_id}/Values", "Values"),
+                    ua.Variant([0.0] * len(layout), ua.VariantType.Double)
+                )
+                await values_var.write_value_rank(1)
+                await values_var.write_array_dimensions([len(layout)])
+                # 配列の各要素に対応するセンサー名
+                await values_var.add_property(
+                    *allocate(f"{device_id}/Values/SensorNames", "SensorNames"),
+                    ua.Variant([device_config["sensors"][sensor_id]["name"] for sensor_id in layout], ua.VariantType.String)
+                )
+                self.nodes[device_id]["values"] = values_var
+                self.nodes[device_id]["layout"] = layout
+            
+            # センサーの作成（センサーごとの変数を公開しない場合もタグIDは割り当てる）
             for sensor_id, sensor_config in device_config["sensors"].items():
-                sensor_name = sensor_config["name"]
+                path = tag_path(device_id, sensor_id)
+                tag_id = self.node_ids.numeric_id(path, sensor_config.get("node_id"))
+                variant_type = sensor_variant_type(sensor_config)
+                var = None
                 
-                # センサーの種類に応じた変数を作成
-                if sensor_config.get("type") == "boolean":
-                    var = await device_node.add_variable(
-                        self.idx, 
-                        sensor_name, 
-                        ua.Variant(sensor_config["normal_value"], ua.VariantType.Boolean)
-                    )
-                    # 単位の設定
-                    if "unit" in sensor_config:
-                        await var.add_property(self.idx, "EngineeringUnits", sensor_config["unit"])
-                elif "increment_min" in sensor_config:  # カウンター型
-                    var = await device_node.add_variable(
-                        self.idx, 
-                        sensor_name, 
-                        ua.Variant(0, ua.VariantType.UInt32)
-                    )
-                    # 単位の設定
-                    if "unit" in sensor_config:
-                        await var.add_property(self.idx, "EngineeringUnits", sensor_config["unit"])
-                else:  # 通常の数値型
+                if self.publish_sensors:
+                    # センサーの種類に応じた初期値で変数を作成
+                    if variant_type == ua.VariantType.Boolean:
+                        initial_value = sensor_config["normal_value"]
+                    elif variant_type == ua.VariantType.UInt32:  # カウンター型
+                        initial_value = 0
+                    else:  # 通常の数値型
+                        initial_value = 0.0
                     var = await device_node.add_variable(
-                        self.idx, 
-                        sensor_name, 
-                        ua.Variant(0.0, ua.VariantType.Double)
+                        ua.NodeId(tag_id, self.idx),
+                        ua.QualifiedName(sensor_config["name"], self.idx),
+                        ua.Variant(initial_value, variant_type)
                     )
                     # 単位の設定
                     if "unit" in sensor_config:
-                        await var.add_property(self.idx, "EngineeringUnits", sensor_config["unit"])
+                        await var.add_property(*allocate(f"{path}/EngineeringUnits", "EngineeringUnits"), sensor_config["unit"])
+                    
+                    # 変数を書き込み可能に設定
+                    await var.set_writable()
+                    
+                    # ノード参照を保存
+                    self.nodes[device_id]["sensors"][sensor_id] = var
                 
-                # 変数を書き込み可能に設定
-                await var.set_writable()
-                
-                # ノード参照を保存
-                self.nodes[device_id]["sensors"][sensor_id] = var
+                self.tag_index.add(tag_id, device_id, sensor_id, variant_type, var)
+        
+        # デバイスごとの故障アラーム（Factoryからイベントを発行する）
+        if self.alarms is not None:
+            await self.alarms.init(
+                self.server,
+                factory,
+                self.config["devices"],
+                {device_id: device_nodes["node"] for device_id, device_nodes in self.nodes.items()}
+            )
+        
+        # 階層は初期化後に変わらないため、名前空間のBrowse結果を事前に計算してキャッシュする
+        if self.config.get("performance", {}).get("browse_cache", True):
+            self.browse_cache = BrowseCache(self.server, self.idx)
+            self.browse_cache.install()
+            count = self.browse_cache.precompute()
+            self.logger.info(f"{count}ノードのBrowse結果をキャッシュしました")
+        
+        # 購読されていないタグはティックごとに生成せず、読み取り時に生成する
+        if self.config.get("performance", {}).get("lazy_generation", False):
+            if self.publish_devices or len(self.fan_out.sinks) > 1:
+                self.logger.warning(
+                    "遅延生成は公開モードがsensorsで、OPC-UA以外のシンクがない場合だけ使えます。全てのタグをティックごとに生成します"
+                )
+            else:
+                self.lazy_generation = LazyGeneration(self.server, self.data_generator, self.tag_index)
+                self.lazy_generation.install()
+        
+        # センサーの値だけを読み取るReadは、スロット順の値のスナップショットから応答する
+        if self.config.get("performance", {}).get("fast_read", False):
+            if not self.publish_sensors:
+                self.logger.warning("Readの高速化はセンサーごとの変数を公開する場合（公開モードがsensorsまたはboth）だけ使えます")
+            else:
+                from read_snapshot import ReadSnapshot
+                self.read_snapshot = ReadSnapshot(self.server, self.idx, self.tag_index, self.lazy_generation)
+                self.read_snapshot.install()
+        
+        # 前回のスナップショットから生成器の状態を復元（最初のティックから続きの値を公開する）
+        if self.state_store is not None:
+            restored = self.state_store.open()
+            if restored and self.alarms is not None:
+                # 復元した時点で故障中のデバイスのアラームを有効にする
+                await self.alarms.sync(self.data_generator.device_states)
     
     async def update_data(self):
         """センサーデータの更新"""
-        while True:
-            try:
-                # データの生成
-                data = self.data_generator.generate_data()
-                
-                # OPC-UAノードの更新
-                for device_id, device_data in data.items():
-                    for sensor_id, value in device_data.items():
-                        node = self.nodes[device_id]["sensors"][sensor_id]
-                        
-                        # 値の型に応じた設定
-                        if isinstance(value, bool):
-                            await node.write_value(ua.Variant(value, ua.VariantType.Boolean))
-                        elif isinstance(value, int):
-                            await node.write_value(ua.Variant(value, ua.VariantType.UInt32))
-                        else:
-                            await node.write_value(ua.Variant(value, ua.VariantType.Double))
+        # 生成結果は毎ティック同じ辞書に上書きする
+        values = {}
+        next_snapshot = 0.0
+        
+        try:
+            await self.fan_out.start()
+            while True:
+                try:
+                    self.metrics.begin()
+                    
+                    # 制御コマンドはティックの間でまとめて適用する
+                    if self.control is not None:
+                        await self.control.apply_pending()
+                    
+                    # データの生成（全てのシンクで同じ値を使う）
+                    if self.lazy_generation is not None:
+                        self.lazy_generation.begin()
+                    data = self.data_generator.generate_data(out=values)
+                    
+                    # 状態のスナップショット（ファイル上の固定位置を上書きする）
+                    if self.state_store is not None and self.data_generator.current_time >= next_snapshot:
+                        self.state_store.save()
+                        next_snapshot = self.data_generator.current_time + self.snapshot_interval
+                    
+                    # 1ティックの全ての値で同じタイムスタンプを使用し、全てのシンクへ配信
+                    timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+                    await self.fan_out.publish(timestamp, data)
+                    if self.lazy_generation is not None:
+                        self.lazy_generation.commit()
+                    
+                    # 故障の発生・回復をイベントとして通知
+                    if self.alarms is not None:
+                        transitions = self.data_generator.pop_failure_transitions()
+                        if transitions:
+                            await self.alarms.process(transitions)
+                    
+                    self.metrics.end()
+                    if self.governor is not None:
+                        self.governor.observe(self.metrics.last_work_time)
+                    self.logger.debug(
+                        "ティック処理時間: %.3f秒, GC追跡オブジェクトの割り当て数: %d（平均 %.1f）, 一時割り当て: %dバイト",
+                        self.metrics.last_work_time, self.metrics.last_allocations, self.metrics.allocations_per_tick,
+                        self.metrics.last_allocated_bytes
+                    )
+                    
+                    # 更新間隔を待機
+                    await asyncio.sleep(self.update_interval)
                 
-                # 更新間隔を待機
-                await asyncio.sleep(self.update_interval)
-            
-            except Exception as e:
-                self.logger.error(f"データ更新中にエラーが発生しました: {e}")
-                await asyncio.sleep(1)  # エラー時は少し待機してから再試行
+                except Exception as e:
+                    self.logger.error(f"データ更新中にエラーが発生しました: {e}")
+                    await asyncio.sleep(1)  # エラー時は少し待機してから再試行
+        finally:
+            await self.fan_out.stop()
     
     async def start(self):
         """サーバーの起動"""
@@ -154,6 +497,7 @@ class OpcUaServer:
                 
                 # データ更新タスクの開始
                 update_task = asyncio.create_task(self.update_data())
+                update_task.add_done_callback(self._on_update_done)
                 
                 # サーバーを実行し続ける
                 while True:
@@ -162,7 +506,23 @@ class OpcUaServer:
             self.logger.error(f"サーバー起動中にエラーが発生しました: {e}")
             raise
                 
+    def _on_update_done(self, task: asyncio.Task):
+        """
+        データ更新タスクの終了を記録（例外で止まった場合に値が更新されなくなったことを残す）
+
+        Args:
+            task: データ更新タスク
+        """
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.logger.error(f"データ更新タスクが異常終了しました。値は更新されません: {error!r}")
+    
     def stop(self):
         """サーバーの停止"""
         self.logger.info("サーバーを停止します")
+        # 最新の状態を保存
+        if self.state_store is not None:
+            self.state_store.close()
         # サーバーはasync withブロックを抜けると自動的に停止する
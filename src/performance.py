@@ -0,0 +1,153 @@
+"""
+イベントループと通信（トランスポート）のチューニングを行うモジュール
+
+config.yamlの `performance` セクションで設定する。
+
+    performance:
+      event_loop: "auto"          # auto: uvloopがあれば使用 / asyncio / uvloop
+      transport:
+        tcp_nodelay: true         # Nagleアルゴリズムを無効にする（通知の遅延を減らす）
+        send_buffer_size: 0       # ソケットの送信バッファ（バイト、0はOSのデフォルト）
+        receive_buffer_size: 0    # ソケットの受信バッファ（バイト、0はOSのデフォルト）
+        max_chunk_size: 65535     # OPC-UAのチャンクサイズ（バイト）
+        max_message_size: 104857600
+"""
+import asyncio
+import logging
+import math
+import socket
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from asyncua import Server
+from asyncua.common.connection import TransportLimits
+
+
+# 設定ファイルで指定できるイベントループ
+EVENT_LOOPS = ("auto", "asyncio", "uvloop")
+
+logger = logging.getLogger(__name__)
+
+
+def event_loop_factory(performance_config: Dict[str, Any]) -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """
+    設定に応じたイベントループの生成関数を取得
+
+    Args:
+        performance_config: performanceセクションの設定
+
+    Returns:
+        Optional[Callable]: イベントループの生成関数。標準のasyncioループを使用する場合はNone
+    """
+    name = performance_config.get("event_loop", "auto")
+    if name not in EVENT_LOOPS:
+        raise ValueError(f"サポートされていないイベントループです: {name}（{', '.join(EVENT_LOOPS)}）")
+    if name == "asyncio":
+        return None
+
+    try:
+        import uvloop
+    except ImportError:
+        if name == "uvloop":
+            raise ImportError("event_loopにuvloopが指定されていますが、uvloopがインストールされていません")
+        return None
+    return uvloop.new_event_loop
+
+
+def transport_limits(transport_config: Dict[str, Any]) -> TransportLimits:
+    """
+    設定からOPC-UAのトランスポート制限を作成
+
+    Args:
+        transport_config: performance.transportセクションの設定
+
+    Returns:
+        TransportLimits: トランスポート制限
+    """
+    chunk_size = int(transport_config.get("max_chunk_size", 65535))
+    max_message_size = int(transport_config.get("max_message_size", 100 * 1024 * 1024))
+    if chunk_size < 8192:
+        # OPC-UAの仕様でチャンクサイズの最小値は8192バイト
+        raise ValueError(f"max_chunk_sizeは8192以上である必要があります: {chunk_size}")
+    return TransportLimits(
+        max_recv_buffer=chunk_size,
+        max_send_buffer=chunk_size,
+        max_chunk_count=int(transport_config.get("max_chunk_count", math.ceil(max_message_size / chunk_size))),
+        max_message_size=max_message_size
+    )
+
+
+def tune_socket(sock: Any, transport_config: Dict[str, Any]):
+    """
+    ソケットオプションを設定
+
+    Args:
+        sock: ソケット（asyncioのトランスポートが持つソケットも可）
+        transport_config: performance.transportセクションの設定
+    """
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+    if "tcp_nodelay" in transport_config:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(bool(transport_config["tcp_nodelay"])))
+    if transport_config.get("send_buffer_size"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, int(transport_config["send_buffer_size"]))
+    if transport_config.get("receive_buffer_size"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, int(transport_config["receive_buffer_size"]))
+
+
+class TunedTransportList(list):
+    """
+    接続ごとにソケットオプションを設定するトランスポートのリスト
+
+    asyncuaは新しい接続のトランスポートをInternalServer.asyncio_transportsに追加するため、
+    追加時にソケットオプションを設定する（asyncioは受け付けたソケットに常にTCP_NODELAYを設定するので、接続ごとに上書きが必要）。
+    hooksに登録した関数も新しい接続ごとに呼び出す（接続ごとの処理を追加するモジュールが使用する）。
+    """
+
+    def __init__(self, transport_config: Dict[str, Any], transports: Iterable[Any] = ()):
+        super().__init__(transports)
+        self.transport_config = transport_config
+        self.hooks: List[Callable[[Any], None]] = []
+
+    def append(self, transport: Any):
+        try:
+            tune_socket(transport.get_extra_info("socket"), self.transport_config)
+        except OSError as e:
+            logger.warning(f"ソケットオプションの設定に失敗しました: {e}")
+        for hook in self.hooks:
+            hook(transport)
+        super().append(transport)
+
+
+def add_connection_hook(server: Server, hook: Callable[[Any], None]):
+    """
+    新しい接続ごとに呼び出す関数を登録（サーバーの起動前に呼び出す）
+
+    Args:
+        server: asyncuaサーバー
+        hook: 接続のトランスポートを受け取る関数（asyncuaのプロトコルとUaProcessorは作成済み）
+    """
+    transports = server.iserver.asyncio_transports
+    if not isinstance(transports, TunedTransportList):
+        transports = TunedTransportList({}, transports)
+        server.iserver.asyncio_transports = transports
+    transports.hooks.append(hook)
+
+
+def apply_transport_settings(server: Server, transport_config: Dict[str, Any]):
+    """
+    asyncuaサーバーにトランスポートの設定を適用（サーバーの起動前に呼び出す）
+
+    Args:
+        server: asyncuaサーバー
+        transport_config: performance.transportセクションの設定
+    """
+    if not transport_config:
+        return
+    server.limits = transport_limits(transport_config)
+    if any(key in transport_config for key in ("tcp_nodelay", "send_buffer_size", "receive_buffer_size")):
+        transports = server.iserver.asyncio_transports
+        if isinstance(transports, TunedTransportList):
+            # 登録済みのフックはそのまま残す
+            transports.transport_config = transport_config
+        else:
+            server.iserver.asyncio_transports = TunedTransportList(transport_config, transports)
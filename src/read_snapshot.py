@@ -0,0 +1,338 @@
+"""
+センサーの値のReadを、タグのスロット順に並べた値のスナップショットから直接応答するモジュール
+
+購読せずにReadで定期的に値を取得する（ポーリングする）ゲートウェイは、1回の要求で多数のタグを読み取る。
+asyncuaは要求のReadValueIdを1つずつデコードし、ノードごとに属性の辞書をたどってDataValueを集め、
+応答をDataValueごとにエンコードするため、1万タグのReadで数百ミリ秒かかる。
+
+このモジュールはタグの値・状態コード・タイムスタンプをスロット順の配列に保持し（OpcUaSinkがティックごとに更新する）、
+センサーの変数のValue属性だけを読み取る要求を次のように処理する。
+
+- 要求のReadValueIdの並びを固定長のレコードとしてまとめて解釈し、NodeIdの数値をスロットに変換する
+- 配列からスロットの値を1回の集約（NumPyのインデックス参照）で取り出し、応答のDataValueのバイト列をまとめて組み立てる
+
+センサー以外のノードや、Value以外の属性、IndexRangeを含む要求などはasyncuaの通常の処理で応答する。
+通常の処理と同じ応答になるよう、要求のTimestampsToReturnによらずソースとサーバーの両方のタイムスタンプを返す（asyncuaはTimestampsToReturnを参照しない）。
+
+NumPyが必要（`pip install numpy`）。config.yamlの `performance.fast_read` で有効にする（公開モードがsensorsまたはbothの場合）。
+"""
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("Readの高速化を使用するにはnumpyをインストールしてください（pip install numpy）")
+
+from asyncua import Server, ua
+from asyncua.common.callback import CallbackType
+from asyncua.ua.ua_binary import Primitives, nodeid_to_binary, struct_to_binary
+
+from performance import add_connection_hook
+from tag_index import TagIndex
+
+
+READ_REQUEST = ua.NodeId(ua.ObjectIds.ReadRequest_Encoding_DefaultBinary)
+# ReadParametersの先頭（MaxAge: Double, TimestampsToReturn: UInt32, NodesToReadの要素数: Int32）
+_PARAMETERS_HEADER = np.dtype([("max_age", "<f8"), ("timestamps_to_return", "<u4"), ("count", "<i4")])
+# NodeIdのエンコードの種類 -> ReadValueIdのレイアウト（IndexRangeとDataEncodingが空の場合は固定長になる）
+_READ_VALUE_IDS = {
+    # FourByte（名前空間 < 256、数値 < 65536。設定ファイルで小さなnode_idを指定した場合）
+    1: np.dtype([
+        ("encoding", "u1"), ("namespace", "u1"), ("identifier", "<u2"), ("attribute", "<u4"),
+        ("index_range", "<i4"), ("data_encoding_namespace", "<u2"), ("data_encoding_name", "<i4"),
+    ]),
+    # Numeric
+    2: np.dtype([
+        ("encoding", "u1"), ("namespace", "<u2"), ("identifier", "<u4"), ("attribute", "<u4"),
+        ("index_range", "<i4"), ("data_encoding_namespace", "<u2"), ("data_encoding_name", "<i4"),
+    ]),
+}
+# 変数型 -> 値のエンコード
+_VALUE_DTYPES = {
+    ua.VariantType.Boolean: np.dtype("u1"),
+    ua.VariantType.UInt32: np.dtype("<u4"),
+    ua.VariantType.Double: np.dtype("<f8"),
+}
+# DataValueのエンコードマスク
+_HAS_VALUE = 0x01
+_HAS_STATUS = 0x02
+_HAS_SOURCE_TIMESTAMP = 0x04
+_HAS_SERVER_TIMESTAMP = 0x08
+
+logger = logging.getLogger(__name__)
+
+
+def _scatter(out: np.ndarray, positions: np.ndarray, values: np.ndarray):
+    """
+    値のバイト列を出力の各位置へまとめて書き込む
+
+    Args:
+        out: 出力（uint8）
+        positions: 値ごとの書き込み位置
+        values: 書き込む値（要素ごとに同じバイト数の型）
+    """
+    size = values.dtype.itemsize
+    out[positions[:, None] + np.arange(size)] = values.view(np.uint8).reshape(-1, size)
+
+
+class ReadSnapshot:
+    """センサーの値のスナップショットを保持し、Readに直接応答するクラス"""
+
+    def __init__(self, server: Server, namespace_index: int, tag_index: TagIndex, lazy_generation: Optional[Any] = None):
+        """
+        初期化
+
+        Args:
+            server: asyncuaサーバー
+            namespace_index: センサーの変数の名前空間インデックス
+            tag_index: タグのインデックス（センサーごとの変数を持つタグが対象）
+            lazy_generation: 遅延生成（LazyGeneration。有効な場合は生成を止めているタグを読み取り時に生成する）
+        """
+        self.server = server
+        self.idx = namespace_index
+        self.lazy_generation = lazy_generation
+        self.tags = list(tag_index)
+        self._slots: Dict[ua.NodeId, int] = {tag.nodeid: tag.slot for tag in self.tags if tag.nodeid is not None}
+        count = len(self.tags)
+        # スロット順の値・状態コード・タイムスタンプ（100ナノ秒単位のOPC-UAのDateTime）。OpcUaSinkが書き込みと同時に更新する
+        self.values: List[float] = [0.0] * count
+        self.status: List[int] = [0] * count
+        self.timestamps: List[int] = [0] * count
+        # スナップショットで表せない値のスロット（配列の値や状態コードのみの値など。ティックで書き込まれるまでは通常の処理で応答する）
+        self.irregular: Set[int] = set(range(count))
+        # 値が変わった後、最初のReadで配列を作り直す
+        self.dirty = True
+        self._arrays = None
+
+        # NodeIdの数値 -> スロット（数値の昇順に並べて二分探索で引く）
+        tagged = [tag for tag in self.tags if tag.nodeid is not None]
+        order = sorted(tagged, key=lambda tag: tag.tag_id)
+        self._ids = np.array([tag.tag_id for tag in order], dtype=np.uint64)
+        self._id_slots = np.array([tag.slot for tag in order], dtype=np.intp)
+        self._types = np.array([tag.variant_type.value for tag in self.tags], dtype=np.uint8)
+        self._sizes = np.array([_VALUE_DTYPES[tag.variant_type].itemsize for tag in self.tags], dtype=np.intp)
+        # 統計
+        self.hits = 0
+        self.fallbacks = 0
+        self.values_read = 0
+
+    def install(self):
+        """Readの処理と値の書き込みを置き換える（ノードの作成後、サーバーの起動前に呼び出す）"""
+        iserver = self.server.iserver
+        read_attribute_value = iserver.aspace.read_attribute_value
+        for nodeid, slot in self._slots.items():
+            self.record(slot, read_attribute_value(nodeid, ua.AttributeIds.Value))
+
+        # クライアントからの値の書き込みもスナップショットに反映する
+        write = iserver.attribute_service.write
+
+        async def write_attributes(params: ua.WriteParameters, *args, **kwargs):
+            results = await write(params, *args, **kwargs)
+            for node in params.NodesToWrite:
+                slot = self._slots.get(node.NodeId)
+                if slot is not None and node.AttributeId == ua.AttributeIds.Value:
+                    self.record(slot, iserver.aspace.read_attribute_value(node.NodeId, ua.AttributeIds.Value))
+            return results
+
+        iserver.attribute_service.write = write_attributes
+        add_connection_hook(self.server, self.attach)
+        logger.info(f"Readの高速化を有効にしました（対象のタグ: {len(self._slots)}）")
+
+    def record(self, slot: int, data_value: ua.DataValue):
+        """
+        タグの値をスナップショットに記録
+
+        Args:
+            slot: タグのスロット
+            data_value: アドレス空間に書き込まれた値
+        """
+        variant = data_value.Value
+        tag = self.tags[slot]
+        self.dirty = True
+        if (
+            variant is None or variant.VariantType != tag.variant_type or variant.is_array
+            or data_value.StatusCode is None or data_value.SourceTimestamp is None
+            or data_value.SourceTimestamp != data_value.ServerTimestamp
+        ):
+            self.irregular.add(slot)
+            return
+        self.values[slot] = variant.Value
+        self.status[slot] = data_value.StatusCode.value
+        self.timestamps[slot] = ua.datetime_to_win_epoch(data_value.SourceTimestamp)
+        self.irregular.discard(slot)
+
+    def arrays(self):
+        """
+        スナップショットの配列を取得（前回から値が変わった場合は作り直す）
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: 値（float64）、状態コード（uint32）、タイムスタンプ（int64）
+        """
+        if self.dirty or self._arrays is None:
+            self._arrays = (
+                np.array(self.values, dtype=np.float64),
+                np.array(self.status, dtype="<u4"),
+                np.array(self.timestamps, dtype="<i8"),
+            )
+            self.dirty = False
+        return self._arrays
+
+    def decode(self, data: bytes) -> Optional[np.ndarray]:
+        """
+        ReadParametersのNodesToReadをまとめて解釈し、読み取るタグのスロットを取得
+
+        Args:
+            data: ReadParametersのバイト列
+
+        Returns:
+            Optional[np.ndarray]: スロット（要求の順）。センサーの値だけを読み取る要求でない場合はNone
+        """
+        if not self._slots or len(data) <= _PARAMETERS_HEADER.itemsize:
+            return None
+        count = int(np.frombuffer(data, _PARAMETERS_HEADER, 1)[0]["count"])
+        layout = _READ_VALUE_IDS.get(data[_PARAMETERS_HEADER.itemsize])
+        if count <= 0 or layout is None or len(data) != _PARAMETERS_HEADER.itemsize + count * layout.itemsize:
+            return None
+        nodes = np.frombuffer(data, layout, count, _PARAMETERS_HEADER.itemsize)
+        # NodeIdのエンコードが揃っていて、IndexRangeとDataEncodingが空のValue属性の読み取りだけを扱う
+        if not (
+            np.all(nodes["encoding"] == nodes["encoding"][0])
+            and np.all(nodes["namespace"] == self.idx)
+            and np.all(nodes["attribute"] == ua.AttributeIds.Value)
+            and np.all(nodes["index_range"] == -1)
+            and np.all(nodes["data_encoding_namespace"] == 0)
+            and np.all(nodes["data_encoding_name"] <= 0)
+        ):
+            return None
+        identifiers = nodes["identifier"].astype(np.uint64)
+        positions = np.minimum(np.searchsorted(self._ids, identifiers), len(self._ids) - 1)
+        if not np.array_equal(self._ids[positions], identifiers):
+            return None
+        return self._id_slots[positions]
+
+    def encode(self, slots: np.ndarray) -> bytes:
+        """
+        スナップショットから読み取ったタグのDataValueをまとめてエンコード（ReadResponseのResultsの要素の並び）
+
+        通常の処理（asyncuaのアドレス空間の値）と同じく、ソースとサーバーの両方のタイムスタンプを含める。
+
+        Args:
+            slots: スロット（要求の順）
+
+        Returns:
+            bytes: エンコードしたDataValueの並び
+        """
+        mask = _HAS_VALUE | _HAS_STATUS | _HAS_SOURCE_TIMESTAMP | _HAS_SERVER_TIMESTAMP
+        values, status, timestamps = self.arrays()
+        types = self._types[slots]
+        sizes = self._sizes[slots]
+
+        # 1つのDataValue: マスク(1) + 変数型(1) + 値 + 状態コード(4) + タイムスタンプ(8)×2
+        lengths = sizes + 22
+        starts = np.cumsum(lengths) - lengths
+        out = np.empty(int(lengths.sum()), dtype=np.uint8)
+        out[starts] = mask
+        out[starts + 1] = types
+        for variant_type, dtype in _VALUE_DTYPES.items():
+            selected = types == variant_type.value
+            if selected.any():
+                _scatter(out, starts[selected] + 2, values[slots[selected]].astype(dtype))
+        positions = starts + 2 + sizes
+        _scatter(out, positions, status[slots])
+        positions += 4
+        # ティックの書き込みではソースとサーバーのタイムスタンプは同じ値
+        picked_timestamps = timestamps[slots]
+        for _ in range(2):
+            _scatter(out, positions, picked_timestamps)
+            positions += 8
+        return out.tobytes()
+
+    def read(self, data: bytes) -> Optional[bytes]:
+        """
+        Read要求をスナップショットから処理
+
+        Args:
+            data: ReadParametersのバイト列
+
+        Returns:
+            Optional[bytes]: ReadResponseのResults（要素数を含む）。通常の処理で応答する場合はNone
+        """
+        slots = self.decode(data)
+        if slots is None:
+            self.fallbacks += 1
+            return None
+        lazy_generation = self.lazy_generation
+        if lazy_generation is not None and lazy_generation.stale:
+            # 生成を止めているタグは現在のティックまで進めた値を記録する
+            stale = lazy_generation.stale
+            for slot in slots.tolist():
+                tag = self.tags[slot]
+                if tag.nodeid in stale:
+                    self.record(slot, lazy_generation.read(tag))
+        if self.irregular and not self.irregular.isdisjoint(slots.tolist()):
+            self.fallbacks += 1
+            return None
+        # 不正なTimestampsToReturnの扱いは通常の処理に任せる
+        timestamps_to_return = int(np.frombuffer(data, _PARAMETERS_HEADER, 1)[0]["timestamps_to_return"])
+        if timestamps_to_return > ua.TimestampsToReturn.Neither:
+            self.fallbacks += 1
+            return None
+        self.hits += 1
+        self.values_read += len(slots)
+        return Primitives.Int32.pack(len(slots)) + self.encode(slots)
+
+    def attach(self, transport: Any):
+        """
+        接続のRead要求の処理を置き換え、センサーの値だけを読み取る要求はスナップショットから応答する
+
+        Args:
+            transport: 接続のトランスポート
+        """
+        processor = transport.get_protocol().processor
+        process_message = processor._process_message
+        listeners = self.server.iserver.callback_service._listeners
+
+        async def process(typeid, requesthdr, seqhdr, body):
+            session = processor.session
+            # セッションの確認や権限の確認、サーバーのRead前後のコールバックが必要な場合は通常の処理に任せる
+            if (
+                typeid != READ_REQUEST or session is None or not session.is_activated()
+                or listeners.get(CallbackType.PreRead) or listeners.get(CallbackType.PostRead)
+            ):
+                return await process_message(typeid, requesthdr, seqhdr, body)
+            permissions = processor._connection.security_policy.permissions
+            if permissions is not None and permissions.check_validity(session.user, typeid, body) is False:
+                return await process_message(typeid, requesthdr, seqhdr, body)
+            results = self.read(bytes(body))
+            if results is None:
+                return await process_message(typeid, requesthdr, seqhdr, body)
+
+            response = ua.ReadResponse()
+            response.ResponseHeader.RequestHandle = requesthdr.RequestHandle
+            encoded = b"".join((
+                nodeid_to_binary(response.TypeId),
+                struct_to_binary(response.ResponseHeader),
+                results,
+                Primitives.Int32.pack(0),
+            ))
+            processor._transport.write(
+                processor._connection.message_to_binary(encoded, message_type=ua.MessageType.SecureMessage, request_id=seqhdr.RequestId)
+            )
+            return True
+
+        processor._process_message = process
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Readの高速化の統計を取得
+
+        Returns:
+            Dict[str, int]: スナップショットから応答した要求・値の数と、通常の処理で応答した要求の数
+        """
+        return {
+            "tags": len(self._slots),
+            "fast_reads": self.hits,
+            "values_read": self.values_read,
+            "fallbacks": self.fallbacks,
+        }
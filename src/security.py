@@ -0,0 +1,260 @@
+"""
+OPC-UAサーバーのセキュリティ設定を行うモジュール
+
+config.yamlの `security` セクションで設定する。
+
+    security:
+      policies: ["None", "Basic256Sha256_Sign", "Basic256Sha256_SignAndEncrypt"]
+      certificate: "certs/server_cert.der"
+      private_key: "certs/server_key.pem"
+      generate_certificate: true   # 証明書がない場合は自己署名証明書を作成する
+      allow_anonymous: true
+      anonymous_role: "operator"   # 匿名のセッションのロール
+      users:
+        - username: "operator"
+          password: "secret"
+          role: "operator"         # operator: 読み取り・書き込み・制御用メソッド / viewer: 読み取りだけ
+
+viewerのセッションからのWriteは `BadUserAccessDenied` で拒否する（ノード・参照の変更はasyncuaが管理者以外に許可しない。制御用メソッドはcontrol.pyで拒否する）。
+"""
+import datetime
+import hmac
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from asyncua import Server, ua
+from asyncua.server.user_managers import UserManager
+from asyncua.server.users import User, UserRole
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+
+# 設定ファイルで指定できるセキュリティポリシー
+SECURITY_POLICIES = {
+    "None": ua.SecurityPolicyType.NoSecurity,
+    "Basic256Sha256_Sign": ua.SecurityPolicyType.Basic256Sha256_Sign,
+    "Basic256Sha256_SignAndEncrypt": ua.SecurityPolicyType.Basic256Sha256_SignAndEncrypt,
+}
+
+# 設定ファイルで指定できるロール
+ROLES = ("operator", "viewer")
+
+logger = logging.getLogger(__name__)
+
+
+def generate_certificate(
+    certificate_path: str,
+    private_key_path: str,
+    application_uri: str,
+    common_name: str,
+    host_name: Optional[str] = None,
+    days: int = 365,
+    key_size: int = 2048
+):
+    """
+    自己署名証明書と秘密鍵を作成
+
+    Args:
+        certificate_path: 証明書の出力先（拡張子が.pemの場合はPEM、それ以外はDER）
+        private_key_path: 秘密鍵の出力先（PEM）
+        application_uri: アプリケーションURI（証明書のsubjectAltNameに設定する）
+        common_name: 証明書のCN
+        host_name: ホスト名（省略時は実行中のホスト名）
+        days: 有効期間（日）
+        key_size: RSAの鍵長
+    """
+    host_name = host_name or socket.gethostname()
+    key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .add_extension(
+            x509.SubjectAlternativeName([
+                x509.UniformResourceIdentifier(application_uri),
+                x509.DNSName(host_name),
+                x509.DNSName("localhost"),
+            ]),
+            critical=False
+        )
+        .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=True, content_commitment=True, key_encipherment=True, data_encipherment=True,
+                key_agreement=False, key_cert_sign=False, crl_sign=False, encipher_only=False, decipher_only=False
+            ),
+            critical=True
+        )
+        .add_extension(
+            x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH, ExtendedKeyUsageOID.CLIENT_AUTH]),
+            critical=False
+        )
+        .sign(key, hashes.SHA256())
+    )
+
+    for path in (certificate_path, private_key_path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    encoding = serialization.Encoding.PEM if certificate_path.endswith(".pem") else serialization.Encoding.DER
+    with open(certificate_path, "wb") as file:
+        file.write(certificate.public_bytes(encoding))
+    # 秘密鍵は所有者だけが読み書きできるファイルに書き込む（既存のファイルも権限を変更してから書き込む）
+    descriptor = os.open(private_key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.chmod(private_key_path, 0o600)
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()
+        ))
+
+
+@dataclass
+class ConfigUser(User):
+    """設定ファイルのロールを持つユーザー"""
+
+    # viewerの場合True（書き込みと制御用メソッドの呼び出しを許可しない）
+    read_only: bool = False
+
+
+def is_read_only(user: Optional[User]) -> bool:
+    """
+    ユーザーが読み取りだけを許可されているか
+
+    Args:
+        user: セッションのユーザー
+
+    Returns:
+        bool: viewerの場合True
+    """
+    return bool(getattr(user, "read_only", False))
+
+
+def _check_role(role: str, name: str) -> str:
+    """ロール名を検証"""
+    if role not in ROLES:
+        raise ValueError(f"{name}は{'/'.join(ROLES)}のいずれかである必要があります: {role}")
+    return role
+
+
+class ConfigUserManager(UserManager):
+    """設定ファイルのユーザー名とパスワードで認証するユーザー管理"""
+
+    def __init__(self, users: List[Dict[str, str]], allow_anonymous: bool = True, anonymous_role: str = "operator"):
+        """
+        初期化
+
+        Args:
+            users: ユーザーのリスト（username, password, role）
+            allow_anonymous: 匿名ログインを許可する場合True
+            anonymous_role: 匿名のセッションのロール（operator / viewer）
+        """
+        self.passwords = {user["username"]: str(user["password"]) for user in users}
+        self.roles = {
+            user["username"]: _check_role(user.get("role", "operator"), f"ユーザー '{user['username']}' のrole")
+            for user in users
+        }
+        self.allow_anonymous = allow_anonymous
+        self.anonymous_role = _check_role(anonymous_role, "anonymous_role")
+
+    def get_user(self, iserver, username=None, password=None, certificate=None):
+        """
+        認証されたユーザーを取得
+
+        Returns:
+            Optional[User]: ユーザー。認証に失敗した場合はNone
+        """
+        if username is None:
+            if certificate is None and self.allow_anonymous:
+                return ConfigUser(role=UserRole.Anonymous, read_only=self.anonymous_role == "viewer")
+            return None
+        expected = self.passwords.get(username)
+        if expected is None or password is None or not hmac.compare_digest(expected.encode(), str(password).encode()):
+            logger.warning(f"ユーザー '{username}' の認証に失敗しました")
+            return None
+        return ConfigUser(role=UserRole.User, name=username, read_only=self.roles[username] == "viewer")
+
+
+def security_policies(security_config: Dict[str, Any]) -> List[ua.SecurityPolicyType]:
+    """
+    設定からセキュリティポリシーのリストを取得
+
+    Args:
+        security_config: securityセクションの設定
+
+    Returns:
+        List[ua.SecurityPolicyType]: セキュリティポリシー
+    """
+    names = security_config.get("policies", ["None"])
+    if not names:
+        raise ValueError("securityのpoliciesが空です")
+    policies = []
+    for name in names:
+        if name not in SECURITY_POLICIES:
+            raise ValueError(f"サポートされていないセキュリティポリシーです: {name}（{', '.join(SECURITY_POLICIES)}）")
+        policies.append(SECURITY_POLICIES[name])
+    return policies
+
+
+async def apply_security(server: Server, security_config: Dict[str, Any]):
+    """
+    asyncuaサーバーにセキュリティの設定を適用（サーバーの起動前に呼び出す）
+
+    Args:
+        server: asyncuaサーバー
+        security_config: securityセクションの設定
+    """
+    policies = security_policies(security_config)
+    server.set_security_policy(policies)
+
+    # 署名・暗号化を行う場合は証明書と秘密鍵を読み込む（ない場合は作成する）
+    if policies != [ua.SecurityPolicyType.NoSecurity]:
+        certificate_path = security_config.get("certificate", "certs/server_cert.der")
+        private_key_path = security_config.get("private_key", "certs/server_key.pem")
+        if not (os.path.exists(certificate_path) and os.path.exists(private_key_path)):
+            if not security_config.get("generate_certificate", True):
+                raise FileNotFoundError(f"証明書または秘密鍵が見つかりません: {certificate_path}, {private_key_path}")
+            logger.info(f"自己署名証明書を作成しています: {certificate_path}")
+            generate_certificate(
+                certificate_path,
+                private_key_path,
+                server.get_application_uri(),
+                common_name=security_config.get("common_name", "FactorySimulatorOpcUaServer"),
+                days=int(security_config.get("certificate_days", 365))
+            )
+        await server.load_certificate(certificate_path)
+        await server.load_private_key(private_key_path)
+
+    # ユーザー認証（asyncuaのデフォルトは匿名のセッションも認証済みのユーザーとして扱うため、常に設定する）
+    users = security_config.get("users", [])
+    allow_anonymous = security_config.get("allow_anonymous", True)
+    server.iserver.set_user_manager(
+        ConfigUserManager(users, allow_anonymous, security_config.get("anonymous_role", "operator"))
+    )
+    if users or not allow_anonymous:
+        policy_ids = ["Username"] + (["Anonymous"] if allow_anonymous else [])
+        server.set_security_IDs(policy_ids)
+
+    # viewerのセッションからの書き込みを拒否（要求全体ではなく、書き込む値ごとに拒否を返す）
+    write = server.iserver.attribute_service.write
+
+    async def write_attributes(params: ua.WriteParameters, *args, **kwargs):
+        user = kwargs.get("user", args[0] if args else None)
+        if is_read_only(user):
+            logger.warning(f"読み取りだけのユーザーからの書き込みを拒否しました（ユーザー: {user}）")
+            return [ua.StatusCode(ua.StatusCodes.BadUserAccessDenied) for _ in params.NodesToWrite]
+        return await write(params, *args, **kwargs)
+
+    server.iserver.attribute_service.write = write_attributes
@@ -0,0 +1,297 @@
+"""
+クライアントのセッションごとに通知のキューを制限するモジュール
+
+asyncuaは、クライアントからのPublishリクエストが届いていない間に作成された通知（PublishResult）を
+接続ごとのキューに上限なく積む。通信が詰まったクライアントが1つあるだけで通知がたまり続け、
+メモリとGCの負荷で同じイベントループ上のティック処理や他のクライアントへの配信が遅くなる。
+
+このモジュールは接続ごとのキューを上限付きのキューに置き換え、あふれた場合の扱い（overflow）を選べるようにする。
+
+- drop_oldest: 最も古い通知を破棄する
+- coalesce: 同じ購読の直前の通知とまとめ、監視項目ごとに最新の値だけを残す（変化の少ない項目の値も失われない）
+
+また、送信バッファ（asyncioのトランスポート）が max_write_buffer を超えている間は新しい通知を送らずキューにとどめ、
+通知が滞った状態が slow_after 秒続いたセッションを遅いセッションとして検出・集計する。
+
+config.yamlの `sessions` セクションで設定する。
+
+    sessions:
+      queue_size: 100           # 接続ごとにためておく通知の最大数（0は制限しない）
+      overflow: "coalesce"      # drop_oldest / coalesce
+      max_write_buffer: 1048576 # 送信バッファの上限（バイト、0は制限しない）
+      slow_after: 5.0           # 通知が滞った状態がこの秒数続いたら遅いセッションとする
+"""
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from asyncua import Server, ua
+
+from performance import add_connection_hook
+
+
+# 設定ファイルで指定できるキューがあふれた場合の扱い
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce")
+
+# 集計する統計の項目
+STAT_KEYS = ("sent", "dropped", "coalesced", "stalls", "slow_detections")
+
+logger = logging.getLogger(__name__)
+
+
+def coalesce_results(older: ua.PublishResult, newer: ua.PublishResult) -> int:
+    """
+    2つの通知を1つにまとめる（newerにolderの内容を取り込む）
+
+    データ変更は監視項目（ClientHandle）ごとに最新の値だけを残し、イベントとステータス変更は全て残す。
+
+    Args:
+        older: 先に作成された通知
+        newer: 後から作成された通知（書き換える）
+
+    Returns:
+        int: まとめたことで減ったデータ変更の数
+    """
+    latest = {}
+    count = 0
+    events = []
+    others = []
+    for result in (older, newer):
+        for notification in result.NotificationMessage.NotificationData:
+            if isinstance(notification, ua.DataChangeNotification):
+                for item in notification.MonitoredItems:
+                    latest[item.ClientHandle] = item
+                    count += 1
+            elif isinstance(notification, ua.EventNotificationList):
+                events.extend(notification.Events)
+            else:
+                others.append(notification)
+
+    data = []
+    if latest:
+        data.append(ua.DataChangeNotification(MonitoredItems=list(latest.values())))
+    if events:
+        data.append(ua.EventNotificationList(Events=events))
+    newer.NotificationMessage.NotificationData = data + others
+    return count - len(latest)
+
+
+class _PublishRequests(deque):
+    """Publishリクエストのキュー（リクエストが届いたらたまっている通知を送信する）"""
+
+    def __init__(self, session: "SessionQueue", requests=()):
+        super().__init__(requests)
+        self.session = session
+
+    def append(self, request: Any):
+        super().append(request)
+        self.session.flush()
+
+
+class SessionQueue:
+    """
+    1つの接続（セッション）の上限付き通知キュー
+
+    asyncuaのUaProcessorの通知の送信（forward_publish_response）とPublishリクエストのキューを置き換える。
+    """
+
+    def __init__(self, processor: Any, transport: Any, session_config: Dict[str, Any]):
+        """
+        初期化
+
+        Args:
+            processor: 接続のUaProcessor
+            transport: 接続のトランスポート
+            session_config: sessionsセクションの設定
+        """
+        self.processor = processor
+        self.transport = transport
+        self.name = transport.get_extra_info("peername")
+        self.queue_size = int(session_config.get("queue_size", 100))
+        self.overflow = session_config.get("overflow", "coalesce")
+        self.max_write_buffer = int(session_config.get("max_write_buffer", 1024 * 1024))
+        self.slow_after = float(session_config.get("slow_after", 5.0))
+        self.results: Deque[ua.PublishResult] = deque()
+        # 統計
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.stalls = 0  # 送信バッファが上限を超えていたため送信を見送った回数
+        self.max_depth = 0
+        self.slow = False
+        self.slow_detections = 0
+        self._backlog_since: Optional[float] = None
+
+        processor._publish_requests = _PublishRequests(self, processor._publish_requests)
+        processor.forward_publish_response = self.forward
+
+    async def forward(self, result: ua.PublishResult):
+        """
+        通知をキューに積み、Publishリクエストがあれば送信（UaProcessor.forward_publish_responseの置き換え）
+
+        Args:
+            result: 購読の通知
+        """
+        self.put(result)
+        self.flush()
+
+    def put(self, result: ua.PublishResult):
+        """
+        通知をキューに積む（あふれた場合はoverflowの設定に従う）
+
+        Args:
+            result: 購読の通知
+        """
+        if self.queue_size and len(self.results) >= self.queue_size:
+            if not (self.overflow == "coalesce" and self._coalesce(result)):
+                self.results.popleft()
+                self.dropped += 1
+        self.results.append(result)
+        self.max_depth = max(self.max_depth, len(self.results))
+
+    def _coalesce(self, result: ua.PublishResult) -> bool:
+        """同じ購読の最も新しい通知をresultにまとめてキューから取り除く"""
+        for index in range(len(self.results) - 1, -1, -1):
+            older = self.results[index]
+            if older.SubscriptionId == result.SubscriptionId:
+                coalesce_results(older, result)
+                del self.results[index]
+                self.coalesced += 1
+                return True
+        return False
+
+    def _next_request(self) -> Optional[Any]:
+        """タイムアウトしていない最も古いPublishリクエストを取得"""
+        requests = self.processor._publish_requests
+        while requests:
+            request = requests.popleft()
+            timeout = request.requesthdr.TimeoutHint
+            if timeout == 0 or time.time() - request.timestamp < timeout / 1000:
+                return request
+        return None
+
+    def flush(self):
+        """Publishリクエストがある間、たまっている通知を古い順に送信"""
+        stalled = False
+        while self.results:
+            if self.max_write_buffer and self.transport.get_write_buffer_size() > self.max_write_buffer:
+                # クライアントが受信しきれていない間は送信せず、キューの上限で通知の量を抑える
+                stalled = True
+                self.stalls += 1
+                break
+            request = self._next_request()
+            if request is None:
+                break
+            result = self.results.popleft()
+            session = self.processor.session
+            if session is None or result.SubscriptionId not in session.subscription_service.active_subscription_ids:
+                # 削除済みの購読の通知は破棄し、リクエストは次の通知に使う
+                self.processor._publish_requests.appendleft(request)
+                continue
+            response = ua.PublishResponse()
+            response.Parameters = result
+            self.processor.send_response(request.requesthdr.RequestHandle, request.seqhdr, response)
+            self.sent += 1
+        self._update_slow(bool(self.results) or stalled)
+
+    def _update_slow(self, backlog: bool):
+        """通知が滞った状態の継続時間から遅いセッションを検出"""
+        if not backlog:
+            self._backlog_since = None
+            if self.slow:
+                self.slow = False
+                logger.info(f"セッション {self.name} の通知の遅れが解消しました")
+            return
+        now = time.monotonic()
+        if self._backlog_since is None:
+            self._backlog_since = now
+        elif not self.slow and now - self._backlog_since >= self.slow_after:
+            self.slow = True
+            self.slow_detections += 1
+            logger.warning(
+                f"セッション {self.name} への通知が{self.slow_after}秒以上滞っています"
+                f"（キュー {len(self.results)}件, 破棄 {self.dropped}件, まとめ {self.coalesced}件）"
+            )
+
+    @property
+    def closed(self) -> bool:
+        """接続が閉じられている場合True"""
+        return self.transport.is_closing()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        セッションの統計を取得
+
+        Returns:
+            Dict[str, Any]: キューの長さ、送信・破棄・まとめた通知の数など
+        """
+        stats = {key: getattr(self, key) for key in STAT_KEYS}
+        stats.update(name=str(self.name), queued=len(self.results), max_depth=self.max_depth, slow=self.slow)
+        return stats
+
+
+class SessionGuard:
+    """全ての接続に上限付きの通知キューを設定し、統計を集計するクラス"""
+
+    def __init__(self, session_config: Optional[Dict[str, Any]] = None):
+        """
+        初期化
+
+        Args:
+            session_config: sessionsセクションの設定
+        """
+        self.session_config = session_config or {}
+        overflow = self.session_config.get("overflow", "coalesce")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"サポートされていないoverflowです: {overflow}（{', '.join(OVERFLOW_POLICIES)}）")
+        for key in ("queue_size", "max_write_buffer", "slow_after"):
+            if float(self.session_config.get(key, 0)) < 0:
+                raise ValueError(f"sessionsの{key}は0以上である必要があります: {self.session_config[key]}")
+        # 接続中のセッション
+        self.sessions: List[SessionQueue] = []
+        # 切断されたセッションの統計の累計
+        self._closed_totals = {key: 0 for key in STAT_KEYS}
+
+    def install(self, server: Server):
+        """
+        サーバーに登録（サーバーの起動前に呼び出す）
+
+        Args:
+            server: asyncuaサーバー
+        """
+        add_connection_hook(server, self.attach)
+
+    def attach(self, transport: Any):
+        """
+        新しい接続に上限付きの通知キューを設定
+
+        Args:
+            transport: 接続のトランスポート
+        """
+        self._prune()
+        self.sessions.append(SessionQueue(transport.get_protocol().processor, transport, self.session_config))
+
+    def _prune(self):
+        """切断されたセッションを統計の累計に移す"""
+        for session in [session for session in self.sessions if session.closed]:
+            for key in STAT_KEYS:
+                self._closed_totals[key] += getattr(session, key)
+            self.sessions.remove(session)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        全てのセッションの統計を取得
+
+        Returns:
+            Dict[str, int]: 接続中・遅いセッションの数、キューの通知の数と、送信・破棄・まとめた通知などの累計
+        """
+        self._prune()
+        stats = {
+            "sessions": len(self.sessions),
+            "slow_sessions": sum(session.slow for session in self.sessions),
+            "queued": sum(len(session.results) for session in self.sessions),
+        }
+        for key in STAT_KEYS:
+            stats[key] = self._closed_totals[key] + sum(getattr(session, key) for session in self.sessions)
+        return stats
@@ -0,0 +1,266 @@
+"""
+生成したデータの出力先（シンク）を管理するモジュール
+
+データはティックごとにDataGeneratorで1度だけ生成し、全てのシンクへ同じ値を配信する。
+OPC-UA以外のシンクはそれぞれ上限付きのキューと専用のタスクを持ち、キューがあふれた場合は最も古いティックを破棄する。
+そのため、遅いシンク（ブローカーへの接続が詰まったMQTTなど）が他のシンクやティック処理を待たせることはない。
+
+config.yamlの `sinks` セクションで有効にする。
+
+    sinks:
+      mqtt:
+        enabled: true
+        host: "localhost"
+        port: 1883
+      modbus:
+        enabled: true
+        port: 5020
+      shared_memory:
+        enabled: true
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+
+# デバイスID -> センサーID -> 値
+TickData = Dict[str, Dict[str, Union[float, bool, int]]]
+
+
+class Tick:
+    """1ティック分のデータ"""
+
+    __slots__ = ("timestamp", "data")
+
+    def __init__(self, timestamp: datetime, data: TickData):
+        """
+        初期化
+
+        Args:
+            timestamp: ティックのタイムスタンプ（UTC、タイムゾーンなし）
+            data: 生成されたデータ
+        """
+        self.timestamp = timestamp
+        self.data = data
+
+
+class Sink(ABC):
+    """シンクの基底クラス"""
+
+    # ログ出力などに使う名前
+    name = "sink"
+    # Trueの場合はキューを使わず、ティック処理の中で直接publishを呼び出す
+    inline = False
+    # Trueの場合、負荷が高い間は配信を止められる（FanOut.paused）
+    pausable = True
+
+    def __init__(self, sink_config: Optional[Dict[str, Any]] = None):
+        """
+        初期化
+
+        Args:
+            sink_config: シンクの設定
+        """
+        self.sink_config = sink_config or {}
+        self.queue_size = int(self.sink_config.get("queue_size", 100))
+        if self.queue_size < 1:
+            raise ValueError(f"{self.name}: queue_sizeは1以上である必要があります: {self.queue_size}")
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self):
+        """シンクの開始"""
+
+    async def stop(self):
+        """シンクの停止"""
+
+    @abstractmethod
+    async def publish(self, tick: Tick):
+        """
+        1ティック分のデータを出力
+
+        Args:
+            tick: ティックのデータ
+        """
+
+
+class SinkWorker:
+    """キュー付きのシンクを専用のタスクで動かすクラス"""
+
+    def __init__(self, sink: Sink):
+        """
+        初期化
+
+        Args:
+            sink: 対象のシンク
+        """
+        self.sink = sink
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=sink.queue_size)
+        self.task: Optional[asyncio.Task] = None
+        # 統計
+        self.published = 0
+        self.dropped = 0
+        self.errors = 0
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        """配信タスクの開始"""
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """配信タスクの停止"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def put(self, tick: Tick):
+        """
+        ティックをキューに積む（キューがあふれた場合は最も古いティックを破棄する）
+
+        Args:
+            tick: ティックのデータ
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(tick)
+
+    async def _run(self):
+        """キューからティックを取り出して出力"""
+        while True:
+            tick = await self.queue.get()
+            try:
+                await self.sink.publish(tick)
+                self.published += 1
+            except Exception as e:
+                self.errors += 1
+                self.logger.error(f"シンク '{self.sink.name}' の出力中にエラーが発生しました: {e}")
+
+
+class FanOut:
+    """1つのティックを全てのシンクへ配信するクラス"""
+
+    def __init__(self, sinks: List[Sink]):
+        """
+        初期化
+
+        Args:
+            sinks: シンクのリスト
+        """
+        self.inline_sinks = [sink for sink in sinks if sink.inline]
+        self.workers = [SinkWorker(sink) for sink in sinks if not sink.inline]
+        # Trueの間は、止められるシンク（pausable）へ配信しない
+        self.paused = False
+        self.paused_ticks = 0
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def sinks(self) -> List[Sink]:
+        """全てのシンク"""
+        return self.inline_sinks + [worker.sink for worker in self.workers]
+
+    async def start(self):
+        """全てのシンクを開始（開始できなかったシンクは外し、残りのシンクへ配信する）"""
+        failed = set()
+        for sink in self.sinks:
+            try:
+                await sink.start()
+            except Exception as e:
+                failed.add(id(sink))
+                self.logger.error(f"シンク '{sink.name}' を開始できませんでした。このシンクへは配信しません: {e}")
+                continue
+            self.logger.info(f"シンク '{sink.name}' を開始しました")
+        if failed:
+            self.inline_sinks = [sink for sink in self.inline_sinks if id(sink) not in failed]
+            self.workers = [worker for worker in self.workers if id(worker.sink) not in failed]
+        for worker in self.workers:
+            worker.start()
+
+    async def stop(self):
+        """全てのシンクを停止"""
+        for worker in self.workers:
+            await worker.stop()
+        for sink in self.sinks:
+            try:
+                await sink.stop()
+            except Exception as e:
+                self.logger.error(f"シンク '{sink.name}' の停止中にエラーが発生しました: {e}")
+
+    async def publish(self, timestamp: datetime, data: TickData):
+        """
+        1ティック分のデータを配信
+
+        Args:
+            timestamp: ティックのタイムスタンプ
+            data: 生成されたデータ（毎ティック再利用される辞書でもよい）
+        """
+        paused = self.paused
+        if paused:
+            self.paused_ticks += 1
+
+        if self.inline_sinks:
+            tick = Tick(timestamp, data)
+            for sink in self.inline_sinks:
+                if paused and sink.pausable:
+                    continue
+                await sink.publish(tick)
+
+        workers = [worker for worker in self.workers if not worker.sink.pausable] if paused else self.workers
+        if workers:
+            # キューに積むティックは後から処理されるため、再利用される辞書から1度だけコピーして全シンクで共有する
+            snapshot = Tick(timestamp, {device_id: dict(values) for device_id, values in data.items()})
+            for worker in workers:
+                worker.put(snapshot)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        キュー付きのシンクの統計を取得
+
+        Returns:
+            Dict[str, Dict[str, int]]: シンク名ごとの出力数、破棄数、エラー数、キューの長さ
+        """
+        return {
+            worker.sink.name: {
+                "published": worker.published,
+                "dropped": worker.dropped,
+                "errors": worker.errors,
+                "queued": worker.queue.qsize(),
+            }
+            for worker in self.workers
+        }
+
+
+def create_sinks(config: Dict[str, Any]) -> List[Sink]:
+    """
+    設定から有効なシンク（OPC-UA以外）を作成
+
+    Args:
+        config: 設定データ
+
+    Returns:
+        List[Sink]: シンクのリスト
+    """
+    sinks_config = config.get("sinks", {})
+    sinks: List[Sink] = []
+
+    mqtt_config = sinks_config.get("mqtt", {})
+    if mqtt_config.get("enabled", False):
+        from mqtt_sink import MqttSink
+        sinks.append(MqttSink(mqtt_config))
+
+    modbus_config = sinks_config.get("modbus", {})
+    if modbus_config.get("enabled", False):
+        from modbus_sink import ModbusSink
+        sinks.append(ModbusSink(modbus_config, config["devices"]))
+
+    shared_memory_config = sinks_config.get("shared_memory", {})
+    if shared_memory_config.get("enabled", False):
+        from tick_bus import TickBusSink
+        sinks.append(TickBusSink(shared_memory_config, config["devices"]))
+
+    return sinks
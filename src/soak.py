@@ -0,0 +1,358 @@
+"""
+長時間動作試験（ソークテスト）を行うモジュール
+
+OPC-UAサーバーと購読クライアントを同じプロセスで動かし、一定間隔でメモリ使用量・tracemallocの増加上位・
+イベントループの遅延・ティック処理時間・セッション数を記録する。
+試験の終了時にメモリ使用量とティック処理時間の傾き（シミュレーション時間1時間あたりの増加量）を求め、しきい値を超えた場合は失敗とする。
+
+ティック間隔と故障間隔を `--accelerate` 倍に短縮できるため、24時間分のティックをCIで実行可能な時間に圧縮して
+配信経路や購読経路のメモリリークを検出できる。
+
+使用例:
+    python src/soak.py --duration 600 --clients 10 --accelerate 60 --report soak_report.json
+"""
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import resource
+import sys
+import tracemalloc
+from typing import Any, Dict, List, Optional, Sequence
+
+from asyncua import Client
+from asyncua.server.internal_session import InternalSession
+
+from config_loader import load_config
+from data_generator import DataGenerator
+from governor import LoadGovernor
+from main import setup_logging
+from opcua_server import OpcUaServer
+
+
+def read_rss() -> int:
+    """
+    現在のプロセスの常駐メモリサイズを取得
+
+    Returns:
+        int: 常駐メモリサイズ（バイト）。/procが使えない環境ではピーク値
+    """
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # macOSはバイト、Linuxはキロバイト単位
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def linear_slope(xs: Sequence[float], ys: Sequence[float]) -> float:
+    """
+    最小二乗法による直線の傾きを計算
+
+    Args:
+        xs: 説明変数
+        ys: 目的変数
+
+    Returns:
+        float: 傾き。点が2つ未満の場合は0.0
+    """
+    n = len(xs)
+    if n < 2:
+        return 0.0
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+
+
+def accelerate_config(config: Dict[str, Any], factor: float) -> Dict[str, Any]:
+    """
+    ティック間隔と故障間隔を短縮した設定を作成
+
+    Args:
+        config: 設定データ
+        factor: 加速倍率
+
+    Returns:
+        Dict[str, Any]: 加速した設定データ（元の設定は変更しない）
+    """
+    config = copy.deepcopy(config)
+    config["server"]["update_interval"] = config["server"]["update_interval"] / factor
+    failure_config = config["failure_simulation"]
+    for key in ("mean_time_between_failures", "failure_duration_min", "failure_duration_max"):
+        failure_config[key] = failure_config[key] / factor
+    return config
+
+
+class SoakTest:
+    """ソークテストの実行と判定を行うクラス"""
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        duration: float,
+        clients: int = 10,
+        accelerate: float = 1.0,
+        sample_interval: float = 60.0,
+        max_memory_growth: float = 5.0,
+        max_latency_growth: float = 1.0,
+        warmup: float = 0.2,
+        trace_frames: int = 1,
+        top_allocators: int = 10
+    ):
+        """
+        初期化
+
+        Args:
+            config: 設定データ
+            duration: 試験時間（実時間の秒）
+            clients: 購読クライアント数
+            accelerate: ティック間隔と故障間隔の加速倍率
+            sample_interval: 計測間隔（実時間の秒）
+            max_memory_growth: 許容するメモリ増加量（MB / シミュレーション時間1時間）
+            max_latency_growth: 許容するティック処理時間の増加量（ミリ秒 / シミュレーション時間1時間）
+            warmup: 傾きの計算から除外する試験開始直後の割合
+            trace_frames: tracemallocで記録するフレーム数（0の場合はtracemallocを使用しない）
+            top_allocators: 記録する割り当て増加上位の件数
+        """
+        self.config = accelerate_config(config, accelerate) if accelerate != 1.0 else copy.deepcopy(config)
+        # ユーザーの状態ファイルへスナップショットを書き込まない
+        self.config["state"] = {"enabled": False}
+        # ガバナーの縮退は検出したいメモリや処理時間の増加を隠すため、段階の移り変わりを記録するだけにする
+        self.governor_config = self.config.get("governor", {})
+        self.config["governor"] = {"enabled": False}
+        self.duration = duration
+        self.client_count = clients
+        self.accelerate = accelerate
+        self.sample_interval = sample_interval
+        self.max_memory_growth = max_memory_growth
+        self.max_latency_growth = max_latency_growth
+        self.warmup = warmup
+        self.trace_frames = trace_frames
+        self.top_allocators = top_allocators
+
+        self.samples: List[Dict[str, Any]] = []
+        self.notifications = 0
+        self.client_errors = 0
+        self._max_loop_lag = 0.0
+        self._baseline_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._governor: Optional[LoadGovernor] = None
+        self.logger = logging.getLogger(__name__)
+
+    def datachange_notification(self, node, val, data):
+        """購読クライアントのデータ変更通知（通知数のみを数える）"""
+        self.notifications += 1
+
+    async def _connect_client(self, server: OpcUaServer) -> Client:
+        """購読クライアントを接続し、全センサーを購読"""
+        client = Client(url=server.server_config["endpoint"].replace("0.0.0.0", "127.0.0.1"))
+        await client.connect()
+        nodes = [
+            client.get_node(var.nodeid)
+            for device_nodes in server.nodes.values()
+            for var in device_nodes["sensors"].values()
+        ]
+        nodes += [
+            client.get_node(device_nodes["values"].nodeid)
+            for device_nodes in server.nodes.values()
+            if "values" in device_nodes
+        ]
+        subscription = await client.create_subscription(server.update_interval * 1000, self)
+        await subscription.subscribe_data_change(nodes)
+        return client
+
+    async def _monitor_loop_lag(self, interval: float = 0.1):
+        """イベントループの遅延（スリープの超過時間）を計測"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self._max_loop_lag = max(self._max_loop_lag, loop.time() - start - interval)
+
+    def _sample(self, server: OpcUaServer, elapsed: float, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """計測値を記録"""
+        metrics = server.metrics
+        ticks = metrics.ticks - (previous["ticks"] if previous else 0)
+        work_time = metrics.total_work_time - (previous["total_work_time"] if previous else 0.0)
+        sample = {
+            "elapsed": elapsed,
+            "simulated_hours": elapsed * self.accelerate / 3600,
+            # tracemalloc自身が使用するメモリは除外する
+            "rss_mb": (read_rss() - (tracemalloc.get_tracemalloc_memory() if tracemalloc.is_tracing() else 0)) / (1024 * 1024),
+            "ticks": metrics.ticks,
+            "total_work_time": metrics.total_work_time,
+            "tick_latency_ms": work_time / ticks * 1000 if ticks else 0.0,
+            "loop_lag_ms": self._max_loop_lag * 1000,
+            "sessions": InternalSession._current_connections,
+            "subscriptions": len(server.server.iserver.subscription_service.subscriptions),
+            "session_queues": server.session_guard.stats(),
+            "lazy_generation": server.lazy_generation.stats() if server.lazy_generation is not None else None,
+            "governor": server.governor.stats() if server.governor is not None else None,
+            "fast_read": server.read_snapshot.stats() if server.read_snapshot is not None else None,
+            "notifications": self.notifications,
+            "client_errors": self.client_errors,
+        }
+        self._max_loop_lag = 0.0
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            if self._baseline_snapshot is None:
+                self._baseline_snapshot = snapshot
+            stats = snapshot.compare_to(self._baseline_snapshot, "lineno")
+            sample["traced_mb"] = tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+            sample["top_allocators"] = [
+                {"location": str(stat.traceback), "size_diff_kb": stat.size_diff / 1024, "count_diff": stat.count_diff}
+                for stat in stats[:self.top_allocators]
+            ]
+
+        self.logger.info(
+            f"経過 {elapsed:.0f}秒（シミュレーション {sample['simulated_hours']:.2f}時間）: "
+            f"RSS {sample['rss_mb']:.1f}MB, ティック処理時間 {sample['tick_latency_ms']:.2f}ms, "
+            f"ループ遅延 {sample['loop_lag_ms']:.1f}ms, セッション {sample['sessions']}, 通知 {self.notifications}"
+        )
+        return sample
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        ソークテストを実行
+
+        Returns:
+            Dict[str, Any]: 計測結果と判定を含むレポート
+        """
+        server = OpcUaServer(self.config, DataGenerator(self.config))
+        await server.init()
+        server.governor = self._governor = LoadGovernor(server, self.governor_config, dry_run=True)
+
+        # アドレス空間の構築（標準ノードの読み込み）はトレースの対象外とする
+        if self.trace_frames > 0:
+            tracemalloc.start(self.trace_frames)
+        tasks = []
+        clients: List[Client] = []
+        try:
+            async with server.server:
+                tasks.append(asyncio.create_task(server.update_data()))
+                tasks.append(asyncio.create_task(self._monitor_loop_lag()))
+                for _ in range(self.client_count):
+                    clients.append(await self._connect_client(server))
+
+                loop = asyncio.get_running_loop()
+                start = loop.time()
+                previous = None
+                while True:
+                    elapsed = loop.time() - start
+                    if elapsed >= self.duration:
+                        break
+                    await asyncio.sleep(min(self.sample_interval, self.duration - elapsed))
+                    previous = self._sample(server, loop.time() - start, previous)
+                    self.samples.append(previous)
+
+                for client in clients:
+                    try:
+                        await client.disconnect()
+                    except Exception as e:
+                        self.client_errors += 1
+                        self.logger.error(f"クライアントの切断中にエラーが発生しました: {e}")
+                clients = []
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.trace_frames > 0:
+                tracemalloc.stop()
+
+        return self.evaluate()
+
+    def evaluate(self) -> Dict[str, Any]:
+        """
+        記録した計測値の傾きからメモリリークと処理時間の悪化を判定
+
+        Returns:
+            Dict[str, Any]: レポート（passedが判定結果、failuresが失敗理由）
+        """
+        start = int(len(self.samples) * self.warmup)
+        samples = self.samples[start:]
+        hours = [sample["simulated_hours"] for sample in samples]
+        memory_growth = linear_slope(hours, [sample["rss_mb"] for sample in samples])
+        latency_growth = linear_slope(hours, [sample["tick_latency_ms"] for sample in samples])
+
+        failures = []
+        if len(samples) < 3:
+            failures.append(f"傾きを求めるための計測点が不足しています（{len(samples)}点）")
+        if memory_growth > self.max_memory_growth:
+            failures.append(f"メモリ使用量が増加しています: {memory_growth:.2f}MB/時間（しきい値 {self.max_memory_growth}）")
+        if latency_growth > self.max_latency_growth:
+            failures.append(f"ティック処理時間が増加しています: {latency_growth:.3f}ms/時間（しきい値 {self.max_latency_growth}）")
+        if self.client_errors:
+            failures.append(f"クライアントでエラーが発生しました: {self.client_errors}件")
+
+        return {
+            "passed": not failures,
+            "failures": failures,
+            "memory_growth_mb_per_hour": memory_growth,
+            "latency_growth_ms_per_hour": latency_growth,
+            # ガバナーが有効だった場合に適用された段階（判定には使わない）
+            "governor": self._governor.stats() if self._governor is not None else None,
+            "samples": self.samples,
+        }
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description="OPC-UAサーバーシミュレーターのソークテスト")
+    parser.add_argument("--config", help="設定ファイルのパス")
+    parser.add_argument("--duration", type=float, default=86400, help="試験時間（秒）")
+    parser.add_argument("--clients", type=int, default=10, help="購読クライアント数")
+    parser.add_argument("--accelerate", type=float, default=1.0, help="ティック間隔と故障間隔の加速倍率")
+    parser.add_argument("--sample-interval", type=float, default=60.0, help="計測間隔（秒）")
+    parser.add_argument("--max-memory-growth", type=float, default=5.0, help="許容するメモリ増加量（MB/シミュレーション時間1時間）")
+    parser.add_argument("--max-latency-growth", type=float, default=1.0, help="許容するティック処理時間の増加量（ms/シミュレーション時間1時間）")
+    parser.add_argument("--trace-frames", type=int, default=1, help="tracemallocのフレーム数（0で無効）")
+    parser.add_argument("--report", help="レポートを書き出すJSONファイルのパス")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    メイン関数
+
+    Returns:
+        int: 終了コード（合格は0、不合格は1）
+    """
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    args = parse_args(argv)
+
+    soak = SoakTest(
+        load_config(args.config),
+        duration=args.duration,
+        clients=args.clients,
+        accelerate=args.accelerate,
+        sample_interval=args.sample_interval,
+        max_memory_growth=args.max_memory_growth,
+        max_latency_growth=args.max_latency_growth,
+        trace_frames=args.trace_frames
+    )
+    report = await soak.run()
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if report["passed"]:
+        logger.info(
+            f"ソークテストに合格しました: メモリ {report['memory_growth_mb_per_hour']:.2f}MB/時間, "
+            f"ティック処理時間 {report['latency_growth_ms_per_hour']:.3f}ms/時間"
+        )
+        return 0
+    for failure in report["failures"]:
+        logger.error(f"ソークテストに失敗しました: {failure}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,235 @@
+"""
+データ生成器の状態をファイルに保存し、再起動時に復元するモジュール
+
+状態は固定レイアウトのバイナリファイルをmmapで開き、各レコードをその場で上書きする（毎回ファイル全体を書き直さない）。
+
+    ヘッダー     : マジック, バージョン, レイアウトのCRC, センサー数, シーケンス番号, 保存時刻
+    乱数の状態   : random.getstate()の内部状態（625ワード）とgaussの次の値
+    デバイス     : 故障中フラグ, 故障終了時刻, 次の故障時刻
+    センサー     : 最後の値, 波形の状態, 故障パターンの状態（開始時刻, 開始時の値, 目標値）
+
+時刻（故障終了・次の故障・故障パターンの開始）は保存時刻からの相対値で保存し、復元時の時刻に足す
+（停止していた間は故障のタイマーも止まり、長く停止した後に過去の時刻のまま復元されない）。
+
+書き込み中はシーケンス番号を奇数にし、書き込み完了後に偶数にする。書き込みの途中でプロセスが停止した場合は、
+奇数のまま残ったスナップショットを破棄して通常どおり初期化する。
+デバイス・センサーの構成（config.yamlのキーと順序、センサーの種類・波形・故障パターン）が変わった場合も、
+レイアウトのCRCが一致しないため復元しない。
+"""
+import logging
+import math
+import mmap
+import os
+import random
+import struct
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from data_generator import DataGenerator
+
+
+MAGIC = b"SWST"
+VERSION = 2
+
+_HEADER = struct.Struct("<4sHHIIQd")
+# random.getstate()は (バージョン, 625個の32ビット整数, gaussの次の値) の組
+_RNG_WORDS = 625
+_RNG = struct.Struct(f"<I{_RNG_WORDS}Id")
+_DEVICE = struct.Struct("<B7xdd")
+_SENSOR = struct.Struct("<5d")
+# シーケンス番号と保存時刻の位置（書き込み中・完了の切り替えで上書きする）
+_SEQUENCE = struct.Struct("<Qd")
+_SEQUENCE_OFFSET = _HEADER.size - _SEQUENCE.size
+
+
+def _config_type(config: Union[str, Dict[str, Any], None], default: str) -> str:
+    """波形・故障パターンの設定から種類を取得（文字列と辞書のどちらの書き方にも対応）"""
+    if config is None:
+        return default
+    if isinstance(config, str):
+        return config
+    return config.get("type", "sine" if default == "default" else default)
+
+
+def sensor_signature(device_id: str, sensor_id: str, sensor_config: Dict[str, Any]) -> str:
+    """
+    レイアウトのCRCに含めるセンサーの識別情報（IDが同じでも、種類・波形・故障パターンが変わると保存した状態の意味が変わる）
+
+    Args:
+        device_id: デバイスID
+        sensor_id: センサーID
+        sensor_config: センサー設定
+
+    Returns:
+        str: `デバイスID.センサーID:種類:波形:故障パターン`
+    """
+    sensor_type = sensor_config.get("type") or ("counter" if "increment_min" in sensor_config else "number")
+    waveform = _config_type(sensor_config.get("waveform"), "default")
+    pattern = _config_type(sensor_config.get("failure_pattern"), "target")
+    return f"{device_id}.{sensor_id}:{sensor_type}:{waveform}:{pattern}"
+
+
+def _layout(generator: DataGenerator) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """デバイスIDの一覧と、(デバイスID, センサーID)の一覧を設定ファイルの記述順で取得"""
+    device_ids = list(generator.devices)
+    sensors = [
+        (device_id, sensor_id)
+        for device_id, device_config in generator.devices.items()
+        for sensor_id in device_config["sensors"]
+    ]
+    return device_ids, sensors
+
+
+class StateStore:
+    """データ生成器の状態のスナップショットを保存・復元するクラス"""
+
+    def __init__(self, path: str, generator: DataGenerator):
+        """
+        初期化（ファイルのサイズは構成から決まり、開いたまま再利用する）
+
+        Args:
+            path: スナップショットファイルのパス
+            generator: 対象のデータ生成器
+        """
+        self.path = path
+        self.generator = generator
+        self.device_ids, self.sensors = _layout(generator)
+        self.layout_crc = zlib.crc32("\n".join(self.device_ids + [
+            sensor_signature(device_id, sensor_id, generator.devices[device_id]["sensors"][sensor_id])
+            for device_id, sensor_id in self.sensors
+        ]).encode())
+        self._rng_offset = _HEADER.size
+        self._device_offset = self._rng_offset + _RNG.size
+        self._sensor_offset = self._device_offset + _DEVICE.size * len(self.device_ids)
+        self.size = self._sensor_offset + _SENSOR.size * len(self.sensors)
+
+        self.sequence = 0
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self.logger = logging.getLogger(__name__)
+
+    def open(self) -> bool:
+        """
+        ファイルを開き、有効なスナップショットがあればデータ生成器の状態を復元
+
+        Returns:
+            bool: 状態を復元した場合True
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        self._file.seek(0, os.SEEK_END)
+        existing = self._file.tell()
+        if existing != self.size:
+            self._file.truncate(self.size)
+        self._mmap = mmap.mmap(self._file.fileno(), self.size)
+
+        restored = existing == self.size and self._restore()
+        if not restored:
+            # 無効なスナップショットは破棄して、現在の構成のヘッダーを書き込む
+            self.sequence = 0
+            _HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, 0, self.layout_crc, len(self.sensors), 0, 0.0)
+        return restored
+
+    def _restore(self) -> bool:
+        """スナップショットを検証して状態を復元"""
+        magic, version, _, layout_crc, sensor_count, sequence, saved_at = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self.logger.warning(f"スナップショットの形式が異なるため復元しません: {self.path}")
+            return False
+        if layout_crc != self.layout_crc or sensor_count != len(self.sensors):
+            self.logger.warning("デバイス・センサーの構成が変更されているため、スナップショットを復元しません")
+            return False
+        if sequence == 0 or sequence % 2:
+            if sequence:
+                self.logger.warning("スナップショットが書き込みの途中で中断されているため復元しません")
+            return False
+
+        generator = self.generator
+        # 保存時刻からの相対値を現在の時刻に足す
+        now = time.time()
+        rng = _RNG.unpack_from(self._mmap, self._rng_offset)
+        random.setstate((rng[0], tuple(rng[1:1 + _RNG_WORDS]), None if math.isnan(rng[-1]) else rng[-1]))
+
+        for i, device_id in enumerate(self.device_ids):
+            is_failing, failure_end_time, next_failure_time = _DEVICE.unpack_from(
+                self._mmap, self._device_offset + i * _DEVICE.size
+            )
+            state = generator.device_states[device_id]
+            state["is_failing"] = bool(is_failing)
+            state["failure_end_time"] = now + failure_end_time
+            state["next_failure_time"] = now + next_failure_time
+
+        for i, (device_id, sensor_id) in enumerate(self.sensors):
+            value, waveform_state, *pattern_state = _SENSOR.unpack_from(self._mmap, self._sensor_offset + i * _SENSOR.size)
+            sensor_config = generator.devices[device_id]["sensors"][sensor_id]
+            if sensor_config.get("type") == "boolean":
+                value = bool(value)
+            elif "increment_min" in sensor_config:
+                value = int(value)
+            generator.last_values[device_id][sensor_id] = value
+
+            waveform = generator.waveforms[device_id].get(sensor_id)
+            if waveform is not None:
+                waveform.restore_state(waveform_state)
+            pattern = generator.failure_patterns[device_id].get(sensor_id)
+            if pattern is not None:
+                start_time, start_value, end_value = pattern_state
+                pattern.restore_state((now + start_time, start_value, end_value))
+
+        self.sequence = sequence
+        self.logger.info(f"スナップショットから状態を復元しました（{now - saved_at:.1f}秒前に保存）")
+        return True
+
+    def save(self):
+        """データ生成器の現在の状態をファイルに書き込む"""
+        if self._mmap is None:
+            return
+        generator = self.generator
+        buffer = self._mmap
+        now = time.time()
+
+        # 書き込み中（奇数）にする
+        self.sequence += 1
+        _SEQUENCE.pack_into(buffer, _SEQUENCE_OFFSET, self.sequence, 0.0)
+
+        version, internal_state, gauss_next = random.getstate()
+        _RNG.pack_into(buffer, self._rng_offset, version, *internal_state, math.nan if gauss_next is None else gauss_next)
+
+        offset = self._device_offset
+        for device_id in self.device_ids:
+            state = generator.device_states[device_id]
+            _DEVICE.pack_into(
+                buffer, offset, state["is_failing"], state["failure_end_time"] - now, state["next_failure_time"] - now
+            )
+            offset += _DEVICE.size
+
+        offset = self._sensor_offset
+        for device_id, sensor_id in self.sensors:
+            waveform = generator.waveforms[device_id].get(sensor_id)
+            pattern = generator.failure_patterns[device_id].get(sensor_id)
+            start_time, start_value, end_value = pattern.state if pattern is not None else (math.nan, 0.0, math.nan)
+            _SENSOR.pack_into(
+                buffer, offset,
+                float(generator.last_values[device_id][sensor_id]),
+                waveform.state if waveform is not None else 0.0,
+                start_time - now, start_value, end_value
+            )
+            offset += _SENSOR.size
+
+        # 書き込み完了（偶数）にする
+        self.sequence += 1
+        _SEQUENCE.pack_into(buffer, _SEQUENCE_OFFSET, self.sequence, now)
+
+    def close(self):
+        """最新の状態を書き込んでファイルを閉じる"""
+        if self._mmap is None:
+            return
+        self.save()
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.close()
+        self._mmap = None
+        self._file = None
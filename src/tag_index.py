@@ -0,0 +1,293 @@
+"""
+NodeIdの割り当てとタグのインデックスを管理するモジュール
+
+asyncuaに任せるとNodeIdは作成順の連番になり、設定の変更や再起動で変わってしまう（SiteWiseのプロパティの対応付けが壊れる）。
+このモジュールはノードのパス（デバイスID・センサーIDなど）の安定したハッシュから数値のNodeIdを決め、
+設定ファイルで `node_id` を指定した場合はその値を使う。
+
+    devices:
+      conveyor_belt:
+        node_id: 1000        # 省略時はパスのハッシュから決定
+        sensors:
+          speed:
+            node_id: 1001
+
+ハッシュの値が他のパスや既存のノードと重なった場合は、次の空いている値を使う。
+`reserve` で事前に登録したパスは、パスの辞書順に割り当てるため、設定ファイルの記述順によらず同じ値になる。
+
+センサーのNodeIdの数値はタグIDとしても使い、TagIndexでタグIDから値の位置（スロット）・ノード・変数型を直接引ける。
+"""
+import zlib
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+from asyncua import ua
+from asyncua.common.node import Node
+
+
+# ハッシュから決めるNodeIdの範囲（asyncuaが自動で割り当てる小さな連番や、設定で指定するIDと重ならないようにする）
+HASHED_ID_MIN = 1_000_000
+HASHED_ID_MAX = 2**31 - 1
+# 設定で指定できるNodeIdの範囲（UInt32）
+EXPLICIT_ID_MAX = 2**32 - 1
+
+
+def stable_node_id(path: str) -> int:
+    """
+    パスから安定した数値のNodeIdを計算（プロセスや実行環境によらず同じ値になる）
+
+    Args:
+        path: ノードのパス（例: "conveyor_belt.speed"）
+
+    Returns:
+        int: NodeIdの数値
+    """
+    return HASHED_ID_MIN + zlib.crc32(path.encode("utf-8")) % (HASHED_ID_MAX - HASHED_ID_MIN + 1)
+
+
+def tag_path(device_id: str, sensor_id: str) -> str:
+    """
+    センサーのパス（派生センサーの式と同じ `デバイスID.センサーID` の形式）
+
+    Args:
+        device_id: デバイスID
+        sensor_id: センサーID
+
+    Returns:
+        str: パス
+    """
+    return f"{device_id}.{sensor_id}"
+
+
+class NodeIdAllocator:
+    """名前空間内のNodeIdを割り当て、重複を検出するクラス"""
+
+    def __init__(self, idx: int, aspace: Optional[Any] = None):
+        """
+        初期化
+
+        Args:
+            idx: 名前空間インデックス
+            aspace: サーバーのアドレス空間（server.iserver.aspace）。指定した場合、既存のノードと重なるNodeIdを割り当てない
+        """
+        self.idx = idx
+        self.aspace = aspace
+        # 割り当て済みのNodeIdの数値 -> パス
+        self.assigned: Dict[int, str] = {}
+        # reserveで割り当てたが、まだ取得されていないパス -> NodeIdの数値
+        self._reserved: Dict[str, int] = {}
+        # 取得済みのパス
+        self._paths: Set[str] = set()
+
+    def _in_use(self, identifier: int) -> bool:
+        """NodeIdの数値が割り当て済み、またはアドレス空間で使われているか"""
+        return identifier in self.assigned or (
+            self.aspace is not None and ua.NodeId(identifier, self.idx) in self.aspace
+        )
+
+    def _explicit_id(self, path: str, explicit: Any) -> int:
+        """設定で指定されたNodeIdを検証して割り当て"""
+        if isinstance(explicit, bool) or not isinstance(explicit, int) or not 0 < explicit <= EXPLICIT_ID_MAX:
+            raise ValueError(f"'{path}' のnode_idは1から{EXPLICIT_ID_MAX}までの整数である必要があります: {explicit}")
+        other = self.assigned.get(explicit)
+        if other is not None:
+            raise ValueError(
+                f"NodeIdが重複しています: '{path}' と '{other}'（ns={self.idx};i={explicit}）。"
+                f"どちらかの node_id を変更してください"
+            )
+        # asyncuaが自動で割り当てたNodeIdなど、アドレス空間に既にあるノードとの重複
+        if self.aspace is not None and ua.NodeId(explicit, self.idx) in self.aspace:
+            raise ValueError(
+                f"'{path}' のNodeIdは既にアドレス空間で使われています（ns={self.idx};i={explicit}）。"
+                f"別の node_id を指定してください"
+            )
+        self.assigned[explicit] = path
+        return explicit
+
+    def _hashed_id(self, path: str) -> int:
+        """パスのハッシュからNodeIdを割り当て（使われている場合は次の空いている値を使う）"""
+        identifier = stable_node_id(path)
+        while self._in_use(identifier):
+            identifier = HASHED_ID_MIN if identifier == HASHED_ID_MAX else identifier + 1
+        self.assigned[identifier] = path
+        return identifier
+
+    def reserve(self, paths: Mapping[str, Optional[Any]]):
+        """
+        NodeIdを事前に割り当て（ハッシュが重なったパスの値を、パスの辞書順に決める）
+
+        設定で指定されたNodeIdを先に割り当て、残りのパスを辞書順にハッシュから割り当てる。
+        割り当てた値は、同じパスのnumeric_idなどで取得する。
+
+        Args:
+            paths: ノードのパス -> 設定で指定されたNodeId（Noneの場合はパスのハッシュから決定）
+        """
+        for path, explicit in paths.items():
+            if explicit is not None:
+                self._reserved[path] = self._explicit_id(path, explicit)
+        for path in sorted(path for path, explicit in paths.items() if explicit is None):
+            self._reserved[path] = self._hashed_id(path)
+
+    def numeric_id(self, path: str, explicit: Optional[Any] = None) -> int:
+        """
+        NodeIdの数値を割り当て
+
+        Args:
+            path: ノードのパス
+            explicit: 設定で指定されたNodeId（Noneの場合はパスのハッシュから決定）
+
+        Returns:
+            int: NodeIdの数値
+        """
+        if path in self._paths:
+            raise ValueError(f"ノードのパスが重複しています: '{path}'")
+        identifier = self._reserved.get(path)
+        if identifier is not None:
+            if explicit is not None and explicit != identifier:
+                raise ValueError(f"'{path}' のnode_idが事前の割り当てと異なります: {explicit}（{identifier}）")
+            del self._reserved[path]
+        elif explicit is None:
+            identifier = self._hashed_id(path)
+        else:
+            identifier = self._explicit_id(path, explicit)
+        self._paths.add(path)
+        return identifier
+
+    def node_id(self, path: str, explicit: Optional[Any] = None) -> ua.NodeId:
+        """
+        NodeIdを割り当て
+
+        Args:
+            path: ノードのパス
+            explicit: 設定で指定されたNodeId（Noneの場合はパスのハッシュから決定）
+
+        Returns:
+            ua.NodeId: NodeId
+        """
+        return ua.NodeId(self.numeric_id(path, explicit), self.idx)
+
+    def allocate(self, path: str, browse_name: str, explicit: Optional[Any] = None) -> Tuple[ua.NodeId, ua.QualifiedName]:
+        """
+        ノードの作成に使うNodeIdとブラウズ名を取得（add_objectなどの引数に展開して使う）
+
+        NodeIdを指定してノードを作成する場合、文字列のブラウズ名は名前空間0と解釈されるため、名前空間を付けて返す。
+
+        Args:
+            path: ノードのパス
+            browse_name: ブラウズ名
+            explicit: 設定で指定されたNodeId
+
+        Returns:
+            Tuple[ua.NodeId, ua.QualifiedName]: NodeIdとブラウズ名
+        """
+        return self.node_id(path, explicit), ua.QualifiedName(browse_name, self.idx)
+
+
+class Tag:
+    """1つのタグ（センサー）"""
+
+    __slots__ = ("tag_id", "slot", "device_id", "sensor_id", "variant_type", "node", "nodeid")
+
+    def __init__(
+        self,
+        tag_id: int,
+        slot: int,
+        device_id: str,
+        sensor_id: str,
+        variant_type: ua.VariantType,
+        node: Optional[Node] = None
+    ):
+        """
+        初期化
+
+        Args:
+            tag_id: タグID（センサーのNodeIdの数値）
+            slot: 値の位置（全タグを設定ファイルの記述順に並べた連番）
+            device_id: デバイスID
+            sensor_id: センサーID
+            variant_type: 変数型
+            node: センサーの変数ノード（センサーごとの変数を公開しない場合はNone）
+        """
+        self.tag_id = tag_id
+        self.slot = slot
+        self.device_id = device_id
+        self.sensor_id = sensor_id
+        self.variant_type = variant_type
+        self.node = node
+        self.nodeid = node.nodeid if node is not None else None
+
+
+class TagIndex:
+    """タグIDからタグを直接引くためのインデックス"""
+
+    def __init__(self):
+        """初期化"""
+        # スロット順のタグ
+        self.tags: List[Tag] = []
+        self._by_id: Dict[int, Tag] = {}
+        self._by_path: Dict[Tuple[str, str], Tag] = {}
+
+    def add(
+        self,
+        tag_id: int,
+        device_id: str,
+        sensor_id: str,
+        variant_type: ua.VariantType,
+        node: Optional[Node] = None
+    ) -> Tag:
+        """
+        タグを追加（スロットは追加順に割り当てる）
+
+        Args:
+            tag_id: タグID
+            device_id: デバイスID
+            sensor_id: センサーID
+            variant_type: 変数型
+            node: センサーの変数ノード
+
+        Returns:
+            Tag: 追加したタグ
+        """
+        if tag_id in self._by_id:
+            raise ValueError(f"タグIDが重複しています: {tag_id}")
+        tag = Tag(tag_id, len(self.tags), device_id, sensor_id, variant_type, node)
+        self.tags.append(tag)
+        self._by_id[tag_id] = tag
+        self._by_path[(device_id, sensor_id)] = tag
+        return tag
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def __iter__(self) -> Iterator[Tag]:
+        return iter(self.tags)
+
+    def __contains__(self, tag_id: int) -> bool:
+        return tag_id in self._by_id
+
+    def __getitem__(self, tag_id: int) -> Tag:
+        """
+        タグIDからタグを取得
+
+        Args:
+            tag_id: タグID
+
+        Returns:
+            Tag: タグ
+        """
+        return self._by_id[tag_id]
+
+    def find(self, device_id: str, sensor_id: str) -> Tag:
+        """
+        デバイスIDとセンサーIDからタグを取得（初期化時や設定変更時に使用し、ティックごとの処理では使わない）
+
+        Args:
+            device_id: デバイスID
+            sensor_id: センサーID
+
+        Returns:
+            Tag: タグ
+        """
+        tag = self._by_path.get((device_id, sensor_id))
+        if tag is None:
+            raise KeyError(f"タグが見つかりません: {tag_path(device_id, sensor_id)}")
+        return tag
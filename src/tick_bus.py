@@ -0,0 +1,364 @@
+"""
+ティックの値を共有メモリのリングバッファで同じホストのプロセスへ渡すモジュール
+
+ダッシュボードや検証ツール、エクスポーターなどのローカルのプロセスは、OPC-UAクライアントとして接続すると
+両側でエンコード・デコードの負荷がかかる。このシンクは全てのタグの値を固定のレイアウト（設定ファイルの記述順で、
+TagIndexのスロットと同じ順）で共有メモリに書き込み、TickBusReaderはそれをコピーせずにNumPyの配列として参照する。
+
+    ヘッダー     : マジック, バージョン, タグ数, リングの長さ, レイアウトのJSONの長さ, 最新のティック番号
+    レイアウト   : タグのパス（`デバイスID.センサーID`）と型のJSON
+    シーケンス   : スロットごとのuint64（書き込み中は奇数 2t-1、書き込み後は偶数 2t。tはティック番号）
+    タイムスタンプ: スロットごとのfloat64（UNIX時刻）
+    値           : スロット×タグのfloat64（ブール型は0.0/1.0）
+
+ティックtはスロット t % リングの長さ に書き込む。リーダーは書き込み前後のシーケンスを比べて（seqlock）、
+ロックを使わずに書き込み途中のスロットを読んでいないことを確認する。生成されなかったタグ（遅延生成や生成数の上限）は
+前のティックの値を引き継ぐ。書き込み途中のスロットを読んだ場合は、最初の数回は待たずに、その後は少し待ってから読み直し、
+上限の回数を超えた場合（書き込み中のプロセスが停止した場合など）はTimeoutErrorを送出する。
+
+NumPyが必要（`pip install numpy`）。config.yamlの `sinks.shared_memory` セクションで有効にする。
+
+    sinks:
+      shared_memory:
+        enabled: true
+        name: "sitewise_simulator_ticks"  # 共有メモリの名前
+        history: 256                       # リングの長さ（保持するティック数）
+"""
+import json
+import struct
+import time
+from datetime import timezone
+from itertools import chain
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("共有メモリのティックバスを使用するにはnumpyをインストールしてください（pip install numpy）")
+
+from sinks import Sink, Tick
+from tag_index import tag_path
+
+
+MAGIC = b"SIMTICK1"
+VERSION = 1
+# マジック, バージョン, タグ数, リングの長さ, レイアウトのJSONの長さ（最新のティック番号はこの直後のuint64）
+_HEADER = struct.Struct("<8sIIII")
+_LATEST_OFFSET = 32
+_LAYOUT_OFFSET = 40
+
+# 書き込み途中のスロットを読んだ場合の再試行（最初の_SPIN_RETRIES回は待たずに、その後は_RETRY_SLEEP秒待ってから読み直す）
+_SPIN_RETRIES = 16
+_RETRY_SLEEP = 0.001
+DEFAULT_MAX_RETRIES = 1000
+
+# このプロセスで作成した共有メモリの名前（同じプロセスのリーダーはリソーストラッカーの登録を解除しない）
+_OWNED: Set[str] = set()
+
+
+def _align(offset: int) -> int:
+    """8バイト境界に切り上げ"""
+    return (offset + 7) & ~7
+
+
+def tag_kind(sensor_config: Dict[str, Any]) -> str:
+    """
+    センサーの種類からレイアウトに記録する型を決定
+
+    Args:
+        sensor_config: センサー設定
+
+    Returns:
+        str: boolean, counterまたはdouble
+    """
+    if sensor_config.get("type") == "boolean":
+        return "boolean"
+    if "increment_min" in sensor_config:
+        return "counter"
+    return "double"
+
+
+class _Regions:
+    """共有メモリ上の各領域のNumPyビュー"""
+
+    def __init__(self, buffer: memoryview, tag_count: int, capacity: int, layout_size: int):
+        offset = _align(_LAYOUT_OFFSET + layout_size)
+        self.latest = np.ndarray((1,), dtype=np.uint64, buffer=buffer, offset=_LATEST_OFFSET)
+        self.sequences = np.ndarray((capacity,), dtype=np.uint64, buffer=buffer, offset=offset)
+        offset += 8 * capacity
+        self.timestamps = np.ndarray((capacity,), dtype=np.float64, buffer=buffer, offset=offset)
+        offset += 8 * capacity
+        self.values = np.ndarray((capacity, tag_count), dtype=np.float64, buffer=buffer, offset=offset)
+
+    @staticmethod
+    def size(tag_count: int, capacity: int, layout_size: int) -> int:
+        """共有メモリの大きさ（バイト）"""
+        return _align(_LAYOUT_OFFSET + layout_size) + 16 * capacity + 8 * capacity * tag_count
+
+
+class TickBusSink(Sink):
+    """共有メモリのリングバッファへ書き込むシンク"""
+
+    name = "shared_memory"
+    # 書き込みはメモリのコピーだけのため、キューを使わずティック処理の中で直接書き込む
+    inline = True
+
+    def __init__(self, sink_config: Dict[str, Any], devices: Dict[str, Any]):
+        """
+        初期化
+
+        Args:
+            sink_config: sinks.shared_memoryセクションの設定
+            devices: デバイス設定
+        """
+        super().__init__(sink_config)
+        self.shm_name = sink_config.get("name", "sitewise_simulator_ticks")
+        self.capacity = int(sink_config.get("history", 256))
+        if self.capacity < 2:
+            raise ValueError(f"shared_memory: historyは2以上である必要があります: {self.capacity}")
+
+        # デバイスID -> センサーID -> スロット
+        self.slots: Dict[str, Dict[str, int]] = {}
+        tags = []
+        for device_id, device_config in devices.items():
+            self.slots[device_id] = {}
+            for sensor_id, sensor_config in device_config["sensors"].items():
+                self.slots[device_id][sensor_id] = len(tags)
+                tags.append({"path": tag_path(device_id, sensor_id), "type": tag_kind(sensor_config)})
+        self.layout = json.dumps({"tags": tags}, ensure_ascii=False).encode("utf-8")
+        self.tag_count = len(tags)
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self._regions: Optional[_Regions] = None
+        self.tick = 0
+        # 生成結果の並び（デバイスIDとデバイスごとのセンサー数）と、それに対応するスロットの配列
+        self._shape: Optional[Tuple] = None
+        self._indices = np.empty((0,), dtype=np.intp)
+
+    async def start(self):
+        """共有メモリを作成してヘッダーとレイアウトを書き込む"""
+        size = _Regions.size(self.tag_count, self.capacity, len(self.layout))
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.shm_name, create=True, size=size)
+        except FileExistsError:
+            # 前回の実行で削除されずに残った共有メモリは作り直す
+            self.logger.warning(f"共有メモリ '{self.shm_name}' が既に存在するため作り直します")
+            stale = shared_memory.SharedMemory(name=self.shm_name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.shm_name, create=True, size=size)
+        _OWNED.add(self.shm_name)
+
+        buffer = self.shm.buf
+        _HEADER.pack_into(buffer, 0, MAGIC, VERSION, self.tag_count, self.capacity, len(self.layout))
+        buffer[_LAYOUT_OFFSET:_LAYOUT_OFFSET + len(self.layout)] = self.layout
+        self._regions = _Regions(buffer, self.tag_count, self.capacity, len(self.layout))
+        self._regions.latest[0] = 0
+        self._regions.sequences[:] = 0
+        self.tick = 0
+        self.logger.info(f"共有メモリ '{self.shm_name}' を作成しました（{self.tag_count}タグ × {self.capacity}ティック, {size}バイト）")
+
+    async def stop(self):
+        """共有メモリを削除"""
+        if self.shm is None:
+            return
+        self._regions = None
+        self.shm.close()
+        self.shm.unlink()
+        _OWNED.discard(self.shm_name)
+        self.shm = None
+
+    async def publish(self, tick: Tick):
+        """1ティック分の値をリングバッファの次のスロットへ書き込む"""
+        regions = self._regions
+        number = self.tick + 1
+        index = number % self.capacity
+        sequences = regions.sequences
+        sequences[index] = 2 * number - 1
+
+        row = regions.values[index]
+        # 生成されなかったタグは前のティックの値を引き継ぐ
+        row[:] = regions.values[(number - 1) % self.capacity]
+        data = tick.data
+        # デバイスごとの生成対象は設定の記述順の先頭からのセンサーのため、センサー数が同じなら並びも同じ
+        shape = (tuple(data), tuple(map(len, data.values())))
+        if shape != self._shape:
+            self._shape = shape
+            self._indices = np.fromiter(
+                chain.from_iterable(map(self.slots[device_id].__getitem__, device_data) for device_id, device_data in data.items()),
+                dtype=np.intp
+            )
+        if len(self._indices):
+            row[self._indices] = np.fromiter(
+                chain.from_iterable(device_data.values() for device_data in data.values()),
+                dtype=np.float64,
+                count=len(self._indices)
+            )
+        regions.timestamps[index] = tick.timestamp.replace(tzinfo=timezone.utc).timestamp()
+
+        sequences[index] = 2 * number
+        regions.latest[0] = number
+        self.tick = number
+
+
+class TickFrame(NamedTuple):
+    """1ティック分の値"""
+
+    # ティック番号
+    tick: int
+    # タイムスタンプ（UNIX時刻）
+    timestamp: float
+    # スロット順の値
+    values: Any
+
+
+class TickBusReader:
+    """共有メモリのリングバッファを読み取るクラス（シミュレーターとは別のプロセスで使用する）"""
+
+    def __init__(self, name: str = "sitewise_simulator_ticks", max_retries: int = DEFAULT_MAX_RETRIES):
+        """
+        初期化（共有メモリに接続する）
+
+        Args:
+            name: 共有メモリの名前
+            max_retries: 書き込み途中のスロットを読んだ場合に読み直す回数の上限
+        """
+        if max_retries < 1:
+            raise ValueError(f"max_retriesは1以上である必要があります: {max_retries}")
+        self.max_retries = max_retries
+        self.shm = shared_memory.SharedMemory(name=name)
+        if name not in _OWNED:
+            # 接続しただけのプロセスの終了で共有メモリが削除されないよう、リソーストラッカーの登録を解除する
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        magic, version, tag_count, capacity, layout_size = _HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f"共有メモリ '{name}' はティックバスの形式ではありません")
+        self.tag_count = tag_count
+        self.capacity = capacity
+        layout = json.loads(bytes(self.shm.buf[_LAYOUT_OFFSET:_LAYOUT_OFFSET + layout_size]).decode("utf-8"))
+        # スロット順のタグ（パスと型）
+        self.tags: List[Dict[str, str]] = layout["tags"]
+        self._slots = {tag["path"]: slot for slot, tag in enumerate(self.tags)}
+        self._regions = _Regions(self.shm.buf, tag_count, capacity, layout_size)
+
+    def close(self):
+        """共有メモリから切断（取得したビューは使えなくなる）"""
+        self._regions = None
+        self.shm.close()
+
+    def slot(self, device_id: str, sensor_id: str) -> int:
+        """
+        タグのスロットを取得
+
+        Args:
+            device_id: デバイスID
+            sensor_id: センサーID
+
+        Returns:
+            int: スロット（値の配列の位置）
+        """
+        return self._slots[tag_path(device_id, sensor_id)]
+
+    @property
+    def latest_tick(self) -> int:
+        """最新のティック番号（まだ書き込まれていない場合は0）"""
+        return int(self._regions.latest[0])
+
+    def is_valid(self, tick: int) -> bool:
+        """
+        ティックの値がまだ上書きされていないかを確認（ビューの値を使った後に呼び出す）
+
+        Args:
+            tick: ティック番号
+
+        Returns:
+            bool: 上書きされていない場合True
+        """
+        return tick > 0 and int(self._regions.sequences[tick % self.capacity]) == 2 * tick
+
+    def _retry(self, attempt: int):
+        """
+        書き込み途中のスロットを読んだ場合に、読み直す前に待機
+
+        Args:
+            attempt: 読み直した回数
+        """
+        if attempt >= self.max_retries:
+            raise TimeoutError(
+                f"{self.max_retries}回読み直しても書き込みが完了しませんでした（書き込み中のプロセスが停止した可能性があります）"
+            )
+        if attempt >= _SPIN_RETRIES:
+            time.sleep(_RETRY_SLEEP)
+
+    def latest(self, copy: bool = False) -> Optional[TickFrame]:
+        """
+        最新のティックを取得
+
+        copy=Falseの場合、値は共有メモリのビュー（コピーなし）で、リングが1周する（history - 1ティック後）までは変わらない。
+        それより長く保持する場合は、使った後に is_valid で上書きされていないことを確認するか、copy=Trueを指定する。
+
+        Args:
+            copy: 値をコピーする場合True
+
+        Returns:
+            Optional[TickFrame]: 最新のティック（まだ書き込まれていない場合はNone）
+
+        Raises:
+            TimeoutError: max_retries回読み直しても書き込みが完了しない場合
+        """
+        regions = self._regions
+        attempt = 0
+        while True:
+            tick = int(regions.latest[0])
+            if tick == 0:
+                return None
+            index = tick % self.capacity
+            if int(regions.sequences[index]) == 2 * tick:
+                timestamp = float(regions.timestamps[index])
+                values = regions.values[index]
+                if copy:
+                    values = values.copy()
+                if self.is_valid(tick):
+                    return TickFrame(tick, timestamp, values)
+            self._retry(attempt)
+            attempt += 1
+
+    def history(self, count: int) -> Tuple[Any, Any, Any]:
+        """
+        最新のcountティックを古い順に取得
+
+        リングの中で連続している場合は共有メモリのビュー（コピーなし）、リングの終端をまたぐ場合はコピーを返す。
+
+        Args:
+            count: ティック数（history - 1以下。書き込まれたティック数より多い場合は書き込まれた分だけ）
+
+        Returns:
+            Tuple[Any, Any, Any]: ティック番号の配列、タイムスタンプの配列、ティック×スロットの値の配列
+
+        Raises:
+            TimeoutError: max_retries回読み直しても書き込みが完了しない場合
+        """
+        if not 0 < count < self.capacity:
+            raise ValueError(f"ティック数は1から{self.capacity - 1}までである必要があります: {count}")
+        regions = self._regions
+        attempt = 0
+        while True:
+            last = int(regions.latest[0])
+            first = max(1, last - count + 1)
+            if last == 0:
+                empty = np.empty((0,), dtype=np.uint64)
+                return empty, np.empty((0,), dtype=np.float64), np.empty((0, self.tag_count), dtype=np.float64)
+            start = first % self.capacity
+            end = last % self.capacity + 1
+            if start < end:
+                timestamps = regions.timestamps[start:end]
+                values = regions.values[start:end]
+            else:
+                timestamps = np.concatenate((regions.timestamps[start:], regions.timestamps[:end]))
+                values = np.concatenate((regions.values[start:], regions.values[:end]))
+            # 読み取り中に最も古いティックが上書きされていなければ、全てのティックが揃っている
+            if self.is_valid(first) and self.is_valid(last):
+                return np.arange(first, last + 1, dtype=np.uint64), timestamps, values
+            self._retry(attempt)
+            attempt += 1
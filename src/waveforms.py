@@ -0,0 +1,367 @@
+"""
+センサー値の波形と故障パターンを生成するモジュール
+
+周期波形は32ビットの位相アキュムレーターで位相を進め、起動時に1度だけ計算した参照テーブルを引いて値を得る。
+サンプルごとに三角関数を呼び出さないため、センサー数が多くても1ティックあたりのコストは整数演算とリスト参照のみになる。
+"""
+import math
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+# 参照テーブルのサイズ（2のべき乗）
+TABLE_BITS = 10
+TABLE_SIZE = 1 << TABLE_BITS
+
+# 位相アキュムレーターのビット幅
+PHASE_BITS = 32
+PHASE_MASK = (1 << PHASE_BITS) - 1
+_INDEX_SHIFT = PHASE_BITS - TABLE_BITS
+
+
+def _build_sine_table() -> List[float]:
+    """1周期分のsin波テーブルを作成"""
+    return [math.sin(2 * math.pi * i / TABLE_SIZE) for i in range(TABLE_SIZE)]
+
+
+def _build_production_cycle_table() -> List[float]:
+    """
+    1サイクル分の生産サイクルプロファイルを作成
+
+    搬入（立ち上がり）→加工（高負荷）→搬出（立ち下がり）→待機（低負荷）の順で、値は-1.0〜1.0に正規化する。
+    """
+    table = []
+    for i in range(TABLE_SIZE):
+        x = i / TABLE_SIZE
+        if x < 0.15:
+            # 搬入: 待機状態から加工状態へ滑らかに立ち上がる
+            value = -math.cos(math.pi * x / 0.15)
+        elif x < 0.65:
+            # 加工: 高負荷状態（わずかなうねりを含む）
+            value = 1.0 - 0.1 * (1 - math.cos(2 * math.pi * (x - 0.15) / 0.5)) / 2
+        elif x < 0.8:
+            # 搬出: 加工状態から待機状態へ立ち下がる
+            value = math.cos(math.pi * (x - 0.65) / 0.15)
+        else:
+            # 待機
+            value = -1.0
+        table.append(value)
+    return table
+
+
+SINE_TABLE = _build_sine_table()
+PRODUCTION_CYCLE_TABLE = _build_production_cycle_table()
+
+
+class Waveform(ABC):
+    """周期波形の基底クラス"""
+
+    def __init__(self, period: float, amplitude: float, start_time: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            period: 周期（秒）
+            amplitude: 振幅（目標範囲に対する割合）
+            start_time: 位相の基準時刻。指定がない場合は現在時刻を使用
+        """
+        if period <= 0:
+            raise ValueError(f"波形の周期は正の値である必要があります: {period}")
+        self.period = period
+        self.amplitude = amplitude
+        # 1秒あたりの位相の増分
+        self._phase_rate = (1 << PHASE_BITS) / period
+        # UNIX時刻を基準に位相を合わせる（再起動しても波形の位相が揃う）
+        if start_time is None:
+            start_time = time.time()
+        self.phase = int((start_time % period) * self._phase_rate) & PHASE_MASK
+
+    def advance(self, dt: float):
+        """
+        位相を進める
+
+        Args:
+            dt: 経過時間（秒）
+        """
+        self.phase = (self.phase + int(dt * self._phase_rate)) & PHASE_MASK
+
+    @abstractmethod
+    def sample(self) -> float:
+        """
+        現在の位相の値を取得
+
+        Returns:
+            float: -1.0〜1.0に正規化された値
+        """
+
+    def step(self, dt: float) -> float:
+        """
+        位相を進めて振幅を掛けた値を取得
+
+        Args:
+            dt: 経過時間（秒）
+
+        Returns:
+            float: 目標範囲に対する割合で表した変動量
+        """
+        self.advance(dt)
+        return self.amplitude * self.sample()
+
+    @property
+    def state(self) -> float:
+        """スナップショットに保存する状態（周期波形の位相はUNIX時刻から決まるため保存しない）"""
+        return 0.0
+
+    def restore_state(self, state: float):
+        """
+        スナップショットから状態を復元
+
+        Args:
+            state: stateで取得した値
+        """
+
+
+class TableWaveform(Waveform):
+    """参照テーブルを引く周期波形"""
+
+    def __init__(self, table: List[float], period: float, amplitude: float, start_time: Optional[float] = None):
+        super().__init__(period, amplitude, start_time)
+        self.table = table
+
+    def sample(self) -> float:
+        return self.table[self.phase >> _INDEX_SHIFT]
+
+
+class SawtoothWaveform(Waveform):
+    """のこぎり波（位相がそのまま値になるためテーブルは不要）"""
+
+    _SCALE = 2.0 / (1 << PHASE_BITS)
+
+    def sample(self) -> float:
+        return self.phase * self._SCALE - 1.0
+
+
+class RandomWalk(Waveform):
+    """0に引き戻されるランダムウォーク（周期を持たない）"""
+
+    def __init__(self, amplitude: float, step: float = 0.1, reversion: float = 0.05):
+        """
+        初期化
+
+        Args:
+            amplitude: 振幅（目標範囲に対する割合）
+            step: 1秒あたりの最大変化量（-1.0〜1.0の正規化値に対して）
+            reversion: 1秒あたりに0へ引き戻す割合
+        """
+        self.period = 0.0
+        self.amplitude = amplitude
+        self.step_size = step
+        self.reversion = reversion
+        self.phase = 0
+        self.value = 0.0
+
+    def advance(self, dt: float):
+        value = self.value * (1.0 - min(1.0, self.reversion * dt))
+        value += random.uniform(-self.step_size, self.step_size) * dt
+        self.value = max(-1.0, min(value, 1.0))
+
+    def sample(self) -> float:
+        return self.value
+
+    @property
+    def state(self) -> float:
+        return self.value
+
+    def restore_state(self, state: float):
+        self.value = max(-1.0, min(state, 1.0))
+
+
+# 設定ファイルで指定できる波形の種類
+WAVEFORM_TYPES = ("sine", "sawtooth", "production_cycle", "random_walk")
+
+# 波形が未指定の場合に従来のsin波を適用するセンサー
+DEFAULT_SINE_SENSORS = ("speed", "pressure", "rotation_speed", "temperature")
+
+
+def create_waveform(sensor_id: str, sensor_config: Dict[str, Any]) -> Optional[Waveform]:
+    """
+    センサー設定から波形を作成
+
+    Args:
+        sensor_id: センサーID
+        sensor_config: センサー設定
+
+    Returns:
+        Optional[Waveform]: 波形。波形を適用しない場合はNone
+    """
+    waveform_config = sensor_config.get("waveform")
+    if waveform_config is None:
+        if sensor_id in DEFAULT_SINE_SENSORS:
+            # 従来どおり周期60秒・振幅5%のsin波
+            return TableWaveform(SINE_TABLE, 60.0, 0.05)
+        return None
+
+    if isinstance(waveform_config, str):
+        waveform_config = {"type": waveform_config}
+    waveform_type = waveform_config.get("type", "sine")
+    if waveform_type == "none":
+        return None
+
+    period = float(waveform_config.get("period", 60.0))
+    amplitude = float(waveform_config.get("amplitude", 0.05))
+    if waveform_type == "sine":
+        return TableWaveform(SINE_TABLE, period, amplitude)
+    if waveform_type == "production_cycle":
+        return TableWaveform(PRODUCTION_CYCLE_TABLE, period, amplitude)
+    if waveform_type == "sawtooth":
+        return SawtoothWaveform(period, amplitude)
+    if waveform_type == "random_walk":
+        return RandomWalk(amplitude, float(waveform_config.get("step", 0.1)), float(waveform_config.get("reversion", 0.05)))
+    raise ValueError(f"サポートされていない波形です: {waveform_type}（{', '.join(WAVEFORM_TYPES)}）")
+
+
+class FailurePattern(ABC):
+    """故障パターンの基底クラス"""
+
+    def __init__(self, sensor_config: Dict[str, Any], pattern_config: Dict[str, Any]):
+        """
+        初期化
+
+        Args:
+            sensor_config: センサー設定
+            pattern_config: 故障パターン設定
+        """
+        self.sensor_config = sensor_config
+        self.pattern_config = pattern_config
+        # 故障開始時刻と故障開始時の値（故障中のみ設定される）
+        self.start_time: Optional[float] = None
+        self.start_value = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.start_time is not None
+
+    def begin(self, last_value: float, current_time: float):
+        """
+        故障の開始
+
+        Args:
+            last_value: 故障開始時の値
+            current_time: 故障開始時刻
+        """
+        self.start_time = current_time
+        self.start_value = last_value
+
+    def reset(self):
+        """故障からの回復"""
+        self.start_time = None
+
+    @property
+    def state(self) -> Tuple[float, float, float]:
+        """スナップショットに保存する状態（故障開始時刻（故障中でなければNaN）, 故障開始時の値, 目標値）"""
+        return (math.nan if self.start_time is None else self.start_time, self.start_value, math.nan)
+
+    def restore_state(self, state: Tuple[float, float, float]):
+        """
+        スナップショットから状態を復元
+
+        Args:
+            state: stateで取得した値
+        """
+        start_time, start_value, _ = state
+        self.start_time = None if math.isnan(start_time) else start_time
+        self.start_value = start_value
+
+    @abstractmethod
+    def apply(self, normal_value: float, current_time: float) -> float:
+        """
+        故障中の値を計算
+
+        Args:
+            normal_value: 正常時と同じ方法で生成した値
+            current_time: 現在時刻
+
+        Returns:
+            float: 故障中の値
+        """
+
+
+class RampUpPattern(FailurePattern):
+    """故障範囲の値へ直線的に上昇（急激な温度上昇など）"""
+
+    def begin(self, last_value: float, current_time: float):
+        super().begin(last_value, current_time)
+        self.end_value = random.uniform(self.sensor_config["failure_min"], self.sensor_config["failure_max"])
+        self.ramp_time = float(self.pattern_config.get("ramp_time", 60.0))
+
+    @property
+    def state(self) -> Tuple[float, float, float]:
+        start_time, start_value, _ = super().state
+        return (start_time, start_value, getattr(self, "end_value", math.nan))
+
+    def restore_state(self, state: Tuple[float, float, float]):
+        super().restore_state(state)
+        if self.active:
+            self.end_value = state[2]
+            self.ramp_time = float(self.pattern_config.get("ramp_time", 60.0))
+
+    def apply(self, normal_value: float, current_time: float) -> float:
+        progress = min(1.0, (current_time - self.start_time) / self.ramp_time) if self.ramp_time > 0 else 1.0
+        return self.start_value + (self.end_value - self.start_value) * progress
+
+
+class SpikePattern(FailurePattern):
+    """正常値に故障範囲のスパイクが混ざる（振動増加など）"""
+
+    def apply(self, normal_value: float, current_time: float) -> float:
+        if random.random() < float(self.pattern_config.get("probability", 0.2)):
+            return random.uniform(self.sensor_config["failure_min"], self.sensor_config["failure_max"])
+        return normal_value
+
+
+class StuckPattern(FailurePattern):
+    """故障開始時の値に張り付く（センサー固着）"""
+
+    def apply(self, normal_value: float, current_time: float) -> float:
+        return self.start_value
+
+
+class DropoutPattern(FailurePattern):
+    """一定値に落ち込む（停止・信号断）"""
+
+    def apply(self, normal_value: float, current_time: float) -> float:
+        return float(self.pattern_config.get("value", self.sensor_config["min"]))
+
+
+# 設定ファイルで指定できる故障パターン（targetは従来どおり故障範囲へ徐々に近づく）
+FAILURE_PATTERNS = {
+    "ramp_up": RampUpPattern,
+    "spike": SpikePattern,
+    "stuck": StuckPattern,
+    "dropout": DropoutPattern,
+}
+
+
+def create_failure_pattern(sensor_config: Dict[str, Any]) -> Optional[FailurePattern]:
+    """
+    センサー設定から故障パターンを作成
+
+    Args:
+        sensor_config: センサー設定
+
+    Returns:
+        Optional[FailurePattern]: 故障パターン。従来の故障範囲への遷移（target）の場合はNone
+    """
+    pattern_config: Union[str, Dict[str, Any], None] = sensor_config.get("failure_pattern")
+    if pattern_config is None:
+        return None
+    if isinstance(pattern_config, str):
+        pattern_config = {"type": pattern_config}
+    pattern_type = pattern_config.get("type", "target")
+    if pattern_type == "target":
+        return None
+    if pattern_type not in FAILURE_PATTERNS:
+        raise ValueError(f"サポートされていない故障パターンです: {pattern_type}（target, {', '.join(FAILURE_PATTERNS)}）")
+    return FAILURE_PATTERNS[pattern_type](sensor_config, pattern_config)
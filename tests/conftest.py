@@ -0,0 +1,8 @@
+"""
+テスト共通設定
+"""
+import os
+import sys
+
+# srcモジュール同士のインポート（from data_generator import ...）を解決するためにsrcをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
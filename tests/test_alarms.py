@@ -0,0 +1,111 @@
+"""
+故障アラームのテスト
+"""
+import asyncio
+
+import pytest
+from asyncua import Client, ua
+
+from src.alarms import AlarmManager
+from src.data_generator import DataGenerator
+from src.opcua_server import OpcUaServer
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4851",
+            "name": "Alarm Test Server",
+            "uri": "urn:alarm:test",
+            "update_interval": 0.05,
+            "client_update_interval": 0.5
+        },
+        "alarms": {"enabled": True, "severity": 700, "require_acknowledge": True},
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "alarm_severity": 900,
+                "sensors": {
+                    "status": {"name": "稼働状態", "type": "boolean", "normal_value": True, "failure_value": False}
+                }
+            },
+            "other_device": {
+                "name": "他のデバイス",
+                "sensors": {
+                    "status": {"name": "稼働状態", "type": "boolean", "normal_value": True, "failure_value": False}
+                }
+            }
+        }
+    }
+
+
+def test_invalid_severity():
+    """範囲外の重要度でエラーになることを確認"""
+    with pytest.raises(ValueError):
+        AlarmManager({"severity": 0})
+    with pytest.raises(ValueError):
+        AlarmManager({"severity": 1001})
+
+
+@pytest.mark.asyncio
+async def test_failure_alarm_events(sample_config):
+    """故障の発生・確認・回復がFactoryからのイベントとして通知されることを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+
+    class Handler:
+        def __init__(self):
+            self.events = asyncio.Queue()
+
+        def event_notification(self, event):
+            self.events.put_nowait(event)
+
+    async with server.server:
+        update_task = asyncio.create_task(server.update_data())
+        client = Client(url=sample_config["server"]["endpoint"])
+        await client.connect()
+        try:
+            handler = Handler()
+            factory = await client.nodes.objects.get_child(f"{server.idx}:Factory")
+            subscription = await client.create_subscription(50, handler)
+            await subscription.subscribe_events(factory, ua.ObjectIds.OffNormalAlarmType)
+            device_nodeid = server.nodes["test_device"]["node"].nodeid
+
+            # 故障の発生
+            server.data_generator.force_failure("test_device", duration=300)
+            event = await asyncio.wait_for(handler.events.get(), 5)
+            assert event.SourceNode == device_nodeid
+            assert event.SourceName == "テストデバイス"
+            assert event.ConditionName == "DeviceFailure"
+            assert event.Severity == 900
+            assert getattr(event, "ActiveState/Id") is True
+            assert getattr(event, "AckedState/Id") is False
+            assert event.Retain is True
+
+            # 確認（EventIdが一致しない場合はエラー）
+            acknowledge = ua.NodeId(ua.ObjectIds.AcknowledgeableConditionType_Acknowledge)
+            with pytest.raises(ua.UaStatusCodeError):
+                await client.get_node(device_nodeid).call_method(acknowledge, b"unknown", ua.LocalizedText("確認"))
+            await client.get_node(device_nodeid).call_method(acknowledge, event.EventId, ua.LocalizedText("確認"))
+            event = await asyncio.wait_for(handler.events.get(), 5)
+            assert getattr(event, "AckedState/Id") is True
+            assert getattr(event, "ActiveState/Id") is True
+
+            # 回復（確認済みのため保持しない）
+            server.data_generator.device_states["test_device"]["failure_end_time"] = 0
+            event = await asyncio.wait_for(handler.events.get(), 5)
+            assert getattr(event, "ActiveState/Id") is False
+            assert event.Retain is False
+            assert server.alarms.events == 3
+            assert handler.events.empty()
+        finally:
+            await client.disconnect()
+            update_task.cancel()
@@ -0,0 +1,99 @@
+"""
+通信ベンチマークのテスト
+"""
+import pytest
+
+from src.benchmark import PROFILES, TransportBenchmark, percentile, resolve_profiles, synthetic_devices
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4846",
+            "name": "Benchmark Test Server",
+            "uri": "urn:benchmark:test",
+            "update_interval": 0.1,
+            "client_update_interval": 0.5
+        },
+        "performance": {"event_loop": "asyncio"},
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "value": {
+                        "name": "値",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0
+                    },
+                    "status": {"name": "稼働状態", "type": "boolean", "normal_value": True, "failure_value": False}
+                }
+            }
+        }
+    }
+
+
+def test_percentile():
+    """パーセンタイルの計算を確認"""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([5.0], 99) == 5.0
+    assert percentile([], 99) == 0.0
+
+
+def test_resolve_profiles(sample_config):
+    """プロファイル名の解決を確認"""
+    profiles = resolve_profiles(["default", "config"], sample_config)
+    assert profiles["default"] == PROFILES["default"]
+    assert profiles["config"] == {"event_loop": "asyncio"}
+    with pytest.raises(ValueError):
+        resolve_profiles(["unknown"], sample_config)
+
+
+def test_synthetic_devices(sample_config):
+    """指定したタグ数のデバイス設定が作成されることを確認"""
+    devices = synthetic_devices(120, sensors_per_device=50)
+    assert [len(device["sensors"]) for device in devices.values()] == [50, 50, 20]
+    with pytest.raises(ValueError):
+        synthetic_devices(0)
+
+    # 署名・暗号化には証明書のディレクトリが必要
+    with pytest.raises(ValueError):
+        TransportBenchmark(sample_config, PROFILES["default"], security="SignAndEncrypt")
+    with pytest.raises(ValueError):
+        TransportBenchmark(sample_config, PROFILES["default"], security="Encrypt")
+
+
+def test_isolated_from_state_and_governor(sample_config):
+    """計測対象のサーバーが状態ファイルを書き込まず、ガバナーも動かさないことを確認"""
+    sample_config["state"] = {"enabled": True, "path": "simulator_state.bin"}
+    sample_config["governor"] = {"enabled": True}
+    benchmark = TransportBenchmark(sample_config, PROFILES["default"])
+    assert benchmark.config["state"] == {"enabled": False}
+    assert benchmark.config["governor"] == {"enabled": False}
+    assert sample_config["state"]["enabled"]
+
+
+@pytest.mark.asyncio
+async def test_transport_benchmark(sample_config):
+    """別プロセスのサーバーに対して通知のスループットと遅延を計測できることを確認"""
+    benchmark = TransportBenchmark(sample_config, PROFILES["low_latency"], clients=2, duration=1.0, warmup=0.5)
+    result = await benchmark.run()
+
+    assert result["tags"] == 2
+    assert result["notifications"] > 0
+    assert result["throughput"] > 0
+    assert 0 < result["latency_p50_ms"] <= result["latency_p99_ms"] <= result["latency_max_ms"]
@@ -0,0 +1,148 @@
+"""
+Browseのキャッシュのテスト
+"""
+import pytest
+from asyncua import Client, ua
+from asyncua.ua.ua_binary import struct_to_binary
+
+from src.browse_cache import BrowseCache, encode_response
+from src.data_generator import DataGenerator
+from src.opcua_server import OpcUaServer
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4850",
+            "name": "Browse Cache Test Server",
+            "uri": "urn:browse:test",
+            "update_interval": 0.1,
+            "client_update_interval": 0.5
+        },
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "temperature": {
+                        "name": "温度",
+                        "unit": "°C",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0
+                    },
+                    "status": {"name": "稼働状態", "type": "boolean", "normal_value": True, "failure_value": False}
+                }
+            }
+        }
+    }
+
+
+def test_encode_response():
+    """エンコード済みの結果から組み立てたレスポンスがasyncuaのエンコードと一致することを確認"""
+    result = ua.BrowseResult()
+    result.References.append(ua.ReferenceDescription(NodeId=ua.NodeId(1000, 2), BrowseName=ua.QualifiedName("a", 2)))
+    response = ua.BrowseResponse()
+    response.ResponseHeader.RequestHandle = 7
+    response.Results = [result, ua.BrowseResult()]
+
+    assert encode_response(response, [struct_to_binary(item) for item in response.Results]) == struct_to_binary(response)
+
+
+@pytest.mark.asyncio
+async def test_browse_cache(sample_config):
+    """Browse・ブラウズパスの変換がキャッシュから返され、ノードの追加で破棄されることを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    cache = server.browse_cache
+    assert cache.stats()["browse_results"] > 0
+    idx = server.idx
+
+    async with server.server:
+        client = Client(url=sample_config["server"]["endpoint"])
+        await client.connect()
+        try:
+            hits = cache.hits
+            device = client.get_node(server.nodes["test_device"]["node"].nodeid)
+            names = sorted([(await node.read_browse_name()).Name for node in await device.get_children()])
+            assert names == ["温度", "稼働状態"]
+            assert cache.hits > hits
+
+            # ブラウズパスの変換は2回目からキャッシュを使う
+            path = [f"{idx}:Factory", f"{idx}:Environment", f"{idx}:テストデバイス", f"{idx}:温度"]
+            node = await client.nodes.objects.get_child(path)
+            assert node.nodeid == server.nodes["test_device"]["sensors"]["temperature"].nodeid
+            hits = cache.hits
+            assert (await client.nodes.objects.get_child(path)).nodeid == node.nodeid
+            assert cache.hits == hits + 1
+
+            # キャッシュの結果はasyncuaのBrowseと同じ
+            description = ua.BrowseDescription(
+                NodeId_=device.nodeid,
+                BrowseDirection_=ua.BrowseDirection.Forward,
+                ReferenceTypeId=ua.NodeId(ua.ObjectIds.HierarchicalReferences),
+                IncludeSubtypes=True
+            )
+            params = ua.BrowseParameters(NodesToBrowse=[description])
+            assert cache.browse(params) == cache._browse(params)
+
+            # ノードを追加するとキャッシュが破棄され、新しいノードが見える
+            server_device = server.nodes["test_device"]["node"]
+            await server_device.add_variable(idx, "追加", 0.0)
+            assert cache.invalidations == 1
+            names = sorted([(await node.read_browse_name()).Name for node in await device.get_children()])
+            assert names == ["温度", "稼働状態", "追加"]
+        finally:
+            await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_browse_cache_is_bounded(sample_config):
+    """存在しないノードや失敗した結果はキャッシュされず、結果の数が上限を超えないことを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    idx = server.idx
+    cache = BrowseCache(server.server, idx, max_entries=2)
+
+    def browse(nodeid, node_class_mask=0):
+        description = ua.BrowseDescription(
+            NodeId_=nodeid,
+            BrowseDirection_=ua.BrowseDirection.Forward,
+            ReferenceTypeId=ua.NodeId(ua.ObjectIds.HierarchicalReferences),
+            IncludeSubtypes=True,
+            NodeClassMask=node_class_mask
+        )
+        return cache.browse(ua.BrowseParameters(NodesToBrowse=[description]))[0]
+
+    # 存在しないノード
+    for identifier in range(10):
+        assert not browse(ua.NodeId(f"unknown{identifier}", idx)).StatusCode.is_good()
+    assert cache.stats()["browse_results"] == 0
+
+    # 存在しないパス
+    path = ua.BrowsePath(
+        StartingNode=ua.NodeId(ua.ObjectIds.ObjectsFolder),
+        RelativePath_=ua.RelativePath(Elements=[ua.RelativePathElement(TargetName=ua.QualifiedName("unknown", idx))])
+    )
+    assert not cache.translate_browsepaths_to_nodeids([path])[0].StatusCode.is_good()
+    assert cache.stats()["path_results"] == 0
+
+    # クライアントが条件を変えても上限を超えず、最も長く使われていない結果から捨てる
+    device = server.nodes["test_device"]["node"].nodeid
+    for mask in (1, 2, 1, 4):
+        assert browse(device, mask).StatusCode.is_good()
+    stats = cache.stats()
+    assert stats["browse_results"] == 2
+    assert stats["evictions"] == 1
+    assert list(key[-1] for key in cache.browse_results) == [1, 4]
+    assert len(cache._encoded) == 2
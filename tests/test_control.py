@@ -0,0 +1,170 @@
+"""
+制御用メソッドのテスト
+"""
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from asyncua import Client, ua
+
+from src.data_generator import DataGenerator
+from src.opcua_server import OpcUaServer
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    def sensor(name):
+        return {
+            "name": name,
+            "min": 0.0,
+            "max": 100.0,
+            "normal_min": 20.0,
+            "normal_max": 40.0,
+            "failure_min": 80.0,
+            "failure_max": 100.0
+        }
+
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4843",
+            "name": "Control Test Server",
+            "uri": "urn:control:test",
+            "update_interval": 0.1,
+            "client_update_interval": 0.5
+        },
+        "control": {
+            "enabled": True,
+            "allow_anonymous": True
+        },
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "device_a": {
+                "name": "デバイスA",
+                "sensors": {
+                    "a1": sensor("A1"),
+                    "a2": sensor("A2"),
+                    "status": {"name": "稼働状態", "type": "boolean", "normal_value": True, "failure_value": False}
+                }
+            },
+            "device_b": {
+                "name": "デバイスB",
+                "sensors": {
+                    "b1": sensor("B1"),
+                    "b2": sensor("B2")
+                }
+            }
+        }
+    }
+
+
+def test_sensor_limit_and_device_enabled(sample_config):
+    """生成対象のセンサー数と有効なデバイスを変更できることを確認"""
+    generator = DataGenerator(sample_config)
+    values = {}
+    generator.generate_data(out=values)
+    assert generator.active_sensor_count == 5
+
+    generator.set_sensor_limit(4)
+    data = generator.generate_data(out=values)
+    assert list(data["device_a"]) == ["a1", "a2", "status"]
+    assert list(data["device_b"]) == ["b1"]
+
+    generator.set_sensor_limit(None)
+    generator.set_device_enabled("device_a", False)
+    data = generator.generate_data(out=values)
+    assert list(data) == ["device_b"]
+    assert generator.active_sensor_count == 2
+
+    with pytest.raises(KeyError):
+        generator.set_device_enabled("unknown", True)
+    with pytest.raises(ValueError):
+        generator.set_sensor_limit(-1)
+
+
+def test_force_failure_and_failure_rate(sample_config):
+    """故障の強制発生と平均故障間隔の変更を確認"""
+    sample_config["failure_simulation"]["enabled"] = True
+    generator = DataGenerator(sample_config)
+
+    generator.force_failure("device_a", 60)
+    data = generator.generate_data()
+    assert data["device_a"]["status"] is False
+    assert generator.device_states["device_a"]["failure_end_time"] == pytest.approx(time.time() + 60, abs=1)
+
+    generator.set_mean_time_between_failures(0.001)
+    assert generator.device_states["device_b"]["next_failure_time"] < time.time() + 1
+    with pytest.raises(ValueError):
+        generator.set_mean_time_between_failures(0)
+
+
+@pytest_asyncio.fixture
+async def server_client(sample_config):
+    """制御用メソッドを有効にしたサーバーとクライアント"""
+    data_generator = DataGenerator(sample_config)
+    server = OpcUaServer(sample_config, data_generator)
+    await server.init()
+    await server.server.start()
+    server_task = asyncio.create_task(server.update_data())
+
+    client = Client(url=sample_config["server"]["endpoint"])
+    await client.connect()
+
+    yield server, client
+
+    await client.disconnect()
+    server_task.cancel()
+    try:
+        await server_task
+    except asyncio.CancelledError:
+        pass
+    await server.server.stop()
+
+
+@pytest.mark.asyncio
+async def test_control_methods(server_client):
+    """クライアントからの制御がティックの間で適用されることを確認"""
+    server, client = server_client
+    control = await client.nodes.objects.get_child([f"{server.idx}:Factory", f"{server.idx}:Control"])
+
+    await control.call_method(f"{server.idx}:SetSensorLimit", ua.Variant(2, ua.VariantType.Int32))
+    await control.call_method(f"{server.idx}:SetUpdateInterval", ua.Variant(0.05, ua.VariantType.Double))
+    await control.call_method(f"{server.idx}:SetDeviceEnabled", "device_b", False)
+
+    # メソッド呼び出しの時点ではまだ適用されていない
+    assert server.update_interval == 0.1
+
+    await asyncio.sleep(0.3)
+    assert server.control.pending_count == 0
+    assert server.update_interval == 0.05
+    assert server.data_generator.active_sensor_count == 2
+    active_count = await (await control.get_child(f"{server.idx}:ActiveSensorCount")).read_value()
+    assert active_count == 2
+
+    # 存在しないデバイスは拒否される
+    with pytest.raises(ua.UaStatusCodeError):
+        await control.call_method(f"{server.idx}:ForceFailure", "unknown", 10.0)
+
+
+@pytest.mark.asyncio
+async def test_control_methods_refuse_anonymous(sample_config):
+    """匿名のセッションからの制御用メソッドの呼び出しが拒否されることを確認"""
+    del sample_config["control"]["allow_anonymous"]
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    async with server.server:
+        async with Client(url=sample_config["server"]["endpoint"]) as client:
+            control = await client.nodes.objects.get_child([f"{server.idx}:Factory", f"{server.idx}:Control"])
+            with pytest.raises(ua.UaStatusCodeError) as error:
+                await control.call_method(f"{server.idx}:ForceFailure", "device_a", 10.0)
+            assert error.value.code == ua.StatusCodes.BadUserAccessDenied
+            assert server.control.pending_count == 0
+
+            # 制御用以外の値の読み取りはできる
+            assert await (await control.get_child(f"{server.idx}:UpdateInterval")).read_value() == 0.1
@@ -129,3 +129,17 @@ def test_failure_simulation(sample_config):
     
     # 10回の更新後、温度が上昇していることを確認
     assert data[device_id]["temperature"] > initial_temp
+
+
+def test_generate_data_reuses_output(sample_config):
+    """出力先の辞書を指定した場合に同じ辞書が再利用されることを確認"""
+    generator = DataGenerator(sample_config)
+    
+    values = {}
+    data = generator.generate_data(out=values)
+    device_data = data["test_device"]
+    data = generator.generate_data(out=values)
+    
+    assert data is values
+    assert data["test_device"] is device_data
+    assert data["test_device"]["temperature"] == generator.last_values["test_device"]["temperature"]
@@ -0,0 +1,136 @@
+"""
+派生センサーの依存グラフのテスト
+"""
+import pytest
+
+from src.data_generator import DataGenerator
+from src.expression_graph import ExpressionGraph
+
+
+@pytest.fixture
+def sample_devices():
+    """テスト用のデバイス設定"""
+    return {
+        "line": {
+            "name": "ライン",
+            "sensors": {
+                "current_a": {"name": "電流A", "min": 0.0, "max": 20.0, "normal_min": 10.0, "normal_max": 10.0},
+                "current_b": {"name": "電流B", "min": 0.0, "max": 20.0, "normal_min": 5.0, "normal_max": 5.0},
+                "status": {"name": "稼働状態", "type": "boolean", "normal_value": True, "failure_value": False},
+            }
+        },
+        "power": {
+            "name": "電力",
+            "sensors": {
+                # 依存先より先に定義しても評価順は依存関係で決まる
+                "total_power": {
+                    "name": "総電力",
+                    "type": "derived",
+                    "expression": "total_current * voltage",
+                },
+                "total_current": {
+                    "name": "総電流",
+                    "type": "derived",
+                    "expression": "sum(line.current_a, line.current_b) * line.status",
+                },
+                "voltage": {"name": "電圧", "min": 0.0, "max": 300.0, "normal_min": 200.0, "normal_max": 200.0},
+            }
+        }
+    }
+
+
+def test_evaluate_in_dependency_order(sample_devices):
+    """派生センサーが依存関係順に評価されることを確認"""
+    graph = ExpressionGraph(sample_devices)
+    assert graph.order == [("power", "total_current"), ("power", "total_power")]
+
+    data = {
+        "line": {"current_a": 10.0, "current_b": 5.0, "status": True},
+        "power": {"voltage": 200.0},
+    }
+    graph.evaluate(data)
+
+    assert data["power"]["total_current"] == 15.0
+    assert data["power"]["total_power"] == 3000.0
+
+
+def test_clamp_and_division_by_zero():
+    """min/maxでの制限とゼロ除算の扱いを確認"""
+    devices = {
+        "dev": {
+            "name": "デバイス",
+            "sensors": {
+                "a": {"name": "A", "min": 0.0, "max": 10.0, "normal_min": 0.0, "normal_max": 0.0},
+                "ratio": {"name": "比率", "type": "derived", "expression": "1 / a"},
+                "scaled": {"name": "スケール", "type": "derived", "expression": "a * 100 + 50", "min": 0.0, "max": 20.0},
+            }
+        }
+    }
+    graph = ExpressionGraph(devices)
+    data = {"dev": {"a": 0.0}}
+    graph.evaluate(data)
+
+    assert data["dev"]["ratio"] == 0.0
+    assert data["dev"]["scaled"] == 20.0
+
+
+@pytest.mark.parametrize("expression", [
+    "undefined_sensor * 2",
+    "other_device.a",
+    "__import__('os')",
+    "dev.a.real",
+    "[a, a]",
+])
+def test_invalid_expression(expression):
+    """無効な式がエラーになることを確認"""
+    devices = {
+        "dev": {
+            "name": "デバイス",
+            "sensors": {
+                "a": {"name": "A", "min": 0.0, "max": 10.0, "normal_min": 0.0, "normal_max": 0.0},
+                "bad": {"name": "不正", "type": "derived", "expression": expression},
+            }
+        }
+    }
+    with pytest.raises(ValueError):
+        ExpressionGraph(devices)
+
+
+def test_cycle_is_rejected():
+    """循環参照がエラーになることを確認"""
+    devices = {
+        "dev": {
+            "name": "デバイス",
+            "sensors": {
+                "x": {"name": "X", "type": "derived", "expression": "y + 1"},
+                "y": {"name": "Y", "type": "derived", "expression": "x + 1"},
+            }
+        }
+    }
+    with pytest.raises(ValueError):
+        ExpressionGraph(devices)
+
+
+def test_data_generator_follows_sources(sample_devices):
+    """データ生成器が派生センサーを元のセンサーに追従させることを確認"""
+    config = {
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": sample_devices,
+    }
+    generator = DataGenerator(config)
+
+    # 初期値も他のセンサーの初期値から計算されている
+    initial = generator.last_values
+    assert initial["power"]["total_current"] == initial["line"]["current_a"] + initial["line"]["current_b"]
+
+    for _ in range(5):
+        data = generator.generate_data()
+        expected_current = data["line"]["current_a"] + data["line"]["current_b"]
+        assert data["power"]["total_current"] == pytest.approx(expected_current)
+        assert data["power"]["total_power"] == pytest.approx(expected_current * data["power"]["voltage"])
+        assert generator.last_values["power"]["total_power"] == data["power"]["total_power"]
@@ -0,0 +1,194 @@
+"""
+過負荷時の段階的な縮退のテスト
+"""
+from datetime import datetime
+
+import pytest
+
+from src.data_generator import DataGenerator
+from src.governor import LoadGovernor
+from src.opcua_server import OpcUaServer
+from src.sinks import FanOut, Sink
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    sensors = {
+        "value": {
+            "name": "値",
+            "min": 0.0,
+            "max": 100.0,
+            "normal_min": 20.0,
+            "normal_max": 40.0,
+            "failure_min": 80.0,
+            "failure_max": 100.0
+        }
+    }
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4853",
+            "name": "Governor Test Server",
+            "uri": "urn:governor:test",
+            "update_interval": 0.1,
+            "client_update_interval": 0.5
+        },
+        "governor": {
+            "enabled": True,
+            "high_load": 0.8,
+            "low_load": 0.5,
+            "sustain": 2,
+            "steps": [
+                {"action": "reduce_rate", "divisor": 3},
+                {"action": "widen_deadband", "deadband": 0.05},
+                {"action": "pause_sinks"}
+            ]
+        },
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "critical_device": {"name": "重要デバイス", "priority": "critical", "sensors": sensors},
+            "normal_device": {"name": "通常デバイス", "sensors": sensors},
+            "low_device": {"name": "低優先度デバイス", "priority": "low", "sensors": sensors}
+        }
+    }
+
+
+class RecordingSink(Sink):
+    """配信されたティックの数を記録するシンク"""
+
+    name = "recording"
+    inline = True
+
+    def __init__(self):
+        super().__init__()
+        self.ticks = 0
+
+    async def publish(self, tick):
+        self.ticks += 1
+
+
+def test_invalid_config(sample_config):
+    """不正な設定でエラーになることを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    with pytest.raises(ValueError):
+        LoadGovernor(server, {"steps": [{"action": "drop_devices"}]})
+    with pytest.raises(ValueError):
+        LoadGovernor(server, {"high_load": 0.5, "low_load": 0.8})
+    with pytest.raises(ValueError):
+        LoadGovernor(server, {"steps": [{"action": "reduce_rate", "divisor": 1}]})
+
+    sample_config["devices"]["low_device"]["priority"] = "urgent"
+    with pytest.raises(ValueError):
+        OpcUaServer(sample_config, DataGenerator(sample_config))
+
+
+@pytest.mark.asyncio
+async def test_degrade_and_restore(sample_config):
+    """過負荷が続くと段階が1つずつ進み、負荷が下がると逆の順に元に戻ることを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    governor = server.governor
+    generator = server.data_generator
+    overload = server.update_interval * 2
+    idle = server.update_interval * 0.1
+
+    # 過負荷が1ティックだけの場合は何もしない
+    governor.observe(overload)
+    governor.observe(idle)
+    governor.observe(overload)
+    assert governor.level == 0
+
+    # 優先度lowのデバイスだけ更新頻度を下げる
+    governor.observe(overload)
+    assert governor.level == 1
+    assert generator.update_divisors == {"low_device": 3}
+    updated = [set(generator.generate_data()) for _ in range(6)]
+    assert sum("low_device" in devices for devices in updated) == 2
+    assert all({"critical_device", "normal_device"} <= devices for devices in updated)
+
+    # critical以外の数値タグにデッドバンドを設定する
+    governor.observe(overload)
+    governor.observe(overload)
+    assert governor.level == 2
+    deadbands = server.opcua_sink.deadbands
+    assert deadbands[server.tag_index.find("critical_device", "value").slot] == 0.0
+    assert deadbands[server.tag_index.find("normal_device", "value").slot] == pytest.approx(5.0)
+
+    governor.observe(overload)
+    governor.observe(overload)
+    assert governor.level == 3
+    assert server.fan_out.paused
+    # 全ての段階を適用した後は進まない
+    governor.observe(overload)
+    governor.observe(overload)
+    assert governor.stats()["active_steps"] == ["reduce_rate", "widen_deadband", "pause_sinks"]
+
+    for level in (2, 1, 0):
+        governor.observe(idle)
+        governor.observe(idle)
+        assert governor.level == level
+    assert generator.update_divisors == {}
+    assert server.opcua_sink.deadbands is None
+    assert not server.fan_out.paused
+    assert governor.transitions == 6
+
+
+@pytest.mark.asyncio
+async def test_dry_run(sample_config):
+    """記録のみの場合は段階が進んでもシミュレーションを変更しないことを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    governor = LoadGovernor(server, sample_config["governor"], dry_run=True)
+    for _ in range(6):
+        governor.observe(server.update_interval * 2)
+    assert governor.stats()["active_steps"] == ["reduce_rate", "widen_deadband", "pause_sinks"]
+    assert server.data_generator.update_divisors == {}
+    assert server.opcua_sink.deadbands is None
+    assert not server.fan_out.paused
+
+
+@pytest.mark.asyncio
+async def test_deadband_skips_small_changes(sample_config):
+    """デッドバンドの有効中は変化の小さい値を書き込まず、criticalのタグは全て書き込むことを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    sink = server.opcua_sink
+    await sink.start()
+    sink.set_deadband(0.05, ["critical_device"])
+    normal = server.nodes["normal_device"]["sensors"]["value"]
+    critical = server.nodes["critical_device"]["sensors"]["value"]
+
+    async def publish(value):
+        await server.fan_out.publish(datetime.utcnow(), {
+            "critical_device": {"value": value},
+            "normal_device": {"value": value}
+        })
+
+    await publish(30.0)
+    await publish(32.0)
+    assert await normal.read_value() == 30.0
+    assert await critical.read_value() == 32.0
+    assert sink.skipped == 1
+
+    await publish(36.0)
+    assert await normal.read_value() == 36.0
+
+
+@pytest.mark.asyncio
+async def test_pause_sinks():
+    """配信を止めている間は止められるシンクにだけティックが届かないことを確認"""
+    recording = RecordingSink()
+    primary = RecordingSink()
+    primary.pausable = False
+    fan_out = FanOut([primary, recording])
+
+    await fan_out.publish(datetime.utcnow(), {})
+    fan_out.paused = True
+    await fan_out.publish(datetime.utcnow(), {})
+    assert (primary.ticks, recording.ticks) == (2, 1)
+    assert fan_out.paused_ticks == 1
@@ -63,8 +63,9 @@ async def server_client(test_config):
     # サーバーの作成
     server = OpcUaServer(test_config, data_generator)
     
-    # サーバーの初期化
+    # サーバーの初期化と起動
     await server.init()
+    await server.server.start()
     
     # サーバーの起動（非同期タスクとして）
     server_task = asyncio.create_task(server.update_data())
@@ -83,6 +84,7 @@ async def server_client(test_config):
         await server_task
     except asyncio.CancelledError:
         pass
+    await server.server.stop()
 
 
 @pytest.mark.asyncio
@@ -95,7 +97,7 @@ async def test_client_can_read_data(server_client):
     
     # コンベアベルトの速度ノードを取得
     speed_node = await client.nodes.objects.get_child(
-        ["0:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:速度"]
+        [f"{nsindex}:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:速度"]
     )
     
     # 値を読み取り
@@ -106,7 +108,7 @@ async def test_client_can_read_data(server_client):
     
     # ステータスノードを取得
     status_node = await client.nodes.objects.get_child(
-        ["0:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:稼働状態"]
+        [f"{nsindex}:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:稼働状態"]
     )
     
     # 値を読み取り
@@ -126,7 +128,7 @@ async def test_data_updates_over_time(server_client):
     
     # コンベアベルトの速度ノードを取得
     speed_node = await client.nodes.objects.get_child(
-        ["0:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:速度"]
+        [f"{nsindex}:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:速度"]
     )
     
     # 初期値を読み取り
@@ -152,11 +154,11 @@ async def test_failure_simulation(server_client):
     
     # コンベアベルトのステータスノードを取得
     status_node = await client.nodes.objects.get_child(
-        ["0:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:稼働状態"]
+        [f"{nsindex}:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:稼働状態"]
     )
     
-    # 故障を強制的に発生させる
-    data_generator.device_states["conveyor_belt"]["is_failing"] = True
+    # 故障を強制的に発生させる（故障の終了時刻も設定し、次のティックで回復しないようにする）
+    data_generator.force_failure("conveyor_belt", 60)
     
     # データを更新
     data_generator.generate_data()
@@ -170,11 +172,13 @@ async def test_failure_simulation(server_client):
     
     # 速度ノードを取得
     speed_node = await client.nodes.objects.get_child(
-        ["0:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:速度"]
+        [f"{nsindex}:Factory", f"{nsindex}:ProductionLine1", f"{nsindex}:コンベアベルト", f"{nsindex}:速度"]
     )
     
-    # 速度値を読み取り
-    speed_value = await speed_node.read_value()
-    
-    # 故障時は速度が低下することを確認
+    # 故障時は速度が故障範囲へ徐々に低下することを確認（1ティックあたり目標値との差の10%ずつ変化する）
+    for _ in range(50):
+        speed_value = await speed_node.read_value()
+        if speed_value <= 0.5:
+            break
+        await asyncio.sleep(0.1)
     assert 0.0 <= speed_value <= 0.5  # 故障時の範囲
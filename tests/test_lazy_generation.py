@@ -0,0 +1,157 @@
+"""
+購読されていないタグの遅延生成のテスト
+"""
+import asyncio
+
+import pytest
+from asyncua import Client
+
+from src.data_generator import DataGenerator
+from src.opcua_server import OpcUaServer
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4852",
+            "name": "Lazy Generation Test Server",
+            "uri": "urn:lazy:test",
+            "update_interval": 0.05,
+            "client_update_interval": 0.5
+        },
+        "performance": {
+            "lazy_generation": True
+        },
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "temperature": {
+                        "name": "温度",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0
+                    },
+                    "cycles": {
+                        "name": "サイクル数",
+                        "min": 0,
+                        "max": 1000000,
+                        "increment_min": 1,
+                        "increment_max": 1
+                    },
+                    "doubled": {
+                        "name": "2倍",
+                        "type": "derived",
+                        "expression": "temperature * 2"
+                    }
+                }
+            }
+        }
+    }
+
+
+def test_fast_forward(sample_config):
+    """生成を止めていたセンサーが読み取り時に止めていたティック数だけ進むことを確認"""
+    generator = DataGenerator(sample_config)
+    generator.enable_lazy_generation()
+    assert generator.tick_sensors == {}
+
+    for _ in range(100):
+        assert generator.generate_data() == {}
+
+    # 1ずつ増えるカウンターは止めていたティック数だけ増える（閉じた式でまとめて進める）
+    assert generator.refresh("test_device", "cycles") == 100
+    # 同じティックの間は進まない
+    assert generator.refresh("test_device", "cycles") == 100
+    temperature = generator.refresh("test_device", "temperature")
+    assert 0.0 <= temperature <= 100.0
+
+    # 派生センサーを購読すると、式が参照するセンサーも生成する
+    generator.set_monitored("test_device", "doubled", True)
+    data = generator.generate_data()
+    assert set(data["test_device"]) == {"temperature", "doubled"}
+    assert data["test_device"]["doubled"] == pytest.approx(data["test_device"]["temperature"] * 2)
+
+    generator.set_monitored("test_device", "doubled", False)
+    generator.generate_data()
+    assert generator.generate_data() == {}
+
+
+@pytest.mark.parametrize("steps", [20, 100])
+def test_fast_forward_counter_wraps_like_eager_generation(sample_config, steps):
+    """最大値を超えるカウンターを遅延生成で進めた値が、ティックごとに生成した値と同じになることを確認"""
+    sample_config["devices"]["test_device"]["sensors"]["cycles"].update({"max": 10, "increment_min": 3, "increment_max": 3})
+    eager = DataGenerator(sample_config)
+    lazy = DataGenerator(sample_config)
+    lazy.enable_lazy_generation()
+
+    values = []
+    for _ in range(steps):
+        values.append(eager.generate_data()["test_device"]["cycles"])
+        lazy.generate_data()
+    assert max(values) <= 10 and min(values) < 3
+
+    # 20ティックは1ティックずつ、100ティックは閉じた式でまとめて進める
+    assert lazy.refresh("test_device", "cycles") == values[-1]
+
+
+@pytest.mark.asyncio
+async def test_lazy_generation(sample_config):
+    """購読中のタグだけがティックごとに生成され、購読されていないタグはReadで現在の値が返ることを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    assert server.lazy_generation is not None
+    generator = server.data_generator
+
+    async with server.server:
+        update_task = asyncio.create_task(server.update_data())
+        client = Client(url=sample_config["server"]["endpoint"])
+        await client.connect()
+        try:
+            sensors = server.nodes["test_device"]["sensors"]
+            cycles = client.get_node(sensors["cycles"].nodeid)
+
+            # 購読されていないタグは生成しないが、Readでは現在のティックまで進めた値を返す
+            await asyncio.sleep(0.3)
+            assert generator.tick_sensors == {}
+            first = await cycles.read_value()
+            assert first >= 3
+            await asyncio.sleep(0.3)
+            assert await cycles.read_value() > first
+
+            # 購読するとティックごとに生成し、初期値の通知にも現在の値が使われる
+            class Handler:
+                def __init__(self):
+                    self.values = []
+
+                def datachange_notification(self, node, val, data):
+                    self.values.append(val)
+
+            handler = Handler()
+            subscription = await client.create_subscription(50, handler)
+            handle = await subscription.subscribe_data_change(cycles)
+            await asyncio.sleep(0.3)
+            assert [sensor_id for sensor_id, _ in generator.tick_sensors["test_device"]] == ["cycles"]
+            assert handler.values[0] > first
+            assert len(handler.values) > 2
+            assert server.lazy_generation.stats()["monitored_tags"] == 1
+
+            # 購読を解除すると生成を止める
+            await subscription.unsubscribe(handle)
+            await asyncio.sleep(0.1)
+            assert generator.tick_sensors == {}
+            assert server.lazy_generation.stats()["monitored_tags"] == 0
+        finally:
+            update_task.cancel()
+            await client.disconnect()
@@ -0,0 +1,46 @@
+"""
+ティック計測のテスト
+"""
+import tracemalloc
+
+from src.metrics import TickMetrics
+
+
+def test_tick_metrics_counts_allocations():
+    """ティック中に割り当てたGC追跡オブジェクトが計測されることを確認"""
+    metrics = TickMetrics()
+    
+    metrics.begin()
+    # GCのしきい値を超える数のオブジェクトを割り当てて保持する
+    kept = [[i] for i in range(5000)]
+    metrics.end()
+    
+    assert metrics.ticks == 1
+    # 正味の数なので、同時に解放されたオブジェクトの分だけ少なくなることがある
+    assert metrics.last_allocations > len(kept) // 2
+    assert metrics.last_work_time >= 0.0
+    
+    metrics.begin()
+    metrics.end()
+    
+    # 何も割り当てないティックは平均を下げる
+    assert metrics.ticks == 2
+    assert metrics.last_allocations < 100
+    assert metrics.allocations_per_tick < len(kept)
+
+
+def test_tick_metrics_traces_transient_allocations():
+    """tracemallocでトレース中は一時的な割り当てバイト数が計測されることを確認"""
+    metrics = TickMetrics()
+    tracemalloc.start()
+    try:
+        metrics.begin()
+        # すぐに解放される一時オブジェクトは正味の割り当て数には現れない
+        for _ in range(100):
+            temporary = [0.0] * 1000
+        metrics.end()
+    finally:
+        tracemalloc.stop()
+    
+    assert metrics.last_allocated_bytes >= 8000
+    assert metrics.allocated_bytes_per_tick == metrics.last_allocated_bytes
@@ -62,8 +62,9 @@ async def server_client(sample_config):
     # サーバーの作成
     server = OpcUaServer(sample_config, data_generator)
     
-    # サーバーの初期化
+    # サーバーの初期化と起動
     await server.init()
+    await server.server.start()
     
     # サーバーの起動（非同期タスクとして）
     server_task = asyncio.create_task(server.update_data())
@@ -82,6 +83,7 @@ async def server_client(sample_config):
         await server_task
     except asyncio.CancelledError:
         pass
+    await server.server.stop()
 
 
 @pytest.mark.asyncio
@@ -176,3 +178,79 @@ async def test_data_update(server_client):
     
     # 値が更新されていることを確認（厳密な等価性は期待しない）
     assert isinstance(updated_value, float)
+
+
+@pytest.mark.asyncio
+async def test_device_array_tag(sample_config):
+    """デバイス全体が1つの配列変数として公開されることを確認"""
+    sample_config["server"]["endpoint"] = "opc.tcp://localhost:4842"
+    sample_config["server"]["publish_mode"] = "devices"
+    data_generator = DataGenerator(sample_config)
+    server = OpcUaServer(sample_config, data_generator)
+    await server.init()
+    await server.server.start()
+    server_task = asyncio.create_task(server.update_data())
+    
+    client = Client(url=sample_config["server"]["endpoint"])
+    await client.connect()
+    try:
+        device_node = client.get_node(server.nodes["test_device"]["node"].nodeid)
+        
+        # センサーごとの変数は作成されず、配列変数のみが存在する
+        children = [(await node.read_browse_name()).Name for node in await device_node.get_children()]
+        assert children == ["Values"]
+        
+        values_node = await device_node.get_child(f"{server.idx}:Values")
+        names = await (await values_node.get_child(f"{server.idx}:SensorNames")).read_value()
+        assert names == ["温度", "稼働状態"]
+        
+        await asyncio.sleep(0.3)
+        values = await values_node.read_value()
+        assert len(values) == 2
+        assert 0.0 <= values[0] <= 100.0
+        assert values[1] == 1.0
+    finally:
+        await client.disconnect()
+        server_task.cancel()
+        try:
+            await server_task
+        except asyncio.CancelledError:
+            pass
+        await server.server.stop()
+
+
+def test_invalid_publish_mode(sample_config):
+    """不正な公開モードがエラーになることを確認"""
+    sample_config["server"]["publish_mode"] = "everything"
+    with pytest.raises(ValueError):
+        OpcUaServer(sample_config, DataGenerator(sample_config))
+
+
+@pytest.mark.asyncio
+async def test_stable_node_ids(sample_config):
+    """NodeIdが設定から決まり、サーバーを作り直しても変わらないことを確認"""
+    sample_config["devices"]["test_device"]["sensors"]["status"]["node_id"] = 5001
+
+    async def node_ids():
+        server = OpcUaServer(sample_config, DataGenerator(sample_config))
+        await server.init()
+        return server, {
+            sensor_id: var.nodeid for sensor_id, var in server.nodes["test_device"]["sensors"].items()
+        }
+
+    server, first = await node_ids()
+    _, second = await node_ids()
+    assert first == second
+    assert first["status"] == ua.NodeId(5001, server.idx)
+
+    # センサーのNodeIdの数値がタグIDになる
+    tag = server.tag_index[first["temperature"].Identifier]
+    assert (tag.device_id, tag.sensor_id) == ("test_device", "temperature")
+    assert tag.node is server.nodes["test_device"]["sensors"]["temperature"]
+    assert [tag.slot for tag in server.tag_index] == [0, 1]
+    assert server.tag_index[5001].variant_type == ua.VariantType.Boolean
+
+    # 重複するNodeIdはエラー
+    sample_config["devices"]["test_device"]["sensors"]["temperature"]["node_id"] = 5001
+    with pytest.raises(ValueError):
+        await node_ids()
@@ -0,0 +1,124 @@
+"""
+通信のチューニングのテスト
+"""
+import asyncio
+import importlib.util
+import socket
+
+import pytest
+from asyncua import Client
+
+from src.data_generator import DataGenerator
+from src.opcua_server import OpcUaServer
+from src.performance import TunedTransportList, event_loop_factory, transport_limits, tune_socket
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4845",
+            "name": "Performance Test Server",
+            "uri": "urn:performance:test",
+            "update_interval": 0.1,
+            "client_update_interval": 0.5
+        },
+        "performance": {
+            "event_loop": "asyncio",
+            "transport": {
+                "tcp_nodelay": False,
+                "send_buffer_size": 256 * 1024,
+                "max_chunk_size": 131072,
+                "max_message_size": 1048576
+            }
+        },
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "value": {
+                        "name": "値",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0
+                    }
+                }
+            }
+        }
+    }
+
+
+def test_event_loop_factory():
+    """イベントループの選択を確認"""
+    assert event_loop_factory({"event_loop": "asyncio"}) is None
+    with pytest.raises(ValueError):
+        event_loop_factory({"event_loop": "trio"})
+
+    if importlib.util.find_spec("uvloop") is None:
+        # uvloopがない場合、autoは標準ループにフォールバックし、明示的な指定はエラーになる
+        assert event_loop_factory({}) is None
+        with pytest.raises(ImportError):
+            event_loop_factory({"event_loop": "uvloop"})
+    else:
+        assert event_loop_factory({}) is not None
+
+
+def test_transport_limits():
+    """チャンクサイズと最大メッセージサイズからトランスポート制限を作成できることを確認"""
+    limits = transport_limits({"max_chunk_size": 131072, "max_message_size": 1048576})
+    assert limits.max_recv_buffer == 131072
+    assert limits.max_send_buffer == 131072
+    assert limits.max_chunk_count == 8
+    assert limits.max_message_size == 1048576
+
+    with pytest.raises(ValueError):
+        transport_limits({"max_chunk_size": 1024})
+
+
+def test_tune_socket():
+    """ソケットオプションが設定されることを確認"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        tune_socket(sock, {"tcp_nodelay": True, "receive_buffer_size": 65536})
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) != 0
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) >= 65536
+
+        transports = TunedTransportList({"tcp_nodelay": False})
+
+        class Transport:
+            def get_extra_info(self, name):
+                return sock if name == "socket" else None
+
+        transports.append(Transport())
+        assert len(transports) == 1
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) == 0
+
+
+@pytest.mark.asyncio
+async def test_server_applies_transport_settings(sample_config):
+    """サーバーが接続ごとにソケットオプションを設定し、トランスポート制限を適用することを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    assert server.server.limits.max_recv_buffer == 131072
+
+    async with server.server:
+        client = Client(url=sample_config["server"]["endpoint"])
+        await client.connect()
+        try:
+            await asyncio.sleep(0.1)
+            transports = server.server.iserver.asyncio_transports
+            assert len(transports) == 1
+            sock = transports[0].get_extra_info("socket")
+            # asyncioの既定（TCP_NODELAY有効）が設定で上書きされている
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) == 0
+        finally:
+            await client.disconnect()
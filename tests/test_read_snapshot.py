@@ -0,0 +1,169 @@
+"""
+スナップショットからのReadの高速化のテスト
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from asyncua import Client, ua
+from asyncua.ua.ua_binary import struct_to_binary
+
+# Readの高速化にはnumpyが必要
+pytest.importorskip("numpy")
+
+from src.data_generator import DataGenerator
+from src.opcua_server import OpcUaServer
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4854",
+            "name": "Fast Read Test Server",
+            "uri": "urn:fast_read:test",
+            "update_interval": 0.05,
+            "client_update_interval": 0.5
+        },
+        "performance": {
+            "fast_read": True
+        },
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "temperature": {
+                        "name": "温度",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0
+                    },
+                    "cycles": {
+                        "name": "サイクル数",
+                        "node_id": 1001,
+                        "min": 0,
+                        "max": 1000000,
+                        "increment_min": 1,
+                        "increment_max": 1
+                    },
+                    "running": {
+                        "name": "稼働状態",
+                        "type": "boolean",
+                        "normal_value": True,
+                        "failure_value": False
+                    }
+                }
+            }
+        }
+    }
+
+
+def read_parameters(nodeids, timestamps_to_return=ua.TimestampsToReturn.Both):
+    """センサーのValue属性を読み取るReadParametersを作成"""
+    params = ua.ReadParameters()
+    params.TimestampsToReturn = timestamps_to_return
+    for nodeid in nodeids:
+        read_value = ua.ReadValueId()
+        read_value.NodeId = nodeid
+        read_value.AttributeId = ua.AttributeIds.Value
+        params.NodesToRead.append(read_value)
+    return params
+
+
+@pytest.mark.asyncio
+async def test_encode_matches_asyncua(sample_config):
+    """スナップショットからエンコードした値がasyncuaのエンコードと同じバイト列になることを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    snapshot = server.read_snapshot
+    sink = server.opcua_sink
+    await sink.start()
+    await server.fan_out.publish(datetime(2024, 1, 1, 12, 0, 0, 500), {
+        "test_device": {"temperature": 31.25, "cycles": 42, "running": True}
+    })
+    assert not snapshot.irregular
+
+    sensors = server.nodes["test_device"]["sensors"]
+    nodeids = [sensors[sensor_id].nodeid for sensor_id in ("running", "temperature", "cycles", "temperature")]
+    # 数値の大きなNodeId（Numeric）と小さなNodeId（FourByte）はエンコードが異なるため、別の要求になる
+    for group in (nodeids[:2], nodeids[2:3]):
+        params = read_parameters(group)
+        slots = snapshot.decode(struct_to_binary(params))
+        assert list(slots) == [tag.slot for nodeid in group for tag in server.tag_index if tag.nodeid == nodeid]
+        expected = b"".join(
+            struct_to_binary(server.server.iserver.aspace.read_attribute_value(nodeid, ua.AttributeIds.Value))
+            for nodeid in group
+        )
+        assert snapshot.encode(slots) == expected
+
+    # NodeIdのエンコードが混在する要求やValue以外の属性は通常の処理で応答する
+    assert snapshot.decode(struct_to_binary(read_parameters(nodeids))) is None
+    params = read_parameters(nodeids[:1])
+    params.NodesToRead[0].AttributeId = ua.AttributeIds.DisplayName
+    assert snapshot.decode(struct_to_binary(params)) is None
+
+
+@pytest.mark.asyncio
+async def test_fast_read(sample_config):
+    """クライアントのReadにスナップショットから応答し、書き込まれた値と通常の処理と同じタイムスタンプが返ることを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    snapshot = server.read_snapshot
+    assert snapshot is not None
+
+    async with server.server:
+        update_task = asyncio.create_task(server.update_data())
+        client = Client(url=sample_config["server"]["endpoint"])
+        await client.connect()
+        try:
+            await asyncio.sleep(0.2)
+            sensors = server.nodes["test_device"]["sensors"]
+            nodeids = [sensors["temperature"].nodeid, sensors["running"].nodeid]
+
+            results = await client.uaclient.read(read_parameters(nodeids))
+            assert snapshot.stats()["fast_reads"] == 1
+            temperature, running = results
+            assert isinstance(temperature.Value.Value, float)
+            assert temperature.Value.VariantType == ua.VariantType.Double
+            assert running.Value.Value is True
+            assert temperature.SourceTimestamp == temperature.ServerTimestamp
+            assert temperature.SourceTimestamp is not None
+
+            # TimestampsToReturnによらず、通常の処理と同じく両方のタイムスタンプを返す
+            for timestamps_to_return in ua.TimestampsToReturn:
+                results = await client.uaclient.read(read_parameters(nodeids, timestamps_to_return))
+                assert results[0].SourceTimestamp is not None
+                assert results[0].ServerTimestamp == results[0].SourceTimestamp
+            assert snapshot.stats()["fast_reads"] == 5
+
+            # 通常の処理の応答と比較する（クライアントが書き込んだ値はタイムスタンプがないため通常の処理で応答する）
+            update_task.cancel()
+            await asyncio.sleep(0.1)
+            fast = (await client.uaclient.read(read_parameters(nodeids[1:], ua.TimestampsToReturn.Neither)))[0]
+            fallback = server.server.iserver.aspace.read_attribute_value(nodeids[1], ua.AttributeIds.Value)
+            assert struct_to_binary(fast) == struct_to_binary(fallback)
+            assert snapshot.stats()["fast_reads"] == 6
+
+            # クライアントが書き込んだ値は次のティックまでスナップショットに反映される（タイムスタンプがない値は通常の処理で応答する）
+            await client.get_node(sensors["temperature"].nodeid).write_value(ua.Variant(12.5, ua.VariantType.Double))
+            fallbacks = snapshot.stats()["fallbacks"]
+            assert (await client.uaclient.read(read_parameters(nodeids[:1])))[0].Value.Value == 12.5
+            assert snapshot.stats()["fallbacks"] == fallbacks + 1
+
+            # センサー以外のノードを含む要求は通常の処理で応答する
+            results = await client.uaclient.read(read_parameters([nodeids[1], ua.NodeId(ua.ObjectIds.Server_ServerStatus_State)]))
+            assert results[0].Value.Value is True
+            assert results[1].StatusCode.is_good()
+        finally:
+            update_task.cancel()
+            await client.disconnect()
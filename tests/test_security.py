@@ -0,0 +1,195 @@
+"""
+セキュリティ設定のテスト
+"""
+import os
+import stat
+
+import pytest
+from asyncua import Client, ua
+from asyncua.crypto import uacrypto
+from cryptography import x509
+
+from src.data_generator import DataGenerator
+from src.opcua_server import OpcUaServer
+from src.security import ConfigUserManager, generate_certificate, is_read_only, security_policies
+
+
+@pytest.fixture
+def sample_config(tmp_path):
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4848",
+            "name": "Security Test Server",
+            "uri": "urn:security:test",
+            "update_interval": 0.1,
+            "client_update_interval": 0.5
+        },
+        "security": {
+            "policies": ["Basic256Sha256_SignAndEncrypt"],
+            "certificate": str(tmp_path / "certs" / "server_cert.der"),
+            "private_key": str(tmp_path / "certs" / "server_key.pem"),
+            "allow_anonymous": False,
+            "users": [{"username": "operator", "password": "secret"}]
+        },
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "value": {
+                        "name": "値",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0
+                    }
+                }
+            }
+        }
+    }
+
+
+def test_security_policies():
+    """セキュリティポリシー名の解決を確認"""
+    assert security_policies({}) == [ua.SecurityPolicyType.NoSecurity]
+    assert security_policies({"policies": ["None", "Basic256Sha256_Sign"]}) == [
+        ua.SecurityPolicyType.NoSecurity, ua.SecurityPolicyType.Basic256Sha256_Sign
+    ]
+    with pytest.raises(ValueError):
+        security_policies({"policies": ["Basic128Rsa15_Sign"]})
+    with pytest.raises(ValueError):
+        security_policies({"policies": []})
+
+
+@pytest.mark.asyncio
+async def test_generate_certificate(tmp_path):
+    """自己署名証明書にアプリケーションURIが設定され、asyncuaで読み込めることを確認"""
+    certificate_path = str(tmp_path / "cert.der")
+    private_key_path = str(tmp_path / "key.pem")
+    generate_certificate(certificate_path, private_key_path, "urn:test:app", "TestApp", host_name="test-host")
+
+    certificate = await uacrypto.load_certificate(certificate_path)
+    await uacrypto.load_private_key(private_key_path)
+    names = certificate.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+    assert "urn:test:app" in names.get_values_for_type(x509.UniformResourceIdentifier)
+    assert "test-host" in names.get_values_for_type(x509.DNSName)
+
+    # 秘密鍵は所有者だけが読み書きできる（既存のファイルを上書きする場合も）
+    assert stat.S_IMODE(os.stat(private_key_path).st_mode) == 0o600
+    os.chmod(private_key_path, 0o644)
+    generate_certificate(certificate_path, private_key_path, "urn:test:app", "TestApp", host_name="test-host")
+    assert stat.S_IMODE(os.stat(private_key_path).st_mode) == 0o600
+
+
+def test_config_user_manager():
+    """ユーザー名とパスワードによる認証を確認"""
+    manager = ConfigUserManager([{"username": "operator", "password": "secret"}], allow_anonymous=False)
+    assert manager.get_user(None, username="operator", password="secret").name == "operator"
+    assert manager.get_user(None, username="operator", password="wrong") is None
+    assert manager.get_user(None, username="unknown", password="secret") is None
+    assert manager.get_user(None) is None
+
+    assert ConfigUserManager([], allow_anonymous=True).get_user(None) is not None
+
+
+def test_config_user_manager_roles():
+    """ユーザーと匿名のセッションのロールを確認"""
+    manager = ConfigUserManager([
+        {"username": "operator", "password": "secret"},
+        {"username": "gateway", "password": "secret", "role": "viewer"},
+    ], allow_anonymous=True, anonymous_role="viewer")
+    assert not is_read_only(manager.get_user(None, username="operator", password="secret"))
+    assert is_read_only(manager.get_user(None, username="gateway", password="secret"))
+    assert is_read_only(manager.get_user(None))
+    assert not is_read_only(ConfigUserManager([]).get_user(None))
+
+    with pytest.raises(ValueError):
+        ConfigUserManager([{"username": "admin", "password": "secret", "role": "admin"}])
+    with pytest.raises(ValueError):
+        ConfigUserManager([], anonymous_role="admin")
+
+
+@pytest.mark.asyncio
+async def test_viewer_cannot_write_or_control(sample_config):
+    """viewerのユーザーは読み取りだけができ、書き込みと制御用メソッドが拒否されることを確認"""
+    sample_config["security"] = {
+        "policies": ["None"],
+        "allow_anonymous": False,
+        "users": [
+            {"username": "operator", "password": "secret"},
+            {"username": "gateway", "password": "secret", "role": "viewer"},
+        ]
+    }
+    sample_config["control"] = {"enabled": True}
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+
+    async with server.server:
+        for username, allowed in (("operator", True), ("gateway", False)):
+            client = Client(url=sample_config["server"]["endpoint"])
+            client.set_user(username)
+            client.set_password("secret")
+            async with client:
+                node = client.get_node(server.nodes["test_device"]["sensors"]["value"].nodeid)
+                await node.read_value()
+                control = await client.nodes.objects.get_child([f"{server.idx}:Factory", f"{server.idx}:Control"])
+                if allowed:
+                    await node.write_value(ua.Variant(12.5, ua.VariantType.Double))
+                    await control.call_method(f"{server.idx}:SetSensorLimit", ua.Variant(1, ua.VariantType.Int32))
+                    continue
+                with pytest.raises(ua.UaStatusCodeError) as error:
+                    await node.write_value(ua.Variant(50.0, ua.VariantType.Double))
+                assert error.value.code == ua.StatusCodes.BadUserAccessDenied
+                with pytest.raises(ua.UaStatusCodeError) as error:
+                    await control.call_method(f"{server.idx}:SetSensorLimit", ua.Variant(1, ua.VariantType.Int32))
+                assert error.value.code == ua.StatusCodes.BadUserAccessDenied
+
+    assert await server.nodes["test_device"]["sensors"]["value"].read_value() == 12.5
+    assert server.control.pending_count == 1
+
+
+@pytest.mark.asyncio
+async def test_encrypted_server_with_user_auth(sample_config, tmp_path):
+    """証明書を作成して暗号化エンドポイントを公開し、ユーザー認証を行うことを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    assert os.path.exists(sample_config["security"]["certificate"])
+
+    client_certificate = str(tmp_path / "client_cert.der")
+    client_private_key = str(tmp_path / "client_key.pem")
+    generate_certificate(client_certificate, client_private_key, "urn:security:test:client", "TestClient")
+    security_string = f"Basic256Sha256,SignAndEncrypt,{client_certificate},{client_private_key}"
+
+    async def connect(username=None, password=None):
+        client = Client(url=sample_config["server"]["endpoint"])
+        client.application_uri = "urn:security:test:client"
+        if username is not None:
+            client.set_user(username)
+            client.set_password(password)
+        await client.set_security_string(security_string)
+        await client.connect()
+        return client
+
+    async with server.server:
+        endpoints = await server.server.get_endpoints()
+        assert {endpoint.SecurityMode for endpoint in endpoints} == {ua.MessageSecurityMode.SignAndEncrypt}
+
+        client = await connect("operator", "secret")
+        try:
+            value = await client.get_node(server.nodes["test_device"]["sensors"]["value"].nodeid).read_value()
+            assert value == 0.0
+        finally:
+            await client.disconnect()
+
+        with pytest.raises(ua.UaStatusCodeError):
+            await connect("operator", "wrong")
+        with pytest.raises(ua.UaStatusCodeError):
+            await connect()
@@ -0,0 +1,236 @@
+"""
+セッションごとの通知キューのテスト
+"""
+import asyncio
+import time
+
+import pytest
+from asyncua import Client, ua
+
+from src.data_generator import DataGenerator
+from src.opcua_server import OpcUaServer
+from src.sessions import SessionGuard, SessionQueue, coalesce_results
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4849",
+            "name": "Sessions Test Server",
+            "uri": "urn:sessions:test",
+            "update_interval": 0.05,
+            "client_update_interval": 0.5
+        },
+        "sessions": {
+            "queue_size": 5,
+            "overflow": "drop_oldest",
+            "slow_after": 0.2
+        },
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "value": {
+                        "name": "値",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0
+                    }
+                }
+            }
+        }
+    }
+
+
+def publish_result(subscription_id, sequence_number, values):
+    """テスト用の通知を作成（値はClientHandle -> 値）"""
+    result = ua.PublishResult()
+    result.SubscriptionId = subscription_id
+    result.NotificationMessage.SequenceNumber = sequence_number
+    result.NotificationMessage.NotificationData.append(ua.DataChangeNotification(MonitoredItems=[
+        ua.MonitoredItemNotification(ClientHandle=handle, Value=ua.DataValue(ua.Variant(value, ua.VariantType.Double)))
+        for handle, value in values.items()
+    ]))
+    return result
+
+
+def result_values(result):
+    """通知に含まれる値（ClientHandle -> 値）"""
+    return {
+        item.ClientHandle: item.Value.Value.Value
+        for notification in result.NotificationMessage.NotificationData
+        for item in notification.MonitoredItems
+    }
+
+
+class FakeTransport:
+    """テスト用のトランスポート"""
+
+    def __init__(self):
+        self.buffer_size = 0
+
+    def get_extra_info(self, name):
+        return ("127.0.0.1", 50000) if name == "peername" else None
+
+    def get_write_buffer_size(self):
+        return self.buffer_size
+
+    def is_closing(self):
+        return False
+
+
+class FakeProcessor:
+    """テスト用のUaProcessor（送信したレスポンスを記録する）"""
+
+    class Request:
+        def __init__(self, handle):
+            self.requesthdr = ua.RequestHeader(RequestHandle=handle)
+            self.seqhdr = None
+            self.timestamp = time.time()
+
+    class Session:
+        class SubscriptionService:
+            active_subscription_ids = {1, 2}
+
+        subscription_service = SubscriptionService()
+
+    def __init__(self):
+        self.session = self.Session()
+        self._publish_requests = []
+        self.sent = []
+
+    def send_response(self, requesthandle, seqhdr, response):
+        self.sent.append((requesthandle, response.Parameters))
+
+
+def test_coalesce_results():
+    """監視項目ごとに最新の値だけが残ることを確認"""
+    older = publish_result(1, 1, {1: 10.0, 2: 20.0})
+    newer = publish_result(1, 2, {2: 21.0, 3: 30.0})
+    assert coalesce_results(older, newer) == 1
+    assert result_values(newer) == {1: 10.0, 2: 21.0, 3: 30.0}
+    assert newer.NotificationMessage.SequenceNumber == 2
+
+
+def test_drop_oldest():
+    """キューがあふれた場合に最も古い通知が破棄されることを確認"""
+    processor = FakeProcessor()
+    queue = SessionQueue(processor, FakeTransport(), {"queue_size": 3, "overflow": "drop_oldest"})
+    for number in range(1, 6):
+        queue.put(publish_result(1, number, {1: float(number)}))
+
+    assert [result.NotificationMessage.SequenceNumber for result in queue.results] == [3, 4, 5]
+    assert queue.dropped == 2
+    assert queue.max_depth == 3
+
+
+def test_coalesce():
+    """キューがあふれた場合に同じ購読の通知がまとめられ、最新の値が失われないことを確認"""
+    processor = FakeProcessor()
+    queue = SessionQueue(processor, FakeTransport(), {"queue_size": 2, "overflow": "coalesce"})
+    queue.put(publish_result(1, 1, {1: 1.0, 2: 1.0}))
+    queue.put(publish_result(2, 1, {1: 5.0}))
+    queue.put(publish_result(1, 2, {1: 2.0}))
+    queue.put(publish_result(1, 3, {1: 3.0}))
+
+    assert len(queue.results) == 2
+    assert queue.dropped == 0
+    assert queue.coalesced == 2
+    assert queue.results[0].SubscriptionId == 2
+    assert result_values(queue.results[1]) == {1: 3.0, 2: 1.0}
+
+
+def test_flush_and_slow_detection():
+    """Publishリクエストが届くと古い順に送信され、滞った状態が続くと遅いセッションとして検出されることを確認"""
+    processor = FakeProcessor()
+    transport = FakeTransport()
+    queue = SessionQueue(processor, transport, {"queue_size": 10, "max_write_buffer": 1000, "slow_after": 0.0})
+
+    asyncio.run(queue.forward(publish_result(1, 1, {1: 1.0})))
+    asyncio.run(queue.forward(publish_result(1, 2, {1: 2.0})))
+    assert processor.sent == []
+    assert queue.slow and queue.slow_detections == 1
+
+    processor._publish_requests.append(FakeProcessor.Request(1))
+    assert [result.NotificationMessage.SequenceNumber for _, result in processor.sent] == [1]
+
+    # 送信バッファが上限を超えている間は送信しない
+    transport.buffer_size = 2000
+    processor._publish_requests.append(FakeProcessor.Request(2))
+    assert len(processor.sent) == 1
+    assert queue.stalls == 1
+
+    transport.buffer_size = 0
+    queue.flush()
+    assert [handle for handle, _ in processor.sent] == [1, 2]
+    assert not queue.slow
+    assert queue.stats()["sent"] == 2
+
+
+def test_invalid_config():
+    """不正な設定でエラーになることを確認"""
+    with pytest.raises(ValueError):
+        SessionGuard({"overflow": "block"})
+    with pytest.raises(ValueError):
+        SessionGuard({"queue_size": -1})
+
+
+@pytest.mark.asyncio
+async def test_stalled_client_is_isolated(sample_config):
+    """Publishリクエストを送らなくなったクライアントの通知が上限までに抑えられ、他のクライアントには配信が続くことを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+
+    class Handler:
+        def __init__(self):
+            self.count = 0
+
+        def datachange_notification(self, node, val, data):
+            self.count += 1
+
+    async with server.server:
+        update_task = asyncio.create_task(server.update_data())
+        clients = []
+        handlers = []
+        try:
+            for _ in range(2):
+                client = Client(url=sample_config["server"]["endpoint"])
+                await client.connect()
+                clients.append(client)
+                handler = Handler()
+                handlers.append(handler)
+                subscription = await client.create_subscription(50, handler)
+                await subscription.subscribe_data_change(
+                    client.get_node(server.nodes["test_device"]["sensors"]["value"].nodeid)
+                )
+
+            # 1つ目のクライアントのPublishリクエストの送信を止める
+            clients[0].uaclient._publish_task.cancel()
+            await asyncio.sleep(0.2)
+            received = handlers[1].count
+            await asyncio.sleep(1.0)
+
+            assert handlers[1].count > received
+            stats = server.session_guard.stats()
+            assert stats["sessions"] == 2
+            assert stats["slow_sessions"] == 1
+            assert stats["dropped"] > 0
+            assert max(session.max_depth for session in server.session_guard.sessions) <= 5
+        finally:
+            update_task.cancel()
+            for client in clients:
+                try:
+                    await client.disconnect()
+                except Exception:
+                    pass
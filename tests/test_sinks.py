@@ -0,0 +1,256 @@
+"""
+出力先（シンク）のテスト
+"""
+import asyncio
+import json
+import struct
+from datetime import datetime
+
+import pytest
+
+from src.data_generator import DataGenerator
+from src.modbus_sink import ModbusSink
+from src.opcua_server import OpcUaServer
+from src.sinks import FanOut, Sink, Tick, create_sinks
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4847",
+            "name": "Sink Test Server",
+            "uri": "urn:sink:test",
+            "update_interval": 0.05,
+            "client_update_interval": 0.5
+        },
+        "sinks": {
+            "modbus": {"enabled": True, "host": "127.0.0.1", "port": 5021, "base_address": 100}
+        },
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "temperature": {
+                        "name": "温度",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0
+                    },
+                    "cycle_count": {"name": "サイクル数", "min": 0, "max": 1000000, "increment_min": 1, "increment_max": 1},
+                    "status": {"name": "稼働状態", "type": "boolean", "normal_value": True, "failure_value": False}
+                }
+            }
+        }
+    }
+
+
+class RecordingSink(Sink):
+    """受け取ったティックを記録するシンク"""
+
+    def __init__(self, name, delay=0.0, queue_size=100):
+        super().__init__({"queue_size": queue_size})
+        self.name = name
+        self.delay = delay
+        self.ticks = []
+
+    async def publish(self, tick):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.ticks.append(tick)
+
+
+def read_request(transaction_id, function_code, address, count):
+    """Read Holding/Input Registersの要求を作成"""
+    return struct.pack(">HHHBBHH", transaction_id, 0, 6, 1, function_code, address, count)
+
+
+@pytest.mark.asyncio
+async def test_fan_out_isolates_slow_sink():
+    """遅いシンクのキューがあふれても、他のシンクには全てのティックが届くことを確認"""
+    fast = RecordingSink("fast")
+    slow = RecordingSink("slow", delay=10.0, queue_size=2)
+    fan_out = FanOut([fast, slow])
+    await fan_out.start()
+
+    data = {"device": {"value": 0}}
+    for i in range(5):
+        # 生成側は同じ辞書を再利用する
+        data["device"]["value"] = i
+        await fan_out.publish(datetime(2024, 1, 1), data)
+        await asyncio.sleep(0.01)
+
+    stats = fan_out.stats()
+    await fan_out.stop()
+
+    assert [tick.data["device"]["value"] for tick in fast.ticks] == [0, 1, 2, 3, 4]
+    assert stats["fast"]["dropped"] == 0
+    # 遅いシンクは最初のティックを処理中で、キューには最新の2ティックだけが残る
+    assert stats["slow"]["dropped"] == 2
+    assert stats["slow"]["queued"] == 2
+    assert slow.ticks == []
+
+
+@pytest.mark.asyncio
+async def test_fan_out_drops_sink_that_fails_to_start():
+    """開始できなかったシンクだけを外し、残りのシンクへ配信し続けることを確認"""
+
+    class FailingSink(RecordingSink):
+        async def start(self):
+            raise OSError("address already in use")
+
+    working = RecordingSink("working")
+    failing = FailingSink("failing")
+    fan_out = FanOut([failing, working])
+    await fan_out.start()
+    await fan_out.publish(datetime(2024, 1, 1), {"device": {"value": 1}})
+    await asyncio.sleep(0.01)
+    await fan_out.stop()
+
+    assert [sink.name for sink in fan_out.sinks] == ["working"]
+    assert len(working.ticks) == 1
+    assert failing.ticks == []
+
+
+@pytest.mark.asyncio
+async def test_server_ticks_when_modbus_port_is_taken(sample_config):
+    """Modbus/TCPのポートが使用中でも、OPC-UAの値の更新が続くことを確認"""
+    blocker = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 5021)
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    try:
+        async with server.server:
+            task = asyncio.create_task(server.update_data())
+            try:
+                await asyncio.sleep(0.3)
+                assert not task.done()
+                assert server.data_generator.last_values["test_device"]["cycle_count"] > 0
+                assert [sink.name for sink in server.fan_out.sinks] == ["opcua"]
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+    finally:
+        blocker.close()
+        await blocker.wait_closed()
+
+
+def test_create_sinks(sample_config):
+    """設定で有効にしたシンクだけが作成されることを確認"""
+    sinks = create_sinks(sample_config)
+    assert [sink.name for sink in sinks] == ["modbus"]
+    assert create_sinks({"devices": {}}) == []
+
+    with pytest.raises(ValueError):
+        sample_config["sinks"]["modbus"]["queue_size"] = 0
+        create_sinks(sample_config)
+
+    # publishを実装していないシンクは作成できない
+    with pytest.raises(TypeError):
+        Sink()
+
+
+@pytest.mark.asyncio
+async def test_modbus_registers(sample_config):
+    """センサー値がレジスターに変換され、要求に応答することを確認"""
+    sink = ModbusSink(sample_config["sinks"]["modbus"], sample_config["devices"])
+    assert [(entry["address"], entry["type"]) for entry in sink.register_map] == [
+        (100, "float32"), (102, "uint32"), (104, "uint32")
+    ]
+
+    await sink.publish(Tick(datetime(2024, 1, 1), {"test_device": {"temperature": 25.5, "cycle_count": 70000, "status": True}}))
+
+    response = sink.handle_request(read_request(7, 0x03, 100, 6))
+    transaction_id, _, length, _, function_code, byte_count = struct.unpack_from(">HHHBBB", response)
+    assert (transaction_id, length, function_code, byte_count) == (7, 15, 0x03, 12)
+    assert struct.unpack_from(">fII", response, 9) == (25.5, 70000, 1)
+
+    # 範囲外のアドレス、未対応のファンクション、不正な数
+    assert response_exception(sink.handle_request(read_request(1, 0x04, 104, 4))) == (0x84, 0x02)
+    assert response_exception(sink.handle_request(struct.pack(">HHHBBHH", 1, 0, 6, 1, 0x06, 100, 1))) == (0x86, 0x01)
+    assert response_exception(sink.handle_request(read_request(1, 0x03, 100, 0))) == (0x83, 0x03)
+
+
+def response_exception(response):
+    """例外応答のファンクションコードと例外コードを取得"""
+    return struct.unpack_from(">BB", response, 7)
+
+
+@pytest.mark.asyncio
+async def test_server_fans_out_to_modbus(sample_config):
+    """OPC-UAとModbus/TCPに同じティックの値が配信されることを確認"""
+    server = OpcUaServer(sample_config, DataGenerator(sample_config))
+    await server.init()
+    async with server.server:
+        task = asyncio.create_task(server.update_data())
+        try:
+            await asyncio.sleep(0.3)
+            reader, writer = await asyncio.open_connection("127.0.0.1", 5021)
+            writer.write(read_request(1, 0x04, 100, 6))
+            await asyncio.sleep(0.1)
+            response = await reader.readexactly(9 + 12)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        writer.close()
+
+        temperature, cycle_count, status = struct.unpack_from(">fII", response, 9)
+        last_values = server.data_generator.last_values["test_device"]
+        assert 0.0 <= temperature <= 100.0
+        assert 0 < cycle_count <= last_values["cycle_count"]
+        assert status == 1
+
+        # ティックの停止後は、OPC-UAの変数に最後のティックの値が書き込まれている
+        assert await server.nodes["test_device"]["sensors"]["cycle_count"].read_value() == last_values["cycle_count"]
+        assert await server.nodes["test_device"]["sensors"]["temperature"].read_value() == last_values["temperature"]
+        assert server.fan_out.stats()["modbus"]["errors"] == 0
+
+
+@pytest.mark.asyncio
+async def test_mqtt_sink_publishes_to_broker():
+    """ローカルのブローカーへデバイスごとのメッセージが配信されることを確認"""
+    broker_module = pytest.importorskip("amqtt.broker")
+    mqtt = pytest.importorskip("paho.mqtt.client")
+    from src.mqtt_sink import MqttSink
+
+    broker = broker_module.Broker({
+        "listeners": {"default": {"type": "tcp", "bind": "127.0.0.1:18831"}},
+        "sys_interval": 0,
+        "auth": {"allow-anonymous": True}
+    })
+    await broker.start()
+
+    received = []
+    subscriber = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    subscriber.on_connect = lambda client, userdata, flags, reason_code, properties: client.subscribe("factory/#")
+    subscriber.on_message = lambda client, userdata, message: received.append((message.topic, json.loads(message.payload)))
+    subscriber.connect("127.0.0.1", 18831)
+    subscriber.loop_start()
+
+    sink = MqttSink({"host": "127.0.0.1", "port": 18831, "topic_prefix": "factory/", "qos": 1})
+    try:
+        await sink.start()
+        await asyncio.sleep(1.0)
+        await sink.publish(Tick(datetime(2024, 1, 1, 12, 0, 0), {"conveyor": {"speed": 1.2, "running": True}}))
+        for _ in range(50):
+            if received:
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        await sink.stop()
+        subscriber.loop_stop()
+        await broker.shutdown()
+
+    assert received == [(
+        "factory/conveyor",
+        {"timestamp": "2024-01-01T12:00:00.000000Z", "values": {"speed": 1.2, "running": True}}
+    )]
@@ -0,0 +1,110 @@
+"""
+ソークテストのテスト
+"""
+import pytest
+
+from src.soak import SoakTest, accelerate_config, linear_slope
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "server": {
+            "endpoint": "opc.tcp://localhost:4844",
+            "name": "Soak Test Server",
+            "uri": "urn:soak:test",
+            "update_interval": 1.0,
+            "client_update_interval": 5.0
+        },
+        "failure_simulation": {
+            "enabled": True,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "temperature": {
+                        "name": "温度",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0
+                    },
+                    "status": {
+                        "name": "稼働状態",
+                        "type": "boolean",
+                        "normal_value": True,
+                        "failure_value": False
+                    }
+                }
+            }
+        }
+    }
+
+
+def test_linear_slope():
+    """最小二乗法の傾きを確認"""
+    assert linear_slope([0, 1, 2, 3], [1, 3, 5, 7]) == pytest.approx(2.0)
+    assert linear_slope([0, 1, 2], [5, 5, 5]) == 0.0
+    assert linear_slope([1], [1]) == 0.0
+
+
+def test_accelerate_config(sample_config):
+    """加速した設定が元の設定を変更しないことを確認"""
+    config = accelerate_config(sample_config, 60)
+    assert config["server"]["update_interval"] == pytest.approx(1.0 / 60)
+    assert config["failure_simulation"]["mean_time_between_failures"] == pytest.approx(60)
+    assert sample_config["server"]["update_interval"] == 1.0
+
+
+def test_isolated_from_state_and_governor(sample_config):
+    """ソークテストが状態ファイルを書き込まず、ガバナーの段階を適用しないことを確認"""
+    sample_config["state"] = {"enabled": True, "path": "simulator_state.bin"}
+    sample_config["governor"] = {"enabled": True, "sustain": 2}
+    soak = SoakTest(sample_config, duration=0, accelerate=60)
+    assert soak.config["state"] == {"enabled": False}
+    assert soak.config["governor"] == {"enabled": False}
+    assert soak.governor_config["sustain"] == 2
+    assert sample_config["state"]["enabled"]
+
+
+def test_evaluate_detects_growth(sample_config):
+    """メモリ使用量と処理時間の増加傾向を判定できることを確認"""
+    soak = SoakTest(sample_config, duration=0, max_memory_growth=5.0, max_latency_growth=1.0)
+    soak.samples = [
+        {"simulated_hours": hour, "rss_mb": 100.0 + (hour % 2) * 0.5, "tick_latency_ms": 2.0}
+        for hour in range(10)
+    ]
+    assert soak.evaluate()["passed"]
+
+    # 1時間あたり10MB増加するリーク
+    soak.samples = [
+        {"simulated_hours": hour, "rss_mb": 100.0 + hour * 10, "tick_latency_ms": 2.0 + hour * 2}
+        for hour in range(10)
+    ]
+    report = soak.evaluate()
+    assert not report["passed"]
+    assert report["memory_growth_mb_per_hour"] == pytest.approx(10.0)
+    assert len(report["failures"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_short_run(sample_config):
+    """短時間のソークテストで計測値が記録されることを確認"""
+    soak = SoakTest(sample_config, duration=2.0, clients=2, accelerate=20, sample_interval=0.5)
+    report = await soak.run()
+
+    assert len(report["samples"]) >= 3
+    last = report["samples"][-1]
+    assert last["ticks"] > 0
+    assert last["sessions"] >= 2
+    assert last["subscriptions"] >= 2
+    assert last["notifications"] > 0
+    assert "top_allocators" in last
+    assert report["memory_growth_mb_per_hour"] is not None
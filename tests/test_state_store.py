@@ -0,0 +1,173 @@
+"""
+状態のスナップショットのテスト
+"""
+import copy
+import random
+import struct
+import time
+
+import pytest
+
+from src.data_generator import DataGenerator
+from src.state_store import StateStore
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "failure_simulation": {
+            "enabled": True,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "temperature": {
+                        "name": "温度",
+                        "min": 0.0,
+                        "max": 100.0,
+                        "normal_min": 20.0,
+                        "normal_max": 40.0,
+                        "failure_min": 80.0,
+                        "failure_max": 100.0,
+                        "waveform": {"type": "random_walk", "amplitude": 0.1},
+                        "failure_pattern": {"type": "ramp_up", "ramp_time": 60}
+                    },
+                    "cycle_count": {
+                        "name": "サイクル数",
+                        "min": 0,
+                        "max": 1000000,
+                        "increment_min": 1,
+                        "increment_max": 3
+                    },
+                    "status": {"name": "稼働状態", "type": "boolean", "normal_value": True, "failure_value": False}
+                }
+            }
+        }
+    }
+
+
+def test_save_and_restore(sample_config, tmp_path):
+    """保存した状態が別のデータ生成器に復元されることを確認"""
+    path = str(tmp_path / "state" / "simulator_state.bin")
+    generator = DataGenerator(sample_config)
+    store = StateStore(path, generator)
+    assert store.open() is False
+
+    generator.force_failure("test_device", 60)
+    for _ in range(5):
+        generator.generate_data()
+    store.close()
+    expected_values = copy.deepcopy(generator.last_values)
+    expected_state = dict(generator.device_states["test_device"])
+    expected_walk = generator.waveforms["test_device"]["temperature"].value
+    expected_pattern = generator.failure_patterns["test_device"]["temperature"].state
+    expected_random = random.random()
+
+    # 再起動（新しいデータ生成器は初期値と新しい乱数で初期化される）
+    random.seed()
+    restarted = DataGenerator(sample_config)
+    restored_store = StateStore(path, restarted)
+    assert restored_store.open() is True
+
+    assert restarted.last_values == expected_values
+    assert isinstance(restarted.last_values["test_device"]["cycle_count"], int)
+    assert restarted.last_values["test_device"]["status"] is False
+    state = restarted.device_states["test_device"]
+    assert state["is_failing"] is True
+    # 時刻は保存時刻からの相対値で復元される（保存から復元までの時間だけずれる）
+    assert state["failure_end_time"] == pytest.approx(expected_state["failure_end_time"], abs=1.0)
+    assert state["next_failure_time"] == pytest.approx(expected_state["next_failure_time"], abs=1.0)
+    assert restarted.waveforms["test_device"]["temperature"].value == expected_walk
+    assert restarted.failure_patterns["test_device"]["temperature"].state == pytest.approx(expected_pattern, abs=1.0)
+    # 乱数の系列も保存時点から続く
+    assert random.random() == expected_random
+
+    # カウンターは0に戻らず続きから増加する
+    data = restarted.generate_data()
+    assert data["test_device"]["cycle_count"] > expected_values["test_device"]["cycle_count"]
+    restored_store.close()
+
+
+def test_timers_resume_after_downtime(sample_config, tmp_path, monkeypatch):
+    """長く停止した後も、故障のタイマーは停止した時点の残り時間から再開することを確認"""
+    path = str(tmp_path / "simulator_state.bin")
+    generator = DataGenerator(sample_config)
+    store = StateStore(path, generator)
+    store.open()
+    generator.force_failure("test_device", 60)
+    remaining = generator.device_states["test_device"]["failure_end_time"] - time.time()
+    store.close()
+
+    # 1日後に再起動
+    restart_time = time.time() + 86400
+    monkeypatch.setattr(time, "time", lambda: restart_time)
+    restarted = DataGenerator(sample_config)
+    assert StateStore(path, restarted).open() is True
+    state = restarted.device_states["test_device"]
+    assert state["failure_end_time"] - restart_time == pytest.approx(remaining, abs=1.0)
+    assert state["next_failure_time"] > restart_time
+
+
+def test_interrupted_snapshot_is_discarded(sample_config, tmp_path):
+    """書き込みの途中で中断されたスナップショットは復元しないことを確認"""
+    path = str(tmp_path / "simulator_state.bin")
+    generator = DataGenerator(sample_config)
+    store = StateStore(path, generator)
+    store.open()
+    generator.generate_data()
+    store.close()
+
+    # シーケンス番号を奇数（書き込み中）にする
+    with open(path, "r+b") as file:
+        header = bytearray(file.read(32))
+        sequence = struct.unpack_from("<Q", header, 16)[0]
+        struct.pack_into("<Q", header, 16, sequence + 1)
+        file.seek(0)
+        file.write(header)
+
+    restarted = DataGenerator(sample_config)
+    initial_values = copy.deepcopy(restarted.last_values)
+    store = StateStore(path, restarted)
+    assert store.open() is False
+    assert restarted.last_values == initial_values
+    store.close()
+
+
+def test_layout_change_is_not_restored(sample_config, tmp_path):
+    """デバイス・センサーの構成が変わった場合は復元しないことを確認"""
+    path = str(tmp_path / "simulator_state.bin")
+    generator = DataGenerator(sample_config)
+    store = StateStore(path, generator)
+    store.open()
+    generator.generate_data()
+    store.close()
+
+    changed = copy.deepcopy(sample_config)
+    del changed["devices"]["test_device"]["sensors"]["status"]
+    restarted = DataGenerator(changed)
+    store = StateStore(path, restarted)
+    assert store.open() is False
+    assert restarted.last_values["test_device"]["cycle_count"] == 0
+    store.close()
+
+    # 新しい構成で保存し直したスナップショットは復元できる
+    assert StateStore(path, DataGenerator(changed)).open() is True
+
+    # IDが同じでも、センサーの種類や波形が変わった場合は復元しない
+    boolean = {"name": "サイクル数", "type": "boolean", "normal_value": True, "failure_value": False}
+    for sensor_id, changes in (
+        ("cycle_count", boolean),
+        ("temperature", {"waveform": "sawtooth"}),
+        ("temperature", {"failure_pattern": "stuck"}),
+    ):
+        modified = copy.deepcopy(changed)
+        sensor_config = modified["devices"]["test_device"]["sensors"][sensor_id]
+        if "type" in changes:
+            sensor_config.clear()
+        sensor_config.update(changes)
+        assert StateStore(path, DataGenerator(modified)).open() is False
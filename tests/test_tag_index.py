@@ -0,0 +1,97 @@
+"""
+NodeIdの割り当てとタグのインデックスのテスト
+"""
+import pytest
+from asyncua import Server, ua
+
+from src.tag_index import HASHED_ID_MAX, HASHED_ID_MIN, NodeIdAllocator, TagIndex, stable_node_id, tag_path
+
+
+def test_stable_node_id():
+    """パスから同じ範囲の同じ値が計算されることを確認"""
+    node_id = stable_node_id("conveyor_belt.speed")
+    assert node_id == stable_node_id("conveyor_belt.speed")
+    assert node_id != stable_node_id("conveyor_belt.motor_temperature")
+    assert HASHED_ID_MIN <= node_id <= HASHED_ID_MAX
+    assert tag_path("conveyor_belt", "speed") == "conveyor_belt.speed"
+
+
+def test_node_id_allocator():
+    """明示的なNodeIdの検証と重複の検出を確認"""
+    allocator = NodeIdAllocator(2)
+    assert allocator.node_id("device.a") == ua.NodeId(stable_node_id("device.a"), 2)
+    assert allocator.numeric_id("device.b", 1001) == 1001
+    nodeid, browse_name = allocator.allocate("device/Values", "Values")
+    assert nodeid.NamespaceIndex == 2
+    assert browse_name == ua.QualifiedName("Values", 2)
+
+    # 同じパス・同じNodeIdは割り当てられない
+    with pytest.raises(ValueError):
+        allocator.numeric_id("device.a")
+    with pytest.raises(ValueError):
+        allocator.numeric_id("device.c", 1001)
+    with pytest.raises(ValueError):
+        allocator.numeric_id("device.c", stable_node_id("device.a"))
+
+    for invalid in (0, -1, 2**32, "1002", True):
+        with pytest.raises(ValueError):
+            allocator.numeric_id("device.d", invalid)
+
+
+@pytest.mark.asyncio
+async def test_node_id_allocator_address_space():
+    """asyncuaが自動で割り当てたNodeIdと重なる明示的なNodeIdが拒否されることを確認"""
+    server = Server()
+    await server.init()
+    idx = await server.register_namespace("urn:tag_index:test")
+    # NodeIdを指定せずに作成したノードはasyncuaが連番を割り当てる
+    existing = await server.nodes.objects.add_object(idx, "Existing")
+
+    allocator = NodeIdAllocator(idx, server.iserver.aspace)
+    with pytest.raises(ValueError, match="アドレス空間"):
+        allocator.numeric_id("device", existing.nodeid.Identifier)
+    assert allocator.numeric_id("device", existing.nodeid.Identifier + 1) == existing.nodeid.Identifier + 1
+
+
+def test_node_id_allocator_hash_collision():
+    """ハッシュが重なったパスに、パスの辞書順で次の空いている値が割り当てられることを確認"""
+    first, second = "device168836.value", "device220891.value"
+    identifier = stable_node_id(first)
+    assert stable_node_id(second) == identifier
+
+    # 事前に割り当てる場合は、登録順によらず辞書順で決まる
+    for paths in ([first, second], [second, first]):
+        allocator = NodeIdAllocator(2)
+        allocator.reserve({path: None for path in paths})
+        assert allocator.numeric_id(second) == identifier + 1
+        assert allocator.numeric_id(first) == identifier
+
+    # 事前に割り当てない場合は、割り当て順に次の空いている値を使う
+    allocator = NodeIdAllocator(2)
+    assert allocator.numeric_id(second) == identifier
+    assert allocator.numeric_id(first) == identifier + 1
+
+    # 設定で指定したNodeIdは先に割り当て、ハッシュの値はそれを避ける
+    allocator = NodeIdAllocator(2)
+    allocator.reserve({first: None, "device.explicit": identifier})
+    assert allocator.numeric_id("device.explicit", identifier) == identifier
+    assert allocator.numeric_id(first) == identifier + 1
+
+
+def test_tag_index():
+    """タグIDとパスからタグを取得できることを確認"""
+    index = TagIndex()
+    first = index.add(1001, "device", "a", ua.VariantType.Double)
+    second = index.add(1002, "device", "b", ua.VariantType.Boolean)
+
+    assert len(index) == 2
+    assert [tag.slot for tag in index] == [0, 1]
+    assert index[1002] is second
+    assert 1001 in index and 1003 not in index
+    assert index.find("device", "a") is first
+    assert first.nodeid is None
+
+    with pytest.raises(ValueError):
+        index.add(1001, "device", "c", ua.VariantType.Double)
+    with pytest.raises(KeyError):
+        index.find("device", "c")
@@ -0,0 +1,125 @@
+"""
+共有メモリのティックバスのテスト
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# 共有メモリのティックバスにはnumpyが必要
+pytest.importorskip("numpy")
+
+from src.sinks import Tick, create_sinks
+from src.tick_bus import TickBusReader, TickBusSink
+
+
+@pytest.fixture
+def sample_config():
+    """テスト用の設定データ"""
+    return {
+        "sinks": {
+            "shared_memory": {
+                "enabled": True,
+                "name": f"test_tick_bus_{os.getpid()}",
+                "history": 4
+            }
+        },
+        "devices": {
+            "press": {
+                "name": "プレス機",
+                "sensors": {
+                    "pressure": {"name": "圧力", "min": 0.0, "max": 200.0},
+                    "cycles": {"name": "サイクル数", "min": 0, "max": 100000, "increment_min": 1},
+                    "status": {"name": "稼働状態", "type": "boolean", "normal_value": True, "failure_value": False}
+                }
+            },
+            "robot": {
+                "name": "ロボット",
+                "sensors": {
+                    "current": {"name": "電流", "min": 0.0, "max": 300.0}
+                }
+            }
+        }
+    }
+
+
+def publish(sink, number, data):
+    """テスト用のティックを書き込む（タイムスタンプはティック番号の秒数）"""
+    asyncio.run(sink.publish(Tick(datetime(2024, 1, 1) + timedelta(seconds=number), data)))
+
+
+def test_create_sink(sample_config):
+    """設定で有効にした場合に共有メモリのシンクが作成されることを確認"""
+    sinks = create_sinks(sample_config)
+    assert [sink.name for sink in sinks] == ["shared_memory"]
+    assert sinks[0].inline
+
+
+def test_invalid_history(sample_config):
+    """リングが短すぎる場合にエラーになることを確認"""
+    with pytest.raises(ValueError):
+        TickBusSink({"history": 1}, sample_config["devices"])
+
+
+def test_reader_gives_up_on_stalled_writer(sample_config):
+    """書き込み途中で書き込み側が止まった場合、読み直しの上限でTimeoutErrorになることを確認"""
+    sink = TickBusSink(sample_config["sinks"]["shared_memory"], sample_config["devices"])
+    asyncio.run(sink.start())
+    try:
+        publish(sink, 1, {"press": {"pressure": 120.5, "cycles": 10, "status": True}, "robot": {"current": 80.0}})
+        reader = TickBusReader(sample_config["sinks"]["shared_memory"]["name"], max_retries=20)
+        assert reader.latest().tick == 1
+
+        # ティック1の書き込みの途中（シーケンスが奇数）の状態にする
+        reader._regions.sequences[1] = 1
+        with pytest.raises(TimeoutError):
+            reader.latest()
+        with pytest.raises(TimeoutError):
+            reader.history(2)
+        with pytest.raises(ValueError):
+            TickBusReader(sample_config["sinks"]["shared_memory"]["name"], max_retries=0)
+        reader.close()
+    finally:
+        asyncio.run(sink.stop())
+
+
+def test_latest_and_history(sample_config):
+    """最新のティックと履歴がレイアウト通りに読み取れ、リングが1周すると古いティックが上書きされることを確認"""
+    sink = TickBusSink(sample_config["sinks"]["shared_memory"], sample_config["devices"])
+    asyncio.run(sink.start())
+    try:
+        reader = TickBusReader(sample_config["sinks"]["shared_memory"]["name"])
+        assert [tag["path"] for tag in reader.tags] == ["press.pressure", "press.cycles", "press.status", "robot.current"]
+        assert [tag["type"] for tag in reader.tags] == ["double", "counter", "boolean", "double"]
+        assert reader.latest() is None
+
+        publish(sink, 1, {"press": {"pressure": 120.5, "cycles": 10, "status": True}, "robot": {"current": 80.0}})
+        frame = reader.latest()
+        assert frame.tick == 1
+        assert frame.timestamp == datetime(2024, 1, 1, 0, 0, 1, tzinfo=timezone.utc).timestamp()
+        assert list(frame.values) == [120.5, 10.0, 1.0, 80.0]
+        # 値は共有メモリのビュー
+        assert frame.values.base is not None
+
+        # 生成されなかったタグは前のティックの値を引き継ぐ
+        publish(sink, 2, {"press": {"cycles": 11}})
+        latest = reader.latest(copy=True)
+        assert list(latest.values) == [120.5, 11.0, 1.0, 80.0]
+        assert latest.values[reader.slot("press", "cycles")] == 11.0
+
+        for number in range(3, 7):
+            publish(sink, number, {"press": {"cycles": 10 + number}})
+        ticks, timestamps, values = reader.history(3)
+        assert list(ticks) == [4, 5, 6]
+        assert list(values[:, reader.slot("press", "cycles")]) == [14.0, 15.0, 16.0]
+        assert timestamps[-1] - timestamps[0] == 2.0
+
+        # リングの長さ（4）を超えて古くなったティックは上書きされている
+        assert not reader.is_valid(frame.tick)
+        assert reader.is_valid(6)
+        with pytest.raises(ValueError):
+            reader.history(4)
+        reader.close()
+    finally:
+        asyncio.run(sink.stop())
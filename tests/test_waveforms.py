@@ -0,0 +1,153 @@
+"""
+波形と故障パターンのテスト
+"""
+import math
+import time
+
+import pytest
+
+from src.data_generator import DataGenerator
+from src.waveforms import (
+    PRODUCTION_CYCLE_TABLE,
+    SINE_TABLE,
+    FailurePattern,
+    RampUpPattern,
+    RandomWalk,
+    SawtoothWaveform,
+    TableWaveform,
+    Waveform,
+    create_failure_pattern,
+    create_waveform,
+)
+
+
+def test_sine_table_matches_sin():
+    """参照テーブルのsin波が1周期に渡ってmath.sinと一致することを確認"""
+    waveform = TableWaveform(SINE_TABLE, period=10.0, amplitude=1.0, start_time=0.0)
+    for i in range(1, 100):
+        value = waveform.step(0.1)
+        assert value == pytest.approx(math.sin(2 * math.pi * i / 100), abs=0.01)
+
+
+def test_phase_accumulator_wraps():
+    """位相アキュムレーターが周期を超えても折り返すことを確認"""
+    waveform = SawtoothWaveform(period=4.0, amplitude=1.0, start_time=0.0)
+    assert waveform.step(1.0) == pytest.approx(-0.5)
+    assert waveform.step(2.0) == pytest.approx(0.5)
+    # 1周期以上進めても値は-1.0〜1.0に収まる
+    assert waveform.step(6.0) == pytest.approx(-0.5)
+
+
+def test_production_cycle_range():
+    """生産サイクルプロファイルが正規化されていることを確認"""
+    assert min(PRODUCTION_CYCLE_TABLE) == pytest.approx(-1.0)
+    assert max(PRODUCTION_CYCLE_TABLE) == pytest.approx(1.0)
+
+
+def test_random_walk_is_bounded():
+    """ランダムウォークが範囲内に収まることを確認"""
+    walk = RandomWalk(amplitude=0.5, step=2.0)
+    for _ in range(1000):
+        assert -0.5 <= walk.step(1.0) <= 0.5
+
+
+def test_create_waveform():
+    """設定から波形が作成されることを確認"""
+    assert isinstance(create_waveform("speed", {}), TableWaveform)
+    assert create_waveform("current", {}) is None
+    assert create_waveform("speed", {"waveform": "none"}) is None
+    assert isinstance(create_waveform("x", {"waveform": {"type": "sawtooth", "period": 5}}), SawtoothWaveform)
+    with pytest.raises(ValueError):
+        create_waveform("x", {"waveform": {"type": "square"}})
+    with pytest.raises(ValueError):
+        create_waveform("x", {"waveform": {"type": "sine", "period": 0}})
+
+
+def test_create_failure_pattern():
+    """設定から故障パターンが作成されることを確認"""
+    sensor_config = {"min": 0.0, "max": 100.0, "failure_min": 80.0, "failure_max": 100.0}
+    assert create_failure_pattern(sensor_config) is None
+    assert create_failure_pattern({**sensor_config, "failure_pattern": "target"}) is None
+    assert isinstance(create_failure_pattern({**sensor_config, "failure_pattern": "ramp_up"}), RampUpPattern)
+    with pytest.raises(ValueError):
+        create_failure_pattern({**sensor_config, "failure_pattern": "explode"})
+
+
+def test_incomplete_subclass():
+    """値の計算を実装していない派生クラスは作成時にエラーになることを確認"""
+    class NoSample(Waveform):
+        pass
+
+    class NoApply(FailurePattern):
+        pass
+
+    with pytest.raises(TypeError):
+        NoSample(10.0, 1.0)
+    with pytest.raises(TypeError):
+        NoApply({"min": 0.0, "max": 100.0}, {"type": "none"})
+
+
+@pytest.fixture
+def pattern_config():
+    """故障パターンを持つセンサーの設定"""
+    def sensor(pattern):
+        return {
+            "name": pattern["type"],
+            "min": 0.0,
+            "max": 100.0,
+            "normal_min": 20.0,
+            "normal_max": 40.0,
+            "failure_min": 80.0,
+            "failure_max": 90.0,
+            "failure_pattern": pattern,
+        }
+
+    return {
+        "failure_simulation": {
+            "enabled": False,
+            "mean_time_between_failures": 3600,
+            "failure_duration_min": 300,
+            "failure_duration_max": 900
+        },
+        "devices": {
+            "test_device": {
+                "name": "テストデバイス",
+                "sensors": {
+                    "ramp": sensor({"type": "ramp_up", "ramp_time": 10}),
+                    "spike": sensor({"type": "spike", "probability": 1.0}),
+                    "stuck": sensor({"type": "stuck"}),
+                    "dropout": sensor({"type": "dropout", "value": 5.0}),
+                }
+            }
+        }
+    }
+
+
+def test_failure_patterns(pattern_config):
+    """故障パターンごとの値を確認"""
+    generator = DataGenerator(pattern_config)
+    stuck_value = generator.last_values["test_device"]["stuck"]
+    ramp_start = generator.last_values["test_device"]["ramp"]
+
+    generator.device_states["test_device"]["is_failing"] = True
+    generator.device_states["test_device"]["failure_end_time"] = time.time() + 3600
+
+    data = generator.generate_data()
+    assert data["test_device"]["stuck"] == stuck_value
+    assert data["test_device"]["dropout"] == 5.0
+    assert 80.0 <= data["test_device"]["spike"] <= 90.0
+    # 傾斜の開始直後はほぼ故障開始時の値
+    assert data["test_device"]["ramp"] == pytest.approx(ramp_start, abs=1.0)
+
+    # 傾斜時間を経過すると故障範囲に到達する
+    pattern = generator.failure_patterns["test_device"]["ramp"]
+    pattern.start_time -= 10
+    data = generator.generate_data()
+    assert 80.0 <= data["test_device"]["ramp"] <= 90.0
+
+    # 回復すると故障パターンはリセットされ正常範囲に戻り始める
+    generator.device_states["test_device"]["is_failing"] = False
+    generator.device_states["test_device"]["next_failure_time"] = float("inf")
+    data = generator.generate_data()
+    assert not pattern.active
+    assert data["test_device"]["dropout"] < 40.0